@@ -0,0 +1,157 @@
+import numpy as np
+from pandas import DataFrame
+
+from activity_summary import ActivitySummary, summarize_track
+from aggregation_pyramid import AGGREGATED_CHANNELS, AggregationPyramid, build_pyramid, extend_pyramid
+from grade_smoothing import GradeSmoothing, SmoothedGrades, smooth_grades
+from metrics import compute_channel, build_data_frame
+from track import Track
+
+"""
+A loaded activity: its track plus every derived result computed from it.
+Derived channels (see metrics), the summary (see activity_summary), the smoothed grades (see
+grade_smoothing) and the aggregation pyramid (see aggregation_pyramid) are computed lazily, on
+first access, and memoized, so the dashboards, the data table and the pdf report share the same
+results.
+"""
+
+
+class Activity:
+    __slots__ = ("track", "key", "_channels", "_data_frame", "_summary", "_smoothed_grades", "_pyramid",
+                 "_previous_pyramid")
+
+    def __init__(self, track: Track, key: str | None = None, channels: dict[str, np.ndarray] | None = None,
+                 previous_pyramid: AggregationPyramid | None = None):
+        """
+        Class constructor.
+
+        :param track: The activity track.
+        :type track: Track
+        :param key: The activity content key (see activity_cache), None if unknown.
+        :type key: str | None
+        :param channels: Channels already computed for the track (see live_activity).
+        :type channels: dict[str, numpy.ndarray] | None
+        :param previous_pyramid: The aggregation pyramid of the first points of the track, extended instead of
+                                 building the pyramid again (see live_activity).
+        :type previous_pyramid: AggregationPyramid | None
+        """
+        self.track = track
+        self.key = key
+        self._channels = dict(channels) if channels else {}
+        self._data_frame = None
+        self._summary = None
+        self._smoothed_grades = {}
+        self._pyramid = None
+        self._previous_pyramid = previous_pyramid
+
+    def __len__(self) -> int:
+        """
+        Get the number of points.
+
+        :return: The number of points.
+        :rtype: int
+        """
+        return len(self.track)
+
+    def channel(self, name: str) -> np.ndarray:
+        """
+        Get a channel of the activity, computing it on first access.
+
+        :param name: The channel name (see metrics).
+        :type name: str
+        :return: The read only channel values.
+        :rtype: numpy.ndarray
+        """
+        return compute_channel(self.track, name, self._channels)
+
+    def channels(self) -> dict[str, np.ndarray]:
+        """
+        Get the channels computed so far, e.g. to compute other results from them without computing them again.
+
+        :return: A copy of the dictionary of the read only channel values, by name.
+        :rtype: dict[str, numpy.ndarray]
+        """
+        return dict(self._channels)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """
+        Get a channel of the activity (see channel).
+
+        :param name: The channel name.
+        :type name: str
+        :return: The read only channel values.
+        :rtype: numpy.ndarray
+        """
+        return self.channel(name)
+
+    @property
+    def data_frame(self) -> DataFrame:
+        """
+        Get the activity dataframe used by the viewers, built on first access.
+        The viewers must not modify it, as it is shared.
+
+        :return: The activity dataframe.
+        :rtype: pandas.DataFrame
+        """
+        if self._data_frame is None:
+            self._data_frame = build_data_frame(self.track, self._channels)
+
+        return self._data_frame
+
+    @property
+    def summary(self) -> ActivitySummary:
+        """
+        Get the activity summary (totals, extremes and time in zones), computed on first access.
+
+        :return: The activity summary.
+        :rtype: ActivitySummary
+        """
+        if self._summary is None:
+            self._summary = summarize_track(self.track, self._channels)
+
+        return self._summary
+
+    def smoothed_grades(self, smoothing: GradeSmoothing | None = None) -> SmoothedGrades:
+        """
+        Get the smoothed grades of the activity, computed on first access for each smoothing.
+
+        :param smoothing: The smoothing settings, the default mean if None (see grade_smoothing).
+        :type smoothing: GradeSmoothing | None
+        :return: The smoothed grades.
+        :rtype: SmoothedGrades
+        """
+        smoothing = smoothing if smoothing is not None else GradeSmoothing()
+        if smoothing not in self._smoothed_grades:
+            self._smoothed_grades[smoothing] = smooth_grades(self["distance"], self["elevation_gain"], smoothing)
+
+        return self._smoothed_grades[smoothing]
+
+    @property
+    def pyramid(self) -> AggregationPyramid:
+        """
+        Get the distance and time aggregates of the activity (see aggregation_pyramid), built on first access,
+        or extended from the pyramid of its first points.
+
+        :return: The aggregation pyramid.
+        :rtype: AggregationPyramid
+        """
+        if self._pyramid is None:
+            channels = {name: self[name] for name in AGGREGATED_CHANNELS}
+            if self._previous_pyramid is not None:
+                self._pyramid = extend_pyramid(self._previous_pyramid, self["total_distance"], self["time"], channels)
+                self._previous_pyramid = None
+            else:
+                self._pyramid = build_pyramid(self["total_distance"], self["time"], channels)
+
+        return self._pyramid
+
+    @property
+    def latest_pyramid(self) -> AggregationPyramid | None:
+        """
+        Get the aggregation pyramid without building it: the pyramid of the activity if it was already built,
+        otherwise the pyramid of the first points it would be extended from.
+
+        :return: The pyramid, None if none was built.
+        :rtype: AggregationPyramid | None
+        """
+        return self._pyramid if self._pyramid is not None else self._previous_pyramid
@@ -0,0 +1,292 @@
+import hashlib
+import os
+import threading
+from typing import TYPE_CHECKING, Callable
+
+from activity import Activity
+from gpx_processor import PROCESSOR_VERSION, get_track_from_gpx_file
+from gpx_sources import open_raw_source
+from instrumentation import span
+from track import Track
+
+if TYPE_CHECKING:
+    from batch_ingestion import ActivityStore
+
+"""
+Persistent cache of parsed activities.
+Each entry holds the track of a gpx file (see Track.save), stored column by column in an
+uncompressed NumPy archive (.npz), and is keyed by the file content hash plus the processor
+version (see activity_key). The cache is bounded in size, evicting the least recently used entries.
+A cache can be backed by an activity store (see batch_ingestion): the tracks ingested into the
+store are read from it, without parsing their gpx files again nor copying them into the cache.
+
+Environment variables:
+- GPX_VIEWER_CACHE_DIR: the cache directory.
+- GPX_VIEWER_CACHE_MAX_MB: the maximum cache size, in megabytes.
+- GPX_VIEWER_CACHE_DISABLED: set to 1 to disable the cache.
+"""
+
+DEFAULT_MAX_SIZE_BYTES = 512*1024*1024
+
+_HASH_CHUNK_SIZE = 1024*1024
+_ENTRY_SUFFIX = ".npz"
+
+
+def default_cache_directory() -> str:
+    """
+    Get the default cache directory.
+
+    :return: The cache directory path.
+    :rtype: str
+    """
+    if "GPX_VIEWER_CACHE_DIR" in os.environ:
+        return os.environ["GPX_VIEWER_CACHE_DIR"]
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+
+    return os.path.join(base, "strava-gpx-viewer")
+
+def hash_file_content(file_name: str) -> str:
+    """
+    Hash the content of a file. Compressed files are hashed as they are stored.
+
+    :param file_name: The path of the file, or of a member inside a zip archive (see gpx_sources).
+    :type file_name: str
+    :return: The hexadecimal content hash.
+    :rtype: str
+    """
+    content_hash = hashlib.blake2b(digest_size=20)
+    with open_raw_source(file_name) as file:
+        for chunk in iter(lambda: file.read(_HASH_CHUNK_SIZE), b""):
+            content_hash.update(chunk)
+
+    return content_hash.hexdigest()
+
+def activity_key(file_name: str) -> str:
+    """
+    Get the key of the track of a gpx file, in the cache and in the activity store.
+
+    :param file_name: The path of the gpx file.
+    :type file_name: str
+    :return: The key: the file content hash plus the processor version.
+    :rtype: str
+    """
+    return f"{hash_file_content(file_name)}-v{PROCESSOR_VERSION}"
+
+
+class ActivityCache:
+    def __init__(self, directory: str | None = None, max_size_bytes: int | None = None, enabled: bool | None = None,
+                 store: "ActivityStore | None" = None):
+        """
+        Class constructor.
+
+        :param directory: The cache directory. Defaults to default_cache_directory().
+        :type directory: str | None
+        :param max_size_bytes: The maximum size of the cache. Defaults to GPX_VIEWER_CACHE_MAX_MB or DEFAULT_MAX_SIZE_BYTES.
+        :type max_size_bytes: int | None
+        :param enabled: Whether the cache is used. Defaults to True unless GPX_VIEWER_CACHE_DISABLED is set.
+        :type enabled: bool | None
+        :param store: The activity store the ingested tracks are read from, before parsing their gpx files.
+        :type store: ActivityStore | None
+        """
+        self._directory = directory if directory is not None else default_cache_directory()
+
+        if max_size_bytes is None:
+            max_size_mb = os.environ.get("GPX_VIEWER_CACHE_MAX_MB")
+            max_size_bytes = int(float(max_size_mb)*1024*1024) if max_size_mb else DEFAULT_MAX_SIZE_BYTES
+        self._max_size_bytes = max_size_bytes
+
+        if enabled is None:
+            enabled = os.environ.get("GPX_VIEWER_CACHE_DISABLED", "0") not in ("1", "true", "yes")
+        self.enabled = enabled
+        self._store = store
+
+    @property
+    def directory(self) -> str:
+        """
+        Get the cache directory.
+
+        :return: The cache directory path.
+        :rtype: str
+        """
+        return self._directory
+
+    def key(self, file_name: str) -> str:
+        """
+        Get the cache key of a gpx file.
+
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :return: The cache key.
+        :rtype: str
+        """
+        return activity_key(file_name)
+
+    def _entry_path(self, key: str) -> str:
+        """
+        Get the path of a cache entry.
+
+        :param key: The cache key.
+        :type key: str
+        :return: The entry path.
+        :rtype: str
+        """
+        return os.path.join(self._directory, key + _ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Track | None:
+        """
+        Get a cached track.
+
+        :param key: The cache key.
+        :type key: str
+        :return: The cached track, or None if it is not cached.
+        :rtype: Track | None
+        """
+        if not self.enabled:
+            return None
+
+        path = self._entry_path(key)
+        try:
+            track = Track.load(path)
+            os.utime(path) # Marks the entry as recently used
+            return track
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            # Corrupted entry, it will be overwritten
+            self._remove(path)
+            return None
+
+    def put(self, key: str, track: Track) -> None:
+        """
+        Store a track in the cache, evicting old entries if the cache is full.
+
+        :param key: The cache key.
+        :type key: str
+        :param track: The track to be cached.
+        :type track: Track
+        :return: None
+        :rtype: None
+        """
+        if not self.enabled:
+            return
+
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            path = self._entry_path(key)
+            temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "wb") as file:
+                track.save(file)
+            os.replace(temporary_path, path)
+        except OSError:
+            print("Error writing to the activity cache")
+            return
+
+        self._evict()
+
+    def load(self, file_name: str) -> Track:
+        """
+        Get the track of a gpx file, from the cache if possible.
+
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :return: The track read from the gpx file.
+        :rtype: Track
+        """
+        return self.load_activity(file_name).track
+
+    def load_activity(self, file_name: str, progress_callback: Callable[[int, int], None] | None = None) -> Activity:
+        """
+        Get the activity of a gpx file, reading its track from the cache or the activity store if possible.
+
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :param progress_callback: Called while reading the gpx file with the number of bytes read so far and the total.
+        :type progress_callback: Callable[[int, int], None] | None
+        :return: The activity, identified by its cache key.
+        :rtype: Activity
+        """
+        with span("cache.load", file=file_name) as details:
+            key = self.key(file_name)
+            track = self.get(key)
+            details["hit"] = track is not None
+            if track is None and self._store is not None and self._store.contains(key):
+                try:
+                    track = self._store.load(key)
+                    details["store_hit"] = True
+                except (OSError, ValueError, KeyError):
+                    # Corrupted entry, the gpx file is parsed again
+                    track = None
+            if track is None:
+                track = get_track_from_gpx_file(file_name, progress_callback=progress_callback)
+                self.put(key, track)
+
+        return Activity(track, key)
+
+    def invalidate(self, file_name: str) -> None:
+        """
+        Remove the cache entry of a gpx file.
+
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :return: None
+        :rtype: None
+        """
+        self._remove(self._entry_path(self.key(file_name)))
+
+    def clear(self) -> None:
+        """
+        Remove all the cache entries.
+
+        :return: None
+        :rtype: None
+        """
+        for path, _, _ in self._entries():
+            self._remove(path)
+
+    def _entries(self) -> list[tuple[str, float, int]]:
+        """
+        List the cache entries.
+
+        :return: The path, last use time and size of each entry.
+        :rtype: list[tuple[str, float, int]]
+        """
+        entries = []
+        try:
+            with os.scandir(self._directory) as it:
+                for entry in it:
+                    if entry.name.endswith(_ENTRY_SUFFIX):
+                        stat = entry.stat()
+                        entries.append((entry.path, stat.st_mtime, stat.st_size))
+        except FileNotFoundError:
+            pass
+
+        return entries
+
+    def _evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits its maximum size.
+
+        :return: None
+        :rtype: None
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total_size = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total_size <= self._max_size_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+
+    def _remove(self, path: str) -> None:
+        """
+        Remove a cache entry file, ignoring missing files.
+
+        :param path: The entry path.
+        :type path: str
+        :return: None
+        :rtype: None
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
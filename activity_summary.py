@@ -0,0 +1,161 @@
+import numpy as np
+
+from instrumentation import timed
+from metrics import ROLLING_MEAN_WINDOW, compute_channel
+
+"""
+Activity summary: the totals and extremes shown by the stats labels, the charts annotations,
+the pdf report and the batch reports.
+They are computed together from the metric channels, with array reductions only, and cached
+on the activity (see Activity.summary), so none of the viewers scans the columns again.
+
+Times are summed inside the segments: the pauses between two segments are neither elapsed
+nor moving time.
+"""
+
+# Below this speed (Km/h) the athlete is considered stopped
+MOVING_SPEED = 1.0
+# Lower bounds (Km/h) of the speed zones, the last zone has no upper bound
+SPEED_ZONES = (0, 10, 20, 30, 40)
+
+
+class ActivitySummary:
+    __slots__ = ("start_time", "number_of_points", "number_of_segments", "distance", "elapsed_time", "moving_time",
+                 "average_speed", "average_moving_speed", "max_speed", "average_speed_std_dev", "elevation_gain",
+                 "elevation_loss", "max_grade", "speed_zone_times")
+
+    def __init__(self, **values):
+        """
+        Class constructor.
+
+        :param values: The summary fields (see summarize_track).
+        :type values: dict
+        """
+        for name in self.__slots__:
+            setattr(self, name, values[name])
+
+    @property
+    def start_datetime(self) -> np.datetime64:
+        """
+        Get the activity start time.
+
+        :return: The UTC start time.
+        :rtype: numpy.datetime64
+        """
+        return np.datetime64(self.start_time, "ns")
+
+    def speed_zones(self) -> list[tuple[str, float]]:
+        """
+        Get the time spent in each speed zone.
+
+        :return: The zone labels (e.g. "10-20 Km/h") and the time in seconds spent in them.
+        :rtype: list[tuple[str, float]]
+        """
+        labels = [f"{lower}-{upper} Km/h" for lower, upper in zip(SPEED_ZONES, SPEED_ZONES[1:])]
+        labels.append(f"{SPEED_ZONES[-1]}+ Km/h")
+
+        return list(zip(labels, self.speed_zone_times.tolist()))
+
+    def to_dict(self) -> dict:
+        """
+        Get the summary as a JSON serializable dictionary.
+
+        :return: The summary fields, with the start time in ISO format, the speed zones by label and None
+                 instead of the non finite values, which are not valid JSON.
+        :rtype: dict
+        """
+        values = {name: getattr(self, name) for name in self.__slots__}
+        for name, value in values.items():
+            if isinstance(value, float) and not np.isfinite(value):
+                values[name] = None
+        values["start_time"] = np.datetime_as_string(self.start_datetime, unit="s", timezone="UTC")
+        values["speed_zone_times"] = dict(self.speed_zones())
+
+        return values
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Format a duration as shown by the viewer.
+
+    :param seconds: The duration in seconds.
+    :type seconds: float
+    :return: The duration as HH:MM:SS.
+    :rtype: str
+    """
+    return f'{int(seconds) // 3600:02d}:{int(seconds) // 60 % 60:02d}:{int(seconds) % 60:02d}'
+
+@timed("metrics.summary")
+def summarize_track(track, memo: dict[str, np.ndarray]) -> ActivitySummary:
+    """
+    Compute the summary of a track from its channels.
+
+    :param track: The track with the base channel arrays.
+    :type track: Track
+    :param memo: The dictionary with the already computed channels. It is updated in place.
+    :type memo: dict[str, numpy.ndarray]
+    :return: The summary.
+    :rtype: ActivitySummary
+    """
+    channel = lambda name: compute_channel(track, name, memo)
+    if len(track) == 0:
+        raise ValueError("Cannot summarize an activity without points")
+
+    segment_starts = channel("segment_starts")
+    distances = channel("distance")
+    elevation_gains = channel("elevation_gain")
+    speeds = channel("speed")
+
+    # The time from the previous point, 0 on the first point of each segment
+    delta_times = channel("delta_time").copy()
+    delta_times[segment_starts] = 0
+    moving = speeds >= MOVING_SPEED
+
+    elapsed_time = float(delta_times.sum())
+    moving_time = float(delta_times @ moving)
+    distance = float(distances.sum())
+    # The points without elevation (NaN, see gpx_reader) are skipped, as NaN is neither a gain nor a loss
+    elevation_gain = float(np.where(elevation_gains > 0, elevation_gains, 0).sum())
+    elevation_loss = float(np.where(elevation_gains < 0, -elevation_gains, 0).sum())
+    average_speed = 3.6*distance/elapsed_time if elapsed_time > 0 else 0.0
+
+    # The grade of the distance covered by the last points, as the grade of a single point is mostly noise
+    window = min(ROLLING_MEAN_WINDOW, len(distances))
+    total_distances = np.concatenate(([0], channel("total_distance")))
+    missing = np.isnan(elevation_gains)
+    has_missing = bool(missing.any())
+    known_gains = np.where(missing, 0, elevation_gains) if has_missing else elevation_gains
+    total_elevation_gains = np.concatenate(([0], known_gains.cumsum()))
+    window_distances = total_distances[window:] - total_distances[:-window]
+    window_gains = total_elevation_gains[window:] - total_elevation_gains[:-window]
+    valid = window_distances > 0
+    if has_missing:
+        # The windows with a point without elevation have no known grade
+        total_missing = np.concatenate(([0], missing.cumsum()))
+        valid &= total_missing[window:] == total_missing[:-window]
+    grades = 100*window_gains[valid]/window_distances[valid]
+
+    # The time of each point is counted in the zone of its speed
+    zones = np.searchsorted(SPEED_ZONES[1:], speeds, side="right")
+    speed_zone_times = np.bincount(zones, weights=delta_times, minlength=len(SPEED_ZONES))
+
+    smoothed_speeds = channel("speed_rollmean")
+    average_speeds = channel("avg_speed")
+
+    return ActivitySummary(start_time=int(channel("time")[0]),
+                           number_of_points=len(track),
+                           number_of_segments=len(segment_starts),
+                           distance=distance,
+                           elapsed_time=elapsed_time,
+                           moving_time=moving_time,
+                           average_speed=average_speed,
+                           average_moving_speed=3.6*float(distances @ moving)/moving_time if moving_time > 0 else 0.0,
+                           # Smoothed, as a single GPS jump would otherwise be the maximum
+                           max_speed=float(np.nanmax(smoothed_speeds)) if np.isfinite(smoothed_speeds).any()
+                                     else float(speeds.max()),
+                           average_speed_std_dev=float(np.std(average_speeds, ddof=1)) if len(average_speeds) > 1
+                                                 else 0.0,
+                           elevation_gain=elevation_gain,
+                           elevation_loss=elevation_loss,
+                           max_grade=float(np.nanmax(grades)) if np.isfinite(grades).any() else 0.0,
+                           speed_zone_times=speed_zone_times)
@@ -1,28 +1,184 @@
-from PyQt6.QtWidgets import QWidget, QTabWidget, QVBoxLayout
+from typing import Callable
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QWidget, QTabWidget, QVBoxLayout, QLabel
+from background_jobs import Job
 from grade_detailed_dashboard import GradeDetailedDashboard
 from speed_detailed_dashboard import SpeedDetailedDashboard
+from instrumentation import span
 from pandas import DataFrame
 
 """
-Window to hold advanced dashboards about the speed and grade data. 
+Window to hold advanced dashboards about the speed and grade data.
+A tab is only built when it is first shown: its data is prepared in a background job, behind a
+placeholder, and then its charts are drawn. The prepared data is kept with the activity, so the
+tabs of a reopened window are built at once.
 """
-class AdvancedDashboardViewer(QWidget):
+
+# The dashboard class of each tab, by tab name. Each class prepares its data (prepare_data) and is built from it
+DASHBOARD_TABS = {"Grade": GradeDetailedDashboard, "Speed": SpeedDetailedDashboard}
+
+
+class AdvancedDashboardData:
+    __slots__ = ("data_frame", "_prepared", "_jobs", "_callbacks")
+
     def __init__(self, data_frame: DataFrame):
         """
-        Class constructor
-        
-        :param data_frame: Dataframe containing the data to be used on class object initialization.
+        Class constructor.
+
+        :param data_frame: Dataframe containing the activity data used by the dashboards.
         :type data_frame: pandas.DataFrame
         """
+        self.data_frame = data_frame
+        # The prepared data of each tab, by tab name
+        self._prepared = {}
+        # The running preparation job of each tab and the callbacks waiting for it
+        self._jobs = {}
+        self._callbacks = {}
+
+    def prepare(self, tab: str, ready: Callable[[dict], None], failed: Callable[[str], None]) -> None:
+        """
+        Get the prepared data of a tab. It is prepared in a background job the first time.
+
+        :param tab: The tab name (see DASHBOARD_TABS).
+        :type tab: str
+        :param ready: Called, in the GUI thread, with the prepared data.
+        :type ready: Callable[[dict], None]
+        :param failed: Called, in the GUI thread, with the error message if the data could not be prepared.
+        :type failed: Callable[[str], None]
+        :return: None
+        :rtype: None
+        """
+        if tab not in DASHBOARD_TABS:
+            raise ValueError(f"Unknown tab {tab}. Expected one of {', '.join(DASHBOARD_TABS)}")
+
+        if tab in self._prepared:
+            ready(self._prepared[tab])
+            return
+
+        self._callbacks.setdefault(tab, []).append((ready, failed))
+        if tab in self._jobs:
+            return
+
+        dashboard_class = DASHBOARD_TABS[tab]
+        job = Job([(f"Preparing the {tab.lower()} charts", lambda job, df: dashboard_class.prepare_data(df))],
+                  self.data_frame)
+        job.signals.finished.connect(lambda data: self._prepared_data(tab, data))
+        job.signals.failed.connect(lambda error: self._preparation_failed(tab, error))
+        self._jobs[tab] = job
+        job.start()
+
+    def _prepared_data(self, tab: str, data: dict) -> None:
+        """
+        Keep the prepared data of a tab and deliver it to the waiting callbacks.
+
+        :param tab: The tab name.
+        :type tab: str
+        :param data: The prepared data.
+        :type data: dict
+        :return: None
+        :rtype: None
+        """
+        self._prepared[tab] = data
+        del self._jobs[tab]
+        for ready, _ in self._callbacks.pop(tab, []):
+            ready(data)
+
+    def _preparation_failed(self, tab: str, error: str) -> None:
+        """
+        Report a failed preparation to the waiting callbacks. The next request of the tab prepares it again.
+
+        :param tab: The tab name.
+        :type tab: str
+        :param error: The error message.
+        :type error: str
+        :return: None
+        :rtype: None
+        """
+        del self._jobs[tab]
+        for _, failed in self._callbacks.pop(tab, []):
+            failed(error)
+
+
+class AdvancedDashboardViewer(QWidget):
+    def __init__(self, data: AdvancedDashboardData):
+        """
+        Class constructor
+
+        :param data: The activity data of the dashboards, with the data already prepared for them.
+        :type data: AdvancedDashboardData
+        """
         super().__init__()
         layout = QVBoxLayout(self)
         self._redraw = False
+        self._data = data
+
+        # The tabs start as a placeholder, replaced by the dashboard once its data is prepared
+        self._tab_widget = QTabWidget()
+        self._placeholders = {}
+        self._requested_tabs = set()
+        for tab in DASHBOARD_TABS:
+            page = QWidget()
+            placeholder = QLabel(f"Preparing the {tab.lower()} charts...")
+            placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            QVBoxLayout(page).addWidget(placeholder)
+            self._placeholders[tab] = placeholder
+            self._tab_widget.addTab(page, tab)
 
-        tab_widget = QTabWidget()
-        tab_widget.addTab(GradeDetailedDashboard(data_frame), "Grade")
-        tab_widget.addTab(SpeedDetailedDashboard(data_frame), "Speed")
+        self._tab_widget.currentChanged.connect(self._show_tab)
+        layout.addWidget(self._tab_widget)
 
-        layout.addWidget(tab_widget)
-        
         self.resize(1024, 900)
+        self._show_tab(self._tab_widget.currentIndex())
+
+    def _show_tab(self, index: int) -> None:
+        """
+        Build the dashboard of a tab the first time it is shown.
 
+        :param index: The tab index.
+        :type index: int
+        :return: None
+        :rtype: None
+        """
+        tab = self._tab_widget.tabText(index)
+        if tab not in self._placeholders or tab in self._requested_tabs:
+            return
+
+        self._requested_tabs.add(tab)
+        self._data.prepare(tab, lambda data: self._build_dashboard(index, tab, data),
+                           lambda error: self._show_error(tab, error))
+
+    def _build_dashboard(self, index: int, tab: str, data: dict) -> None:
+        """
+        Replace the placeholder of a tab by its dashboard.
+
+        :param index: The tab index.
+        :type index: int
+        :param tab: The tab name.
+        :type tab: str
+        :param data: The prepared data of the dashboard.
+        :type data: dict
+        :return: None
+        :rtype: None
+        """
+        with span("chart.advanced_dashboard_tab", tab=tab):
+            placeholder = self._placeholders.pop(tab)
+            page = self._tab_widget.widget(index)
+            page.layout().removeWidget(placeholder)
+            placeholder.hide()
+            placeholder.deleteLater()
+            page.layout().addWidget(DASHBOARD_TABS[tab](data))
+
+    def _show_error(self, tab: str, error: str) -> None:
+        """
+        Show why the data of a tab could not be prepared. It is prepared again the next time the tab is shown.
+
+        :param tab: The tab name.
+        :type tab: str
+        :param error: The error message.
+        :type error: str
+        :return: None
+        :rtype: None
+        """
+        self._placeholders[tab].setText(f"The {tab.lower()} charts could not be prepared: {error}")
+        self._requested_tabs.discard(tab)
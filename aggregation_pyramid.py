@@ -0,0 +1,412 @@
+import numpy as np
+
+from instrumentation import timed
+
+"""
+Multi-resolution aggregates of an activity.
+The points are grouped in buckets of distance (10 m, 100 m and 1 km of accumulated distance)
+and of time (1 minute since the start), and each level keeps, for every aggregated channel, the
+number of known values, their sum, mean, minimum, maximum and the value of the last point of
+each bucket. The finest distance level is computed from the points in one pass (cumulative
+sums, bucket bounds found with searchsorted), each coarser one from the level below it, so the
+whole pyramid costs about as much as its first level.
+When points are appended to an activity (see live_activity), only the last bucket of each level
+can gain points: the pyramid is extended by aggregating again the points of the last bucket of
+the coarsest level of each axis, with the new ones, instead of every point (see extend_pyramid).
+
+Charts, tables and reports take the coarsest level satisfying their resolution (see
+AggregationPyramid.level_for) instead of grouping the points again, e.g. the 100 m level gives
+the rows of the pdf report table and the colored grade areas of the elevation chart.
+Non-finite values (e.g. the grade where the distance is 0) are unknown: they are ignored by the
+statistics, and the last value of a bucket ending with one is NaN.
+"""
+
+DISTANCE = "distance"
+TIME = "time"
+
+# The levels of each axis, from the finest to the coarsest, with their bucket width: meters for the
+# distance axis, seconds for the time axis. The coarser widths are multiples of the finer ones.
+LEVELS = {DISTANCE: {"10m": 10, "100m": 100, "1km": 1000},
+          TIME: {"1min": 60}}
+# The aggregated channels (see metrics)
+AGGREGATED_CHANNELS = ("distance", "delta_time", "elevation", "elevation_gain", "grade", "speed")
+STATISTICS = ("count", "sum", "mean", "min", "max", "last")
+
+NANOSECONDS_PER_SECOND = 1_000_000_000
+
+
+class AggregationLevel:
+    __slots__ = ("name", "axis", "width", "buckets", "starts", "ends", "channels", "_statistics")
+
+    def __init__(self, name: str, axis: str, width: float, buckets: np.ndarray, starts: np.ndarray,
+                 ends: np.ndarray, channels: tuple[str, ...], statistics: dict[str, np.ndarray]):
+        """
+        Class constructor.
+        The aggregates of the points of an activity, grouped in buckets of the same width. Only the
+        buckets with points are kept. The arrays are read only, as they are shared.
+
+        :param name: The level name (see LEVELS).
+        :type name: str
+        :param axis: The axis the points are grouped on, DISTANCE or TIME.
+        :type axis: str
+        :param width: The bucket width, in meters or seconds.
+        :type width: float
+        :param buckets: The number of each bucket, i.e. its lower bound divided by the width.
+        :type buckets: numpy.ndarray
+        :param starts: The index of the first point of each bucket.
+        :type starts: numpy.ndarray
+        :param ends: The index after the last point of each bucket.
+        :type ends: numpy.ndarray
+        :param channels: The aggregated channel names.
+        :type channels: tuple[str, ...]
+        :param statistics: The values of each statistic (see STATISTICS), one row per channel.
+        :type statistics: dict[str, numpy.ndarray]
+        """
+        self.name = name
+        self.axis = axis
+        self.width = width
+        self.buckets = buckets
+        self.starts = starts
+        self.ends = ends
+        self.channels = channels
+        self._statistics = statistics
+
+        for values in [buckets, starts, ends, *statistics.values()]:
+            values.flags.writeable = False
+
+    def __len__(self) -> int:
+        """
+        Get the number of buckets.
+
+        :return: The number of buckets with points.
+        :rtype: int
+        """
+        return len(self.buckets)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """
+        Get the lower bound of each bucket, e.g. the KM channel value of its points for the 100 m level.
+
+        :return: The bounds, in Km for the distance levels and in minutes for the time levels.
+        :rtype: numpy.ndarray
+        """
+        return self.buckets*self.width/(1000 if self.axis == DISTANCE else 60)
+
+    @property
+    def last_rows(self) -> np.ndarray:
+        """
+        Get the index of the last point of each bucket.
+
+        :return: The point indices.
+        :rtype: numpy.ndarray
+        """
+        return self.ends - 1
+
+    def values(self, channel: str, statistic: str = "mean") -> np.ndarray:
+        """
+        Get a statistic of a channel in each bucket.
+
+        :param channel: The channel name, one of AGGREGATED_CHANNELS.
+        :type channel: str
+        :param statistic: The statistic, one of STATISTICS. The mean, minimum and maximum are NaN in the
+                          buckets without any known value.
+        :type statistic: str
+        :return: The read only values.
+        :rtype: numpy.ndarray
+        """
+        if channel not in self.channels:
+            raise ValueError(f"Unknown aggregated channel '{channel}'. Expected one of {self.channels}")
+        if statistic not in STATISTICS:
+            raise ValueError(f"Unknown statistic '{statistic}'. Expected one of {STATISTICS}")
+
+        return self._statistics[statistic][self.channels.index(channel)]
+
+
+class AggregationPyramid:
+    __slots__ = ("_levels", )
+
+    def __init__(self, levels: list[AggregationLevel]):
+        """
+        Class constructor.
+
+        :param levels: The levels of every axis, from the finest to the coarsest in each axis.
+        :type levels: list[AggregationLevel]
+        """
+        self._levels = {level.name: level for level in levels}
+
+    @property
+    def levels(self) -> list[AggregationLevel]:
+        """
+        Get the levels.
+
+        :return: The levels of every axis, from the finest to the coarsest in each axis.
+        :rtype: list[AggregationLevel]
+        """
+        return list(self._levels.values())
+
+    def level(self, name: str) -> AggregationLevel:
+        """
+        Get a level by name.
+
+        :param name: The level name (see LEVELS).
+        :type name: str
+        :return: The level.
+        :rtype: AggregationLevel
+        """
+        if name not in self._levels:
+            raise ValueError(f"Unknown aggregation level '{name}'. Expected one of {tuple(self._levels)}")
+
+        return self._levels[name]
+
+    def level_for(self, axis: str, resolution: float) -> AggregationLevel | None:
+        """
+        Get the coarsest level of an axis whose buckets are not wider than a resolution.
+
+        :param axis: The axis, DISTANCE or TIME.
+        :type axis: str
+        :param resolution: The largest bucket width, in meters or seconds, e.g. the distance shown by a pixel.
+        :type resolution: float
+        :return: The level, None if every level is too coarse (the full resolution points must be used).
+        :rtype: AggregationLevel | None
+        """
+        if axis not in LEVELS:
+            raise ValueError(f"Unknown aggregation axis '{axis}'. Expected one of {tuple(LEVELS)}")
+
+        candidates = [level for level in self._levels.values() if level.axis == axis and level.width <= resolution]
+
+        return max(candidates, key=lambda level: level.width, default=None)
+
+
+def _bucket_bounds(bucket_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the bounds of the buckets of sorted items.
+
+    :param bucket_ids: The bucket number of each item, in non decreasing order.
+    :type bucket_ids: numpy.ndarray
+    :return: The numbers of the buckets with items, the index of their first item and the index after their last one.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    """
+    if len(bucket_ids) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    buckets = np.arange(bucket_ids[0], bucket_ids[-1] + 1)
+    starts = np.searchsorted(bucket_ids, buckets, side="left")
+    ends = np.append(starts[1:], len(bucket_ids))
+    with_items = ends > starts
+
+    return buckets[with_items], starts[with_items], ends[with_items]
+
+def _cumulative_sums(values: np.ndarray) -> np.ndarray:
+    """
+    Get the cumulative sums of the rows of a matrix, starting with 0.
+
+    :param values: The values, one row per channel.
+    :type values: numpy.ndarray
+    :return: The sums of the values before each column, with one more column.
+    :rtype: numpy.ndarray
+    """
+    sums = np.zeros((values.shape[0], values.shape[1] + 1), dtype=np.result_type(values.dtype, np.int64))
+    np.cumsum(values, axis=1, out=sums[:, 1:])
+
+    return sums
+
+def _bucket_statistics(cumulative_counts: np.ndarray, cumulative_sums: np.ndarray, minimums: np.ndarray,
+                       maximums: np.ndarray, lasts: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Get the statistics of the buckets of a level, from the points or from the buckets of the level below.
+
+    :param cumulative_counts: The cumulative number of known values (see _cumulative_sums), one row per channel.
+    :type cumulative_counts: numpy.ndarray
+    :param cumulative_sums: The cumulative sums of the known values, one row per channel.
+    :type cumulative_sums: numpy.ndarray
+    :param minimums: The values, or the minimums of the finer buckets, NaN if unknown. One row per channel.
+    :type minimums: numpy.ndarray
+    :param maximums: The values, or the maximums of the finer buckets, NaN if unknown. One row per channel.
+    :type maximums: numpy.ndarray
+    :param lasts: The values, or the last values of the finer buckets. One row per channel.
+    :type lasts: numpy.ndarray
+    :param starts: The index of the first item of each bucket.
+    :type starts: numpy.ndarray
+    :param ends: The index after the last item of each bucket.
+    :type ends: numpy.ndarray
+    :return: The values of each statistic (see STATISTICS), one row per channel.
+    :rtype: dict[str, numpy.ndarray]
+    """
+    counts = cumulative_counts[:, ends] - cumulative_counts[:, starts]
+    sums = cumulative_sums[:, ends] - cumulative_sums[:, starts]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.where(counts > 0, sums/counts, np.nan)
+    with_items = len(starts) > 0
+
+    return {"count": counts,
+            "sum": sums,
+            "mean": means,
+            "min": np.fmin.reduceat(minimums, starts, axis=1) if with_items else means.copy(),
+            "max": np.fmax.reduceat(maximums, starts, axis=1) if with_items else means.copy(),
+            "last": lasts[:, ends - 1]}
+
+def _axis_levels(axis: str, positions: np.ndarray, channels: tuple[str, ...], values: np.ndarray,
+                 cumulative_counts: np.ndarray, cumulative_sums: np.ndarray) -> list[AggregationLevel]:
+    """
+    Build the levels of an axis, the finest one from the points and each other one from the level below it.
+
+    :param axis: The axis, DISTANCE or TIME.
+    :type axis: str
+    :param positions: The position of each point on the axis, in meters or seconds, in non decreasing order.
+    :type positions: numpy.ndarray
+    :param channels: The aggregated channel names.
+    :type channels: tuple[str, ...]
+    :param values: The values of the points, NaN if unknown. One row per channel.
+    :type values: numpy.ndarray
+    :param cumulative_counts: The cumulative number of known values of the points, one row per channel.
+    :type cumulative_counts: numpy.ndarray
+    :param cumulative_sums: The cumulative sums of the known values of the points, one row per channel.
+    :type cumulative_sums: numpy.ndarray
+    :return: The levels, from the finest to the coarsest.
+    :rtype: list[AggregationLevel]
+    """
+    levels = []
+    finer = None
+    for name, width in LEVELS[axis].items():
+        if finer is None:
+            buckets, starts, ends = _bucket_bounds((positions/width).astype(np.int64))
+            statistics = _bucket_statistics(cumulative_counts, cumulative_sums, values, values, values, starts, ends)
+        else:
+            # The buckets of the finer level are nested in these ones
+            buckets, group_starts, group_ends = _bucket_bounds(finer.buckets//int(width//finer.width))
+            starts, ends = finer.starts[group_starts], finer.ends[group_ends - 1]
+            finer_statistics = finer._statistics
+            statistics = _bucket_statistics(_cumulative_sums(finer_statistics["count"]),
+                                            _cumulative_sums(finer_statistics["sum"]),
+                                            finer_statistics["min"], finer_statistics["max"], finer_statistics["last"],
+                                            group_starts, group_ends)
+        finer = AggregationLevel(name, axis, width, buckets, starts, ends, channels, statistics)
+        levels.append(finer)
+
+    return levels
+
+def _point_values(channels: dict[str, np.ndarray], names: tuple[str, ...], start: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the values of the aggregated channels of the points from an index on, with their cumulative sums.
+
+    :param channels: The values of the aggregated channels, by name.
+    :type channels: dict[str, numpy.ndarray]
+    :param names: The aggregated channel names, in row order.
+    :type names: tuple[str, ...]
+    :param start: The index of the first point.
+    :type start: int
+    :return: The values, NaN if unknown, the cumulative number of known values and their cumulative sums. One row per channel.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    """
+    # One row per channel: each pass over the points covers every channel
+    rows = [np.asarray(channels[name])[start:] for name in names]
+    values = np.array(rows, dtype=np.float64).reshape(len(names), len(rows[0]) if rows else 0)
+    known = np.isfinite(values)
+    values[~known] = np.nan
+
+    return values, _cumulative_sums(known), _cumulative_sums(np.where(known, values, 0))
+
+def _elapsed_times(times: np.ndarray, start: int) -> np.ndarray:
+    """
+    Get the time since the first point of the activity of the points from an index on.
+
+    :param times: The time of each point, in UTC epoch nanoseconds.
+    :type times: numpy.ndarray
+    :param start: The index of the first point, 0 or the first point of a bucket of the time axis.
+    :type start: int
+    :return: The elapsed times in seconds, never decreasing.
+    :rtype: numpy.ndarray
+    """
+    if len(times) == 0:
+        return np.zeros(0)
+
+    # The points are expected in time order, a point before the previous one is kept in its bucket. The points
+    # before the first one of a bucket are all before the bucket, so they do not hold back the points from it.
+    return np.maximum.accumulate(times[start:] - times[0])/NANOSECONDS_PER_SECOND
+
+def _join_levels(previous: AggregationLevel, tail: AggregationLevel, start: int) -> AggregationLevel:
+    """
+    Join the buckets of a level before a point with the buckets aggregated from that point on.
+
+    :param previous: The level of the previous points.
+    :type previous: AggregationLevel
+    :param tail: The level of the points from the start on, with indices relative to it.
+    :type tail: AggregationLevel
+    :param start: The index of the first point of the tail, the first point of a bucket of the previous level.
+    :type start: int
+    :return: The level of all the points.
+    :rtype: AggregationLevel
+    """
+    kept = int(np.searchsorted(previous.starts, start))
+    statistics = {statistic: np.concatenate([values[:, :kept], tail._statistics[statistic]], axis=1)
+                  for statistic, values in previous._statistics.items()}
+
+    return AggregationLevel(previous.name, previous.axis, previous.width,
+                            np.concatenate([previous.buckets[:kept], tail.buckets]),
+                            np.concatenate([previous.starts[:kept], tail.starts + start]),
+                            np.concatenate([previous.ends[:kept], tail.ends + start]),
+                            previous.channels, statistics)
+
+@timed("metrics.aggregation_pyramid")
+def build_pyramid(total_distances: np.ndarray, times: np.ndarray, channels: dict[str, np.ndarray]) -> AggregationPyramid:
+    """
+    Build the aggregation pyramid of an activity.
+
+    :param total_distances: The accumulated distance of each point, in meters.
+    :type total_distances: numpy.ndarray
+    :param times: The time of each point, in UTC epoch nanoseconds.
+    :type times: numpy.ndarray
+    :param channels: The values of the aggregated channels, by name (see AGGREGATED_CHANNELS).
+    :type channels: dict[str, numpy.ndarray]
+    :return: The pyramid.
+    :rtype: AggregationPyramid
+    """
+    total_distances = np.asarray(total_distances, dtype=np.float64)
+    times = np.asarray(times, dtype=np.int64)
+
+    # The cumulative sums of the points are shared by the finest level of both axes
+    names = tuple(channels)
+    values, cumulative_counts, cumulative_sums = _point_values(channels, names, 0)
+
+    return AggregationPyramid(_axis_levels(DISTANCE, total_distances, names, values, cumulative_counts, cumulative_sums)
+                              + _axis_levels(TIME, _elapsed_times(times, 0), names, values, cumulative_counts,
+                                             cumulative_sums))
+
+@timed("metrics.aggregation_pyramid_extension")
+def extend_pyramid(pyramid: AggregationPyramid, total_distances: np.ndarray, times: np.ndarray,
+                   channels: dict[str, np.ndarray]) -> AggregationPyramid:
+    """
+    Build the aggregation pyramid of an activity from the pyramid of its first points, e.g. when points
+    are appended to a live activity. The result is the one of build_pyramid, but only the points of the last
+    bucket of the coarsest level of each axis, and the new ones, are aggregated.
+
+    :param pyramid: The pyramid of the first points of the activity, which must not have changed.
+    :type pyramid: AggregationPyramid
+    :param total_distances: The accumulated distance of each point, in meters.
+    :type total_distances: numpy.ndarray
+    :param times: The time of each point, in UTC epoch nanoseconds.
+    :type times: numpy.ndarray
+    :param channels: The values of the aggregated channels, by name, the ones of the pyramid.
+    :type channels: dict[str, numpy.ndarray]
+    :return: The pyramid of all the points.
+    :rtype: AggregationPyramid
+    """
+    total_distances = np.asarray(total_distances, dtype=np.float64)
+    times = np.asarray(times, dtype=np.int64)
+    names = tuple(channels)
+    if any(level.channels != names for level in pyramid.levels):
+        raise ValueError(f"The pyramid does not aggregate the channels {names}")
+
+    levels = []
+    for axis in LEVELS:
+        previous_levels = [level for level in pyramid.levels if level.axis == axis]
+        # The buckets of the finer levels are nested in the last one of the coarsest level
+        coarsest = previous_levels[-1]
+        start = int(coarsest.starts[-1]) if len(coarsest) > 0 else 0
+        positions = total_distances[start:] if axis == DISTANCE else _elapsed_times(times, start)
+        tail_levels = _axis_levels(axis, positions, names, *_point_values(channels, names, start))
+        levels.extend(_join_levels(previous, tail, start) for previous, tail in zip(previous_levels, tail_levels))
+
+    return AggregationPyramid(levels)
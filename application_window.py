@@ -1,18 +1,33 @@
 from pdf_report_generator  import PdfReportGenerator
-from gpx_processor import get_data_frame_from_gpx_file, calculate_speed_data_frame
+from activity_cache import ActivityCache
+from batch_ingestion import ActivityStore, IngestionResult, ingest_archive, ingest_folder
 
 ### For embedding in Qt
 from matplotlib.backends.qt_compat import QtWidgets
-from PyQt6.QtWidgets import QApplication, QLabel, QPushButton, QFileDialog, QGridLayout
+from PyQt6.QtWidgets import QLabel, QPushButton, QFileDialog, QGridLayout, QProgressBar, QMessageBox
+from PyQt6.QtCore import QFileSystemWatcher, QTimer
+from PyQt6.QtGui import QKeySequence, QShortcut
 from chart_dashboard import ChartDashboard
 from data_table_viewer import DataTableViewer
-from threading import Thread
-from pandas import DataFrame
+from diagnostics_panel import DiagnosticsPanel
+from background_jobs import Job
+from typing import Callable
+from activity import Activity
+from activity_summary import format_duration
+from gpx_reader import UnsupportedGpxError, UnterminatedGpxError
+from gpx_sources import ARCHIVE_EXTENSION
+from instrumentation import span
+from live_activity import LiveActivity
 
 """
 Application main class.
 This is a QMainWindow subclass. 
 """
+
+# Polling interval of the followed gpx file, used in addition to the file system watcher
+# as some recorders (and network drives) do not trigger its notifications
+LIVE_POLL_INTERVAL_MS = 2000
+
 class ApplicationWindow(QtWidgets.QMainWindow):
     def __init__(self):
         """
@@ -43,6 +58,17 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self._open_file_button.setFixedSize(100, 32)
         self._open_file_button.clicked.connect(self.open_file_dialog)
 
+        self._open_folder_button = QPushButton("Open folder")
+        self._open_folder_button.setFixedSize(100, 32)
+        self._open_folder_button.clicked.connect(self.open_folder_dialog)
+
+        self._follow_file_button = QPushButton("Follow file")
+        self._follow_file_button.setFixedSize(100, 32)
+        self._follow_file_button.setCheckable(True)
+        self._follow_file_button.setVisible(False)
+        self._follow_file_button.setToolTip("Update the stats and charts while the gpx file is being written")
+        self._follow_file_button.toggled.connect(self.follow_file)
+
         self._start_time_value_label = QLabel("")
         self._total_distance_value_label = QLabel("")
         self._total_time_value_label = QLabel("")
@@ -79,10 +105,46 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         stats_grid_layout.addWidget(self._export_to_pdf_button, 2, 2, 4, 3)
 
         self._dashboard = ChartDashboard()
+        # The ingested activities (see open_folder_dialog) are read from the activity store
+        self._activity_store = ActivityStore()
+        self._activity_cache = ActivityCache(store=self._activity_store)
+        self._activity = None
+        # The file of the shown activity, the one followed (see follow_file)
+        self._file_name = None
+        self._live_activity = None
+        self._file_watcher = QFileSystemWatcher(self)
+        self._file_watcher.fileChanged.connect(self._update_live_activity)
+        self._live_timer = QTimer(self)
+        self._live_timer.setInterval(LIVE_POLL_INTERVAL_MS)
+        self._live_timer.timeout.connect(self._update_live_activity)
+        self._job = None
+
+        self._progress_label = QLabel("")
+        self._progress_bar = QProgressBar()
+        self._progress_bar.setFixedSize(300, 20)
+        self._progress_bar.setTextVisible(False)
+        self._cancel_job_button = QPushButton("Cancel")
+        self._cancel_job_button.setFixedSize(100, 32)
+        self._cancel_job_button.clicked.connect(self.cancel_job)
+        self._show_job_widgets(False)
 
-        layout.addWidget(self._open_file_button)
+        open_buttons_layout = QtWidgets.QHBoxLayout()
+        open_buttons_layout.addWidget(self._open_file_button)
+        open_buttons_layout.addWidget(self._open_folder_button)
+        open_buttons_layout.addWidget(self._follow_file_button)
+        open_buttons_layout.addStretch()
+        open_buttons_layout.addWidget(self._progress_label)
+        open_buttons_layout.addWidget(self._progress_bar)
+        open_buttons_layout.addWidget(self._cancel_job_button)
+
+        layout.addLayout(open_buttons_layout)
         layout.addLayout(stats_grid_layout, 0) 
         layout.addWidget(self._dashboard, 1) 
+
+        self._diagnostics_panel = None
+        self._diagnostics_shortcut = QShortcut(QKeySequence("Ctrl+Shift+D"), self)
+        self._diagnostics_shortcut.activated.connect(self.show_diagnostics_panel)
+
         self.showMaximized()
 
 
@@ -93,8 +155,23 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         :return: None
         :rtype: None
         """
-        self.data_table_viewer = DataTableViewer(self._df)
-        self.data_table_viewer.show()
+        with span("action.show_data_table"):
+            self.data_table_viewer = DataTableViewer(self._activity.data_frame)
+            self.data_table_viewer.show()
+
+    def show_diagnostics_panel(self) -> None:
+        """
+        Open a window with the timings of the last operations (see instrumentation). 
+        The same window is shown again, brought to the front if it is already open.
+        
+        :return: None
+        :rtype: None
+        """
+        if self._diagnostics_panel is None:
+            self._diagnostics_panel = DiagnosticsPanel()
+        self._diagnostics_panel.show()
+        self._diagnostics_panel.raise_()
+        self._diagnostics_panel.activateWindow()
 
     def export_report_to_pdf(self) -> None:
         """
@@ -106,42 +183,381 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         file_name, _ = QtWidgets.QFileDialog.getSaveFileName(self, 
                                                             "Save File", "", "PDF Files(*.pdf)")
         if len(file_name) > 0:
-            pdf_generator = PdfReportGenerator(self._df)
-            pdf_generator.generate(file_name)
+            with span("action.export_pdf", file=file_name):
+                pdf_generator = PdfReportGenerator(self._activity.data_frame, self._dashboard.chart_images(self._activity),
+                                                   self._activity.summary, self._activity.pyramid)
+                pdf_generator.generate(file_name)
 
     def open_file_dialog(self) -> None:
         """
-        Open a file dialog to get the gpx file path. 
+        Open a file dialog to get the gpx file path and load it in background. 
+        
+        :return: None
+        :rtype: None
+        """
+        fname, _ = QFileDialog.getOpenFileName(self,"Open File", "",
+                                               "GPX Files (*.gpx *.gpx.gz *.gpx.bz2);;Zip archives (*.zip)",)
+        if len(fname) == 0:
+            return
+
+        if fname.lower().endswith(ARCHIVE_EXTENSION):
+            self._ingest(fname, ingest_archive, "Open archive")
+            return
+
+        # The shown file stays the followed one until the new file is loaded
+        job = Job([("Reading gpx file", self._load_activity),
+                   ("Computing metrics", self._compute_metrics)], fname)
+        self._start_job(job, lambda activity: self._open_file_finished(fname, activity),
+                        lambda error: self._open_file_failed(fname, error))
+
+    def _load_activity(self, job: Job, file_name: str) -> Activity | None:
+        """
+        Load the activity of a gpx file. Runs in a background job.
+        
+        :param job: The running job.
+        :type job: Job
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :return: The loaded activity, None if the file ends before its closing tags (it is still being written).
+        :rtype: Activity | None
+        """
+        with span("action.open_file", file=file_name):
+            try:
+                return self._activity_cache.load_activity(file_name, job.report_progress)
+            except UnterminatedGpxError:
+                return None
+
+    def _compute_metrics(self, job: Job, activity: Activity | None) -> Activity | None:
+        """
+        Compute the activity channels, summary, data frame and smoothed grades used by the stats and the charts.
+        Runs in a background job.
+        
+        :param job: The running job.
+        :type job: Job
+        :param activity: The loaded activity, None if the file is still being written.
+        :type activity: Activity | None
+        :return: The activity.
+        :rtype: Activity | None
+        """
+        if activity is None:
+            return None
+
+        activity.data_frame
+        activity.summary
+        activity.smoothed_grades()
+
+        return activity
+
+    def _show_activity(self, activity: Activity) -> None:
+        """
+        Show a loaded activity: its stats and its charts. 
+        
+        :param activity: The activity.
+        :type activity: Activity
+        :return: None
+        :rtype: None
+        """
+        self._activity = activity
+        with span("action.show_activity"):
+            self.initialize_stats(activity)
+            self._dashboard.initialize_charts(activity)
+
+        self._show_data_table_button.setVisible(True)
+        self._export_to_pdf_button.setVisible(True)
+
+    def _open_file_finished(self, file_name: str, activity: Activity | None) -> None:
+        """
+        Show a loaded gpx file, or follow it if it is still being written. The previous file is no longer followed.
+        
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :param activity: The activity, None if the file ends before its closing tags.
+        :type activity: Activity | None
+        :return: None
+        :rtype: None
+        """
+        self._follow_file_button.setChecked(False)
+        self._file_name = file_name
+        # Only plain gpx files can be followed while being written
+        self._follow_file_button.setVisible(file_name.lower().endswith(".gpx"))
+
+        if activity is not None:
+            self._show_activity(activity)
+        elif file_name.lower().endswith(".gpx"):
+            # A file still being written has no closing tags, it can only be followed
+            self._activity = None
+            self._follow_file_button.setChecked(True)
+        else:
+            QMessageBox.warning(self, "Open file", f"Error reading {file_name}: the file is incomplete")
+
+    def _open_file_failed(self, file_name: str, error: str) -> None:
+        """
+        Handle a gpx file that could not be loaded.
+        
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :param error: The error message.
+        :type error: str
+        :return: None
+        :rtype: None
+        """
+        QMessageBox.warning(self, "Open file", f"Error reading {file_name}: {error}")
+
+    def open_folder_dialog(self) -> None:
+        """
+        Open a folder dialog and ingest all the gpx files of the chosen folder into the activity store.
+        
+        :return: None
+        :rtype: None
+        """
+        folder = QFileDialog.getExistingDirectory(self, "Open Folder")
+        if len(folder) == 0:
+            return
+
+        self._ingest(folder, ingest_folder, "Open folder")
+
+    def _ingest(self, source: str, ingest: Callable, title: str) -> None:
+        """
+        Ingest, in background, the gpx files of a folder or archive into the activity store.
+        
+        :param source: The folder or archive path.
+        :type source: str
+        :param ingest: The ingestion function (see batch_ingestion).
+        :type ingest: Callable
+        :param title: The title of the summary message.
+        :type title: str
+        :return: None
+        :rtype: None
+        """
+        store = self._activity_store
+
+        def run(job: Job, source: str) -> list[IngestionResult]:
+            with span("action.ingest", source=source):
+                return ingest(source, store, progress_callback=lambda done, total, result: job.report_progress(done, total))
+
+        def show_summary(results: list[IngestionResult]) -> None:
+            failures = [result for result in results if not result.succeeded]
+            message = f"{len(results) - len(failures)} of {len(results)} files ingested into {store.directory}."
+            if failures:
+                message += "\n\nFailed files:\n" + "\n".join(f"{result.file_name}: {result.error}" for result in failures[:20])
+            QMessageBox.information(self, title, message)
+
+        self._start_job(Job([("Ingesting gpx files", run)], source), show_summary,
+                        lambda error: QMessageBox.warning(self, title, error))
+
+    def _start_job(self, job: Job, on_finished: Callable[[object], None], on_failed: Callable[[str], None]) -> None:
+        """
+        Start a background job, showing its progress. The running job, if any, is cancelled:
+        a stale job never delivers its result.
         
+        :param job: The job.
+        :type job: Job
+        :param on_finished: Called, in the GUI thread, with the job result.
+        :type on_finished: Callable[[object], None]
+        :param on_failed: Called, in the GUI thread, with the job error message.
+        :type on_failed: Callable[[str], None]
         :return: None
         :rtype: None
         """
-        fname, _ = QFileDialog.getOpenFileName(self,"Open File", "","GPX Files (*.gpx)",)
+        self.cancel_job()
+        self._job = job
+
+        def finish(handler: Callable | None, value: object = None) -> None:
+            if job is not self._job:
+                return
+            self._job = None
+            self._show_job_widgets(False)
+            if handler is not None:
+                handler(value)
+
+        job.signals.stage_started.connect(lambda index, count, name: self._show_job_stage(job, index, count, name))
+        job.signals.progress.connect(lambda done, total: self._show_job_progress(job, done, total))
+        job.signals.finished.connect(lambda result: finish(on_finished, result))
+        job.signals.failed.connect(lambda error: finish(on_failed, error))
+        job.signals.cancelled.connect(lambda: finish(None))
+
+        self._show_job_widgets(True)
+        job.start()
+
+    def cancel_job(self) -> None:
+        """
+        Cancel the running background job.
+        
+        :return: None
+        :rtype: None
+        """
+        if self._job is not None:
+            self._job.cancel()
+            self._job = None
+        self._show_job_widgets(False)
+
+    def _show_job_widgets(self, visible: bool) -> None:
+        """
+        Show or hide the job progress widgets.
         
-        if len(fname) > 0: 
-            self._df = get_data_frame_from_gpx_file(fname)
-            calculate_speed_data_frame(self._df)
-            Thread(target = self.initialize_stats, args=[self._df]).start()                                               
-            Thread(target = self._dashboard.initialize_charts, args=[self._df]).start()                                                                     
+        :param visible: Whether the widgets are shown.
+        :type visible: bool
+        :return: None
+        :rtype: None
+        """
+        self._progress_label.setVisible(visible)
+        self._progress_bar.setVisible(visible)
+        self._cancel_job_button.setVisible(visible)
+        if visible:
+            self._progress_label.setText("")
+            self._progress_bar.setRange(0, 0)
+
+    def _show_job_stage(self, job: Job, index: int, count: int, name: str) -> None:
+        """
+        Show the stage a job started.
+        
+        :param job: The job.
+        :type job: Job
+        :param index: The stage index.
+        :type index: int
+        :param count: The number of stages.
+        :type count: int
+        :param name: The stage name.
+        :type name: str
+        :return: None
+        :rtype: None
+        """
+        if job is not self._job:
+            return
+        self._progress_label.setText(f"{name} ({index + 1} of {count})")
+        self._progress_bar.setRange(0, 0) # Busy until the stage reports its progress
+
+    def _show_job_progress(self, job: Job, done: int, total: int) -> None:
+        """
+        Show the progress of the current job stage.
+        
+        :param job: The job.
+        :type job: Job
+        :param done: The work done.
+        :type done: int
+        :param total: The total work of the stage.
+        :type total: int
+        :return: None
+        :rtype: None
+        """
+        if job is not self._job or total <= 0:
+            return
+        self._progress_bar.setRange(0, 1000)
+        self._progress_bar.setValue(int(1000*min(done, total)/total))
+
+    def closeEvent(self, event) -> None:
+        """
+        Cancel the running job when the window is closed.
+        
+        :param event: The close event.
+        :type event: QCloseEvent
+        :return: None
+        :rtype: None
+        """
+        self.cancel_job()
+        super().closeEvent(event)
+
+    def follow_file(self, checked: bool) -> None:
+        """
+        Start or stop following the opened gpx file, updating the stats and the charts 
+        with the points appended to it (e.g. by a recorder during a long event).
+        
+        :param checked: Whether the file must be followed.
+        :type checked: bool
+        :return: None
+        :rtype: None
+        """
+        if not checked:
+            self._live_timer.stop()
+            if self._file_watcher.files():
+                self._file_watcher.removePaths(self._file_watcher.files())
+            self._live_activity = None
+            return
+
+        try:
+            self._live_activity = LiveActivity(self._file_name)
+        except (OSError, UnsupportedGpxError) as error:
+            self._follow_file_button.setChecked(False)
+            self._follow_file_failed(error)
+            return
+
+        self._file_watcher.addPath(self._file_name)
+        self._live_timer.start()
+        self._show_live_activity(len(self._activity) if self._activity is not None else 0)
+
+    def _follow_file_failed(self, error: Exception) -> None:
+        """
+        Report a followed gpx file that could not be read. Following is already stopped.
+        
+        :param error: The error.
+        :type error: Exception
+        :return: None
+        :rtype: None
+        """
+        QMessageBox.warning(self, "Follow file", f"Error following {self._file_name}: {error}")
+
+    def _update_live_activity(self) -> None:
+        """
+        Read the points appended to the followed gpx file and update the stats and the charts.
+        
+        :return: None
+        :rtype: None
+        """
+        if self._live_activity is None:
+            return
+        # Recorders replacing the file make the watcher drop it
+        if self._file_name not in self._file_watcher.files():
+            self._file_watcher.addPath(self._file_name)
+
+        start = len(self._live_activity)
+        try:
+            if self._live_activity.update() == 0:
+                return
+        except (OSError, UnsupportedGpxError):
+            # The file was truncated or rewritten, it is read again from the start
+            try:
+                self._live_activity = LiveActivity(self._file_name)
+                start = 0
+            except (OSError, UnsupportedGpxError) as error:
+                self._follow_file_button.setChecked(False)
+                self._follow_file_failed(error)
+                return
+
+        with span("action.live_update", new_points=len(self._live_activity) - start):
+            self._show_live_activity(start)
+
+    def _show_live_activity(self, start: int) -> None:
+        """
+        Show the followed activity, extending the charts from the first new point.
+        
+        :param start: The index of the first point not shown yet.
+        :type start: int
+        :return: None
+        :rtype: None
+        """
+        if len(self._live_activity) == 0:
+            return
 
+        self._activity = self._live_activity.activity
         self._show_data_table_button.setVisible(True)
         self._export_to_pdf_button.setVisible(True)
+        self.initialize_stats(self._activity)
+        self._dashboard.append_to_charts(self._activity, start)
 
-    def initialize_stats(self, df: DataFrame) -> None:
+    def initialize_stats(self, activity: Activity) -> None:
         """
         Initialize gpx file main stats on the screen. 
         
-        :param df: The dataframe containing the data. 
-        :type df: pandas.DataFrame
+        :param activity: The activity containing the data. 
+        :type activity: Activity
 
         :return: None
         :rtype: None
         """
-        start_time = df.iloc[0]["Time"].to_pydatetime()
-        format_total_time = lambda x : f'{x.components.hours:02d}:{x.components.minutes:02d}:{x.components.seconds:02d}'
+        summary = activity.summary
+        start_time = summary.start_datetime.astype("datetime64[s]").item()
         self._start_time_value_label.setText(start_time.strftime("%Y-%m-%d %H:%M:%S"))
-        self._total_distance_value_label.setText(str(round(df.iloc[-1]["Tot. Distance"]/1000,2)))
-        self._total_time_value_label.setText(format_total_time(df.iloc[-1]["Tot. Time"]))
-        self._average_speed_value_label.setText(str(round(df.iloc[-1]["Avg Speed"], 2)))
-        self._total_elevation_value_label.setText(str(round(df[df["Elevation Gain"] > 0]["Elevation Gain"].sum(),2)))
-        QApplication.processEvents()
+        self._total_distance_value_label.setText(str(round(summary.distance/1000,2)))
+        self._total_time_value_label.setText(format_duration(summary.elapsed_time))
+        self._average_speed_value_label.setText(str(round(summary.average_speed, 2)))
+        self._total_elevation_value_label.setText(str(round(summary.elevation_gain,2)))
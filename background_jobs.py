@@ -0,0 +1,145 @@
+import threading
+from typing import Callable
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+"""
+Background jobs run in the Qt thread pool.
+A job is a pipeline of named stages run one after the other in a worker thread. The job
+never touches the widgets: its progress and its result are delivered to the GUI thread
+through queued Qt signals. Jobs are cancelled cooperatively: the stages call
+report_progress or check_cancelled, which raise JobCancelledError once the job is cancelled.
+"""
+
+# The started jobs, kept alive until they have ended: the owner of a cancelled job drops it
+# while the thread pool may still be running it. A job is released in the GUI thread, once
+# its last signal is delivered, as its signals object must not be destroyed by a worker thread
+_running_jobs = set()
+
+
+class JobCancelledError(Exception):
+    """
+    Raised inside a job stage when the job was cancelled.
+    """
+
+
+class JobSignals(QObject):
+    # Stage index, number of stages and stage name
+    stage_started = pyqtSignal(int, int, str)
+    # Work done and total work of the current stage (Python ints, a file size may not fit a C int)
+    progress = pyqtSignal(object, object)
+    # The result of the last stage
+    finished = pyqtSignal(object)
+    # The error message
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    # Emitted last, after the result, the error or the cancellation
+    ended = pyqtSignal()
+
+
+class Job(QRunnable):
+    def __init__(self, stages: list[tuple[str, Callable]], argument: object = None):
+        """
+        Class constructor.
+
+        :param stages: The stage names and functions. Each function receives the job and the result of the previous stage.
+        :type stages: list[tuple[str, Callable]]
+        :param argument: The value received by the first stage.
+        :type argument: object
+        """
+        super().__init__()
+        # The job is kept by its owner, which reads its state after it has run
+        self.setAutoDelete(False)
+        self.signals = JobSignals()
+        self._stages = stages
+        self._argument = argument
+        self._cancelled = threading.Event()
+        self.signals.ended.connect(self._release)
+
+    def start(self) -> None:
+        """
+        Start the job in the global thread pool.
+
+        :return: None
+        :rtype: None
+        """
+        _running_jobs.add(self)
+        QThreadPool.globalInstance().start(self)
+
+    def cancel(self) -> None:
+        """
+        Ask the job to stop. It stops at the next progress report or stage, without emitting its result.
+
+        :return: None
+        :rtype: None
+        """
+        self._cancelled.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        """
+        Check whether the job was cancelled.
+
+        :return: True if cancel was called.
+        :rtype: bool
+        """
+        return self._cancelled.is_set()
+
+    def check_cancelled(self) -> None:
+        """
+        Stop the running stage if the job was cancelled.
+
+        :return: None
+        :rtype: None
+        :raises JobCancelledError: If the job was cancelled.
+        """
+        if self._cancelled.is_set():
+            raise JobCancelledError()
+
+    def report_progress(self, done: int, total: int) -> None:
+        """
+        Report the progress of the running stage. Called from the stage functions.
+
+        :param done: The work done.
+        :type done: int
+        :param total: The total work of the stage.
+        :type total: int
+        :return: None
+        :rtype: None
+        :raises JobCancelledError: If the job was cancelled.
+        """
+        self.check_cancelled()
+        self.signals.progress.emit(done, total)
+
+    def run(self) -> None:
+        """
+        Run the stages. Called by the thread pool.
+
+        :return: None
+        :rtype: None
+        """
+        result = self._argument
+        try:
+            for index, (name, stage) in enumerate(self._stages):
+                self.check_cancelled()
+                self.signals.stage_started.emit(index, len(self._stages), name)
+                result = stage(self, result)
+            self.check_cancelled()
+            self.signals.finished.emit(result)
+        except JobCancelledError:
+            self.signals.cancelled.emit()
+        except Exception as error:
+            self.signals.failed.emit(f"{type(error).__name__}: {error}")
+        finally:
+            self.signals.ended.emit()
+
+    def _release(self) -> None:
+        """
+        Release an ended job. Called in the GUI thread.
+
+        :return: None
+        :rtype: None
+        """
+        _running_jobs.discard(self)
+        # Deleting the signals object drops its connections, and with them the references to the job
+        self.signals.deleteLater()
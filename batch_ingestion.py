@@ -0,0 +1,338 @@
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable
+
+from activity_cache import activity_key, default_cache_directory
+from gpx_processor import get_track_from_gpx_file
+from gpx_sources import ARCHIVE_EXTENSION, is_gpx_file_name, list_archive_gpx_files
+from track import Track
+
+"""
+Bulk ingestion of gpx files (e.g. a whole Strava export folder or zip archive).
+The files are parsed in a process pool and the resulting tracks are written into an
+ActivityStore, which can be reused by later runs: files already in the store are skipped.
+The store shares the keys of the activity cache (see activity_cache.activity_key), and the
+viewer cache is backed by it, so opening an ingested file reads its stored track.
+"""
+
+_INDEX_FILE_NAME = "index.json"
+_ENTRY_SUFFIX = ".npz"
+
+
+class ActivityStore:
+    def __init__(self, directory: str | None = None):
+        """
+        Class constructor.
+
+        :param directory: The store directory. Defaults to GPX_VIEWER_STORE_DIR or a folder inside the cache directory.
+        :type directory: str | None
+        """
+        if directory is None:
+            directory = os.environ.get("GPX_VIEWER_STORE_DIR") or os.path.join(default_cache_directory(), "activities")
+        self._directory = directory
+        os.makedirs(self._directory, exist_ok=True)
+        self._index = self._read_index()
+
+    @property
+    def directory(self) -> str:
+        """
+        Get the store directory.
+
+        :return: The store directory path.
+        :rtype: str
+        """
+        return self._directory
+
+    @staticmethod
+    def key(file_name: str) -> str:
+        """
+        Get the store key of a gpx file.
+
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :return: The store key, the activity cache key of the file.
+        :rtype: str
+        """
+        return activity_key(file_name)
+
+    def entry_path(self, key: str) -> str:
+        """
+        Get the path of a store entry.
+
+        :param key: The store key.
+        :type key: str
+        :return: The entry path.
+        :rtype: str
+        """
+        return os.path.join(self._directory, key + _ENTRY_SUFFIX)
+
+    def contains(self, key: str) -> bool:
+        """
+        Check whether an activity is in the store.
+
+        :param key: The store key.
+        :type key: str
+        :return: True if the activity is stored, False otherwise.
+        :rtype: bool
+        """
+        return os.path.exists(self.entry_path(key))
+
+    def save(self, key: str, track: Track) -> None:
+        """
+        Save an activity track in the store.
+
+        :param key: The store key.
+        :type key: str
+        :param track: The activity track.
+        :type track: Track
+        :return: None
+        :rtype: None
+        """
+        path = self.entry_path(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            track.save(file)
+        os.replace(temporary_path, path)
+
+    def load(self, key: str) -> Track:
+        """
+        Load an activity track from the store.
+
+        :param key: The store key.
+        :type key: str
+        :return: The activity track.
+        :rtype: Track
+        """
+        return Track.load(self.entry_path(key))
+
+    def index(self) -> dict[str, str]:
+        """
+        Get the stored activities.
+
+        :return: The store key of each ingested gpx file path.
+        :rtype: dict[str, str]
+        """
+        return dict(self._index)
+
+    def register(self, file_name: str, key: str) -> None:
+        """
+        Register the store key of a gpx file in the store index.
+
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :param key: The store key.
+        :type key: str
+        :return: None
+        :rtype: None
+        """
+        self._index[os.path.abspath(file_name)] = key
+
+    def write_index(self) -> None:
+        """
+        Persist the store index.
+
+        :return: None
+        :rtype: None
+        """
+        path = os.path.join(self._directory, _INDEX_FILE_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(self._index, file, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def _read_index(self) -> dict[str, str]:
+        """
+        Read the persisted store index.
+
+        :return: The store key of each ingested gpx file path.
+        :rtype: dict[str, str]
+        """
+        try:
+            with open(os.path.join(self._directory, _INDEX_FILE_NAME), encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+
+class IngestionResult:
+    __slots__ = ("file_name", "key", "number_of_points", "skipped", "error")
+
+    def __init__(self, file_name: str, key: str | None = None, number_of_points: int = 0,
+                 skipped: bool = False, error: str | None = None):
+        """
+        Class constructor.
+
+        :param file_name: The path of the ingested gpx file.
+        :type file_name: str
+        :param key: The store key of the activity, None if the ingestion failed.
+        :type key: str | None
+        :param number_of_points: The number of track points of the activity.
+        :type number_of_points: int
+        :param skipped: Whether the activity was already in the store.
+        :type skipped: bool
+        :param error: The error message, None if the ingestion succeeded.
+        :type error: str | None
+        """
+        self.file_name = file_name
+        self.key = key
+        self.number_of_points = number_of_points
+        self.skipped = skipped
+        self.error = error
+
+    @property
+    def succeeded(self) -> bool:
+        """
+        Check whether the ingestion succeeded.
+
+        :return: True if the file was ingested (or was already in the store).
+        :rtype: bool
+        """
+        return self.error is None
+
+
+def _ingest_file(file_name: str, store_directory: str) -> IngestionResult:
+    """
+    Parse a gpx file into a track and save it in the store.
+    Runs in the worker processes.
+
+    :param file_name: The path of the gpx file.
+    :type file_name: str
+    :param store_directory: The store directory.
+    :type store_directory: str
+    :return: The ingestion result. Errors are reported in the result instead of raised.
+    :rtype: IngestionResult
+    """
+    try:
+        store = ActivityStore(store_directory)
+        key = store.key(file_name)
+        if store.contains(key):
+            return IngestionResult(file_name, key, skipped=True)
+
+        track = get_track_from_gpx_file(file_name)
+        store.save(key, track)
+        return IngestionResult(file_name, key, len(track))
+    except Exception as error:
+        return IngestionResult(file_name, error=f"{type(error).__name__}: {error}")
+
+def find_gpx_files(folder: str) -> list[str]:
+    """
+    Find, recursively, all the gpx files in a folder, including the compressed ones and the ones
+    inside zip archives (see gpx_sources). Archive members are listed without extracting them.
+
+    :param folder: The folder path.
+    :type folder: str
+    :return: The sorted gpx file paths.
+    :rtype: list[str]
+    """
+    file_names = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if is_gpx_file_name(name):
+                file_names.append(path)
+            elif name.lower().endswith(ARCHIVE_EXTENSION):
+                try:
+                    file_names.extend(list_archive_gpx_files(path))
+                except (OSError, zipfile.BadZipFile):
+                    print(f"Error reading the archive {path}")
+
+    return sorted(file_names)
+
+def ingest_files(file_names: list[str],
+                 store: ActivityStore | None = None,
+                 workers: int | None = None,
+                 progress_callback: Callable[[int, int, IngestionResult], None] | None = None) -> list[IngestionResult]:
+    """
+    Ingest gpx files into an activity store, spreading the work across a process pool.
+    A failing file does not stop the batch, its error is reported in its result. If a worker process dies,
+    the files not processed yet fail too, they are ingested by a later run (the stored files are skipped).
+
+    :param file_names: The paths of the gpx files.
+    :type file_names: list[str]
+    :param store: The store to write the activities into. Defaults to ActivityStore().
+    :type store: ActivityStore | None
+    :param workers: The number of worker processes. Defaults to the number of cores. 1 runs in the current process.
+    :type workers: int | None
+    :param progress_callback: Called after each file with the number of processed files, the total and the file result.
+        An exception raised by the callback stops the batch: the pending files are not processed and the exception is propagated.
+    :type progress_callback: Callable[[int, int, IngestionResult], None] | None
+    :return: The result of each file, in completion order.
+    :rtype: list[IngestionResult]
+    """
+    store = store if store is not None else ActivityStore()
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    results = []
+
+    def collect(result: IngestionResult) -> None:
+        results.append(result)
+        if result.succeeded:
+            store.register(result.file_name, result.key)
+        if progress_callback is not None:
+            progress_callback(len(results), len(file_names), result)
+
+    try:
+        if workers <= 1 or len(file_names) <= 1:
+            for file_name in file_names:
+                collect(_ingest_file(file_name, store.directory))
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            try:
+                futures = {executor.submit(_ingest_file, file_name, store.directory): file_name
+                           for file_name in file_names}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as error:
+                        # A worker killed (e.g. out of memory) breaks the pool: its file and the pending ones fail
+                        result = IngestionResult(futures[future], error=f"{type(error).__name__}: {error}")
+                    collect(result)
+            finally:
+                # Does not wait for the queued files when the batch is stopped
+                executor.shutdown(cancel_futures=True)
+    finally:
+        # The activities already ingested are kept, even if the batch was stopped
+        store.write_index()
+
+    return results
+
+def ingest_folder(folder: str,
+                  store: ActivityStore | None = None,
+                  workers: int | None = None,
+                  progress_callback: Callable[[int, int, IngestionResult], None] | None = None) -> list[IngestionResult]:
+    """
+    Ingest all the gpx files of a folder (see ingest_files).
+
+    :param folder: The folder path.
+    :type folder: str
+    :param store: The store to write the activities into.
+    :type store: ActivityStore | None
+    :param workers: The number of worker processes.
+    :type workers: int | None
+    :param progress_callback: Called after each processed file.
+    :type progress_callback: Callable[[int, int, IngestionResult], None] | None
+    :return: The result of each file.
+    :rtype: list[IngestionResult]
+    """
+    return ingest_files(find_gpx_files(folder), store, workers, progress_callback)
+
+def ingest_archive(archive_path: str,
+                   store: ActivityStore | None = None,
+                   workers: int | None = None,
+                   progress_callback: Callable[[int, int, IngestionResult], None] | None = None) -> list[IngestionResult]:
+    """
+    Ingest all the gpx files of a zip archive (see ingest_files). The members are decompressed
+    on the fly by the worker processes, the archive is never extracted.
+
+    :param archive_path: The zip archive path.
+    :type archive_path: str
+    :param store: The store to write the activities into.
+    :type store: ActivityStore | None
+    :param workers: The number of worker processes.
+    :type workers: int | None
+    :param progress_callback: Called after each processed file.
+    :type progress_callback: Callable[[int, int, IngestionResult], None] | None
+    :return: The result of each file.
+    :rtype: list[IngestionResult]
+    """
+    return ingest_files(list_archive_gpx_files(archive_path), store, workers, progress_callback)
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# No Qt: the charts are rendered with Agg, even if a module asks pyplot for a figure
+import matplotlib
+matplotlib.use("Agg")
+
+from activity_cache import ActivityCache
+from batch_ingestion import find_gpx_files
+from chart_plots import CHART_IMAGE_FILES, render_chart_image
+from gpx_sources import ARCHIVE_EXTENSION, GPX_EXTENSIONS, list_archive_gpx_files
+from pdf_report_generator import PdfReportGenerator
+
+"""
+Headless reports: stats, charts and pdf of many activities, without a GUI.
+Each activity gets its own folder in the output directory with stats.json, the chart images
+and report.pdf. The activities are processed in a process pool, and summary.json records the
+result of every file and the throughput of the run.
+
+Run from the repository root, e.g.:
+    python batch_report.py ~/strava_export.zip ~/rides/ --output reports --workers 8
+"""
+
+STATS_FILE_NAME = "stats.json"
+REPORT_FILE_NAME = "report.pdf"
+SUMMARY_FILE_NAME = "summary.json"
+
+# Chart size of the reports, close to the charts of the main window
+CHART_SIZE = (7.6, 2.6)
+CHART_DPI = 100
+
+
+class ReportResult:
+    __slots__ = ("file_name", "directory", "number_of_points", "seconds", "error")
+
+    def __init__(self, file_name: str, directory: str, number_of_points: int = 0, seconds: float = 0,
+                 error: str | None = None):
+        """
+        Class constructor.
+
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        :param directory: The folder the activity reports were written to.
+        :type directory: str
+        :param number_of_points: The number of track points of the activity.
+        :type number_of_points: int
+        :param seconds: The time spent on the activity.
+        :type seconds: float
+        :param error: The error message, None if the reports were written.
+        :type error: str | None
+        """
+        self.file_name = file_name
+        self.directory = directory
+        self.number_of_points = number_of_points
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def succeeded(self) -> bool:
+        """
+        Check whether the reports of the activity were written.
+
+        :return: True if there was no error.
+        :rtype: bool
+        """
+        return self.error is None
+
+    def to_dict(self) -> dict:
+        """
+        Get the result as a JSON serializable dictionary.
+
+        :return: The result fields.
+        :rtype: dict
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _write_reports(file_name: str, directory: str, pdf: bool, use_cache: bool) -> ReportResult:
+    """
+    Write the stats, the chart images and the pdf report of an activity.
+    Runs in the worker processes.
+
+    :param file_name: The path of the gpx file.
+    :type file_name: str
+    :param directory: The folder of the activity reports.
+    :type directory: str
+    :param pdf: Whether the pdf report is written.
+    :type pdf: bool
+    :param use_cache: Whether the parsed tracks are read from, and written to, the activity cache.
+    :type use_cache: bool
+    :return: The result. Errors are reported in the result instead of raised.
+    :rtype: ReportResult
+    """
+    start = time.perf_counter()
+    number_of_points = 0
+    try:
+        activity = ActivityCache(enabled=use_cache).load_activity(file_name)
+        number_of_points = len(activity)
+        os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(directory, STATS_FILE_NAME), "w") as stats_file:
+            json.dump({"file_name": file_name, **activity.summary.to_dict()}, stats_file, indent=2, allow_nan=False)
+
+        images = {chart: render_chart_image(activity, chart, CHART_SIZE, CHART_DPI) for chart in CHART_IMAGE_FILES}
+        for chart, png in images.items():
+            with open(os.path.join(directory, CHART_IMAGE_FILES[chart]), "wb") as image_file:
+                image_file.write(png)
+
+        if pdf:
+            # The pdf embeds the rendered images, it does not read the files back
+            error = PdfReportGenerator(activity.data_frame, images, activity.summary,
+                                       activity.pyramid).generate(os.path.join(directory, REPORT_FILE_NAME))
+            if error:
+                raise RuntimeError(f"pdf report: {error}")
+
+        return ReportResult(file_name, directory, number_of_points, time.perf_counter() - start)
+    except Exception as error:
+        return ReportResult(file_name, directory, number_of_points, time.perf_counter() - start,
+                            f"{type(error).__name__}: {error}")
+
+def find_report_files(paths: list[str]) -> list[str]:
+    """
+    Get the gpx files of a list of files, folders and zip archives.
+
+    :param paths: The paths. Folders are searched recursively (see batch_ingestion.find_gpx_files).
+    :type paths: list[str]
+    :return: The gpx file paths, without duplicates.
+    :rtype: list[str]
+    """
+    file_names = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_names.extend(find_gpx_files(path))
+        elif path.lower().endswith(ARCHIVE_EXTENSION):
+            file_names.extend(list_archive_gpx_files(path))
+        else:
+            file_names.append(path)
+
+    return list(dict.fromkeys(file_names))
+
+def _report_directories(file_names: list[str], output_directory: str) -> list[str]:
+    """
+    Name the report folder of each activity after its file, e.g. "reports/morning_ride" for "morning_ride.gpx.gz".
+
+    :param file_names: The gpx file paths.
+    :type file_names: list[str]
+    :param output_directory: The output directory.
+    :type output_directory: str
+    :return: The report folder of each file. Files with the same name get numbered folders.
+    :rtype: list[str]
+    """
+    directories = []
+    used_names = set()
+    for file_name in file_names:
+        name = os.path.basename(file_name)
+        for extension in sorted(GPX_EXTENSIONS, key=len, reverse=True):
+            if name.lower().endswith(extension):
+                name = name[:-len(extension)]
+                break
+
+        unique_name = name
+        number = 2
+        while unique_name in used_names:
+            unique_name = f"{name}-{number}"
+            number += 1
+        used_names.add(unique_name)
+        directories.append(os.path.join(output_directory, unique_name))
+
+    return directories
+
+def write_reports(file_names: list[str], output_directory: str, workers: int | None = None, pdf: bool = True,
+                  use_cache: bool = True) -> dict:
+    """
+    Write the reports of many activities in parallel, and a summary of the run.
+
+    :param file_names: The gpx file paths.
+    :type file_names: list[str]
+    :param output_directory: The directory the activity report folders are written to.
+    :type output_directory: str
+    :param workers: The number of worker processes. Defaults to the number of cores. 1 runs in the current process.
+    :type workers: int | None
+    :param pdf: Whether the pdf reports are written.
+    :type pdf: bool
+    :param use_cache: Whether the parsed tracks are read from, and written to, the activity cache.
+    :type use_cache: bool
+    :return: The summary, also written to summary.json in the output directory.
+    :rtype: dict
+    """
+    workers = workers or os.cpu_count() or 1
+    directories = _report_directories(file_names, output_directory)
+    os.makedirs(output_directory, exist_ok=True)
+
+    results = []
+    def collect(result: ReportResult) -> None:
+        results.append(result)
+        status = f"{result.number_of_points} points" if result.succeeded else result.error
+        print(f"[{len(results)}/{len(file_names)}] {result.file_name}: {status} ({result.seconds:.2f} s)", file=sys.stderr)
+
+    start = time.perf_counter()
+    if workers <= 1 or len(file_names) <= 1:
+        for file_name, directory in zip(file_names, directories):
+            collect(_write_reports(file_name, directory, pdf, use_cache))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_write_reports, file_name, directory, pdf, use_cache)
+                       for file_name, directory in zip(file_names, directories)]
+            for future in as_completed(futures):
+                collect(future.result())
+    elapsed = time.perf_counter() - start
+
+    succeeded = [result for result in results if result.succeeded]
+    number_of_points = sum(result.number_of_points for result in succeeded)
+    summary = {"files": len(results),
+               "succeeded": len(succeeded),
+               "failed": len(results) - len(succeeded),
+               "workers": workers,
+               "pdf": pdf,
+               "seconds": round(elapsed, 3),
+               "files_per_second": round(len(results)/elapsed, 3) if elapsed > 0 else None,
+               "points_per_second": round(number_of_points/elapsed, 1) if elapsed > 0 else None,
+               "results": [result.to_dict() for result in results]}
+
+    with open(os.path.join(output_directory, SUMMARY_FILE_NAME), "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the stats, charts and pdf report of gpx activities, without a GUI.")
+    parser.add_argument("paths", nargs="+", help="Gpx files (possibly compressed), folders or zip archives.")
+    parser.add_argument("--output", default="reports", help="Output directory (default ./reports).")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default the number of cores).")
+    parser.add_argument("--no-pdf", action="store_true", help="Only write the stats and the chart images.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the parsed activity cache.")
+    args = parser.parse_args()
+
+    file_names = find_report_files(args.paths)
+    if not file_names:
+        print("No gpx files found", file=sys.stderr)
+        sys.exit(1)
+
+    summary = write_reports(file_names, args.output, args.workers, not args.no_pdf, not args.no_cache)
+    print(f"{summary['succeeded']} of {summary['files']} activities in {summary['seconds']:.2f} s with "
+          f"{summary['workers']} worker(s): {summary['files_per_second']:.2f} activities/s, "
+          f"{summary['points_per_second']:.0f} points/s")
+    sys.exit(0 if summary["failed"] == 0 else 1)
@@ -0,0 +1,52 @@
+import argparse
+import os
+import tempfile
+import time
+
+from batch_ingestion import ActivityStore, ingest_files
+from benchmarks.synthetic_gpx import write_gpx
+
+"""
+Batch ingestion throughput benchmark.
+Run from the repository root: python -m benchmarks.bench_batch_ingestion
+"""
+
+
+def run(number_of_files: int, number_of_points: int, worker_counts: list[int]) -> dict[int, float]:
+    """
+    Ingest the same synthetic files with each worker count, starting from an empty store every time.
+
+    :param number_of_files: The number of gpx files.
+    :type number_of_files: int
+    :param number_of_points: The number of points of each file.
+    :type number_of_points: int
+    :param worker_counts: The worker counts to be measured.
+    :type worker_counts: list[int]
+    :return: The throughput, in files per second, of each worker count.
+    :rtype: dict[int, float]
+    """
+    throughput = {}
+    with tempfile.TemporaryDirectory() as folder:
+        file_names = [write_gpx(os.path.join(folder, f"activity_{i}.gpx"), number_of_points, seed=i)
+                      for i in range(number_of_files)]
+
+        for workers in worker_counts:
+            with tempfile.TemporaryDirectory() as store_folder:
+                start = time.perf_counter()
+                results = ingest_files(file_names, ActivityStore(store_folder), workers)
+                elapsed = time.perf_counter() - start
+            failures = sum(not result.succeeded for result in results)
+            throughput[workers] = number_of_files/elapsed
+            print(f"{workers} worker(s): {throughput[workers]:.2f} files/s ({elapsed:.2f} s, {failures} failures)")
+
+    return throughput
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the batch ingestion throughput.")
+    parser.add_argument("--files", type=int, default=64, help="Number of synthetic gpx files.")
+    parser.add_argument("--points", type=int, default=10_000, help="Number of points per file.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts to measure.")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.files} files of {args.points} points")
+    run(args.files, args.points, args.workers)
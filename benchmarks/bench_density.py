@@ -0,0 +1,99 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from scipy import stats
+
+from activity_cache import ActivityCache
+from benchmarks.synthetic_gpx import write_gpx
+from density_estimation import point_densities
+
+"""
+Density of the speed detailed dashboard scatter charts: the exact gaussian_kde(xy)(xy) against
+the binned estimate (see density_estimation), on the grade and speed of synthetic tracks.
+The exact estimate costs n² kernel evaluations: above --exact-limit points it is only evaluated
+at a sample of the points, and its time is extrapolated to all of them (marked with a ~).
+Run from the repository root: python -m benchmarks.bench_density
+"""
+
+
+def _grade_and_speed(file_name: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the points of the grade and speed density chart of a gpx file.
+
+    :param file_name: The gpx file.
+    :type file_name: str
+    :return: The grade (%) and speed (Km/h) of the points, without the outliers removed by the dashboard.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    activity = ActivityCache(enabled=False).load_activity(file_name)
+    grades, speeds = activity["grade"], activity["speed"]
+
+    # As SpeedDetailedDashboard._filter_data
+    kept = speeds <= np.quantile(speeds, 0.995)
+    low, high = np.quantile(grades[kept & np.isfinite(grades)], [0.001, 0.995])
+    kept &= (grades >= low) & (grades <= high)
+
+    return grades[kept], speeds[kept]
+
+def _best_time(function, repeats: int) -> float:
+    """
+    Get the best run time of a function.
+
+    :param function: The function, without arguments.
+    :param repeats: The number of runs.
+    :type repeats: int
+    :return: The best time in seconds.
+    :rtype: float
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+def run(point_counts: list[int], exact_limit: int, repeats: int) -> None:
+    """
+    Print the time of both estimates and the difference of their densities for each track size.
+
+    :param point_counts: The number of points of each measured track.
+    :type point_counts: list[int]
+    :param exact_limit: The largest number of points the exact estimate is evaluated at.
+    :type exact_limit: int
+    :param repeats: The number of runs of the binned estimate, the best one is kept.
+    :type repeats: int
+    :return: None
+    :rtype: None
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        for number_of_points in point_counts:
+            file_name = write_gpx(os.path.join(folder, f"track_{number_of_points}.gpx"), number_of_points)
+            x, y = _grade_and_speed(file_name)
+
+            binned_time = _best_time(lambda: point_densities(x, y), repeats)
+            binned = point_densities(x, y)
+
+            sample = np.random.default_rng(0).choice(len(x), min(len(x), exact_limit), replace=False)
+            kde = stats.gaussian_kde(np.vstack([x, y]))
+            start = time.perf_counter()
+            exact = kde(np.vstack([x[sample], y[sample]]))
+            exact_time = (time.perf_counter() - start)*len(x)/len(sample)
+            error = np.abs(binned[sample] - exact).max()/exact.max()
+
+            print(f"{number_of_points:>9} points: exact {'~' if len(sample) < len(x) else ' '}{exact_time:10.3f} s, "
+                  f"binned {binned_time:8.4f} s, speedup {exact_time/binned_time:10.0f}x, "
+                  f"max difference {100*error:.2f}% of the peak density")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the exact and the binned density of the scatter charts.")
+    parser.add_argument("--points", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--exact-limit", type=int, default=10_000,
+                        help="Largest number of points the exact estimate is evaluated at")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    run(args.points, args.exact_limit, args.repeats)
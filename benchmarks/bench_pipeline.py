@@ -0,0 +1,661 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable
+
+# The widgets are rendered offscreen, the benchmark does not need a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from activity_summary import summarize_track
+from aggregation_pyramid import build_pyramid
+from benchmarks.synthetic_gpx import write_gpx
+from chart_plots import CHART_IMAGE_FILES
+from gpx_processor import calculate_speed_data_frame, get_data_frame_from_gpx_file
+from grade_smoothing import smooth_grades
+from interval_binning import IntervalBinning
+
+"""
+Benchmark of every stage of the viewer pipeline, from the gpx parsing to the pdf report.
+Each stage is timed (best and mean of several repetitions) and, in a separate run, memory
+profiled with tracemalloc (peak of the memory allocated through Python and NumPy; buffers
+allocated by native libraries, such as the Agg renderer, are not traced).
+
+The results are written as JSON, so the runs of two commits can be compared:
+    python -m benchmarks.bench_pipeline --output before.json
+    python -m benchmarks.bench_pipeline --output after.json
+    python -m benchmarks.bench_pipeline --compare before.json after.json
+"""
+
+DEFAULT_POINT_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_SEGMENT_COUNTS = [1, 4]
+# Stages too slow to run on the largest tracks by default (see --no-limits)
+DEFAULT_POINT_LIMITS = {"speed_detailed_kde": 100_000, "pdf_report": 100_000}
+# Size of the dashboard charts before the window is laid out
+CHART_SIZE = (6, 2.5)
+CHART_DPI = 100
+
+
+class Stage:
+    __slots__ = ("name", "setup", "run")
+
+    def __init__(self, name: str, setup: Callable[[dict], tuple], run: Callable[..., object]):
+        """
+        Class constructor.
+
+        :param name: The stage name.
+        :type name: str
+        :param setup: Function receiving the run context and returning the arguments of a repetition. It is not timed.
+        :type setup: Callable[[dict], tuple]
+        :param run: The measured function.
+        :type run: Callable[..., object]
+        """
+        self.name = name
+        self.setup = setup
+        self.run = run
+
+
+def _application(context: dict):
+    """
+    Get the Qt application required by the widgets, creating it on first use.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The application.
+    :rtype: QApplication
+    """
+    from PyQt6.QtWidgets import QApplication
+
+    if "application" not in context:
+        context["application"] = QApplication.instance() or QApplication([])
+
+    return context["application"]
+
+def _data_frame(context: dict) -> pd.DataFrame:
+    """
+    Get the parsed data frame of the run gpx file (without the speed columns).
+
+    :param context: The run context.
+    :type context: dict
+    :return: The data frame. It must not be modified.
+    :rtype: pandas.DataFrame
+    """
+    if "data_frame" not in context:
+        context["data_frame"] = get_data_frame_from_gpx_file(context["file_name"])
+
+    return context["data_frame"]
+
+def _speed_data_frame(context: dict) -> pd.DataFrame:
+    """
+    Get the data frame of the run gpx file with the speed columns, as used by the viewers.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The data frame. It must not be modified.
+    :rtype: pandas.DataFrame
+    """
+    if "speed_data_frame" not in context:
+        df = _data_frame(context).copy()
+        calculate_speed_data_frame(df)
+        context["speed_data_frame"] = df
+
+    return context["speed_data_frame"]
+
+def _activity(context: dict):
+    """
+    Get the activity of the run gpx file, loaded as the viewer does (without the activity cache).
+
+    :param context: The run context.
+    :type context: dict
+    :return: The activity. It must not be modified.
+    :rtype: Activity
+    """
+    from activity_cache import ActivityCache
+
+    if "activity" not in context:
+        context["activity"] = ActivityCache(enabled=False).load_activity(context["file_name"])
+
+    return context["activity"]
+
+def _summary_setup(context: dict) -> tuple:
+    """
+    Set up an activity summary repetition, on channels already computed.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The track and a copy of its computed channels.
+    :rtype: tuple
+    """
+    activity = _activity(context)
+    activity.summary
+
+    return activity.track, activity.channels()
+
+def _grade_smoothing_setup(context: dict) -> tuple:
+    """
+    Set up a grade smoothing repetition.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The distance and elevation gain of each point.
+    :rtype: tuple
+    """
+    df = _speed_data_frame(context)
+
+    return df["Distance"].to_numpy(), df["Elevation Gain"].to_numpy()
+
+def _chart_dashboard_setup(context: dict) -> tuple:
+    """
+    Set up a chart plotting repetition with a new dashboard.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The dashboard, the data frame to be plotted and the activity summary.
+    :rtype: tuple
+    """
+    from chart_dashboard import ChartDashboard
+
+    _application(context)
+
+    return ChartDashboard(), _speed_data_frame(context), _activity(context).summary
+
+def _chart_renderer_setup(context: dict) -> tuple:
+    """
+    Set up a repetition rendering the three dashboard charts in parallel.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The dashboard, its chart renderer, the data frame to be plotted and the activity summary.
+    :rtype: tuple
+    """
+    from chart_renderer import ChartRenderer
+
+    dashboard, df, summary = _chart_dashboard_setup(context)
+    if "chart_renderer" not in context:
+        context["chart_renderer"] = ChartRenderer()
+
+    return dashboard, context["chart_renderer"], df, summary
+
+def _render_chart(chart: str, df: pd.DataFrame, summary) -> None:
+    """
+    Render a dashboard chart offscreen, in the current thread.
+
+    :param chart: The chart name ("speed", "stats_over_time" or "elevation_over_distance").
+    :type chart: str
+    :param df: The data frame to be plotted.
+    :type df: pandas.DataFrame
+    :param summary: The activity summary.
+    :type summary: ActivitySummary
+    :return: None
+    :rtype: None
+    """
+    from chart_plots import render_figure
+
+    plot, args = _chart_plot(chart, df, summary)
+    render_figure(plot, CHART_SIZE, CHART_DPI, args)
+
+def _chart_plot(chart: str, df: pd.DataFrame, summary) -> tuple:
+    """
+    Get the plot function of a dashboard chart and its arguments.
+
+    :param chart: The chart name.
+    :type chart: str
+    :param df: The data frame to be plotted.
+    :type df: pandas.DataFrame
+    :param summary: The activity summary.
+    :type summary: ActivitySummary
+    :return: The plot function and its arguments, after the figure.
+    :rtype: tuple
+    """
+    from chart_plots import plot_elevation_over_distance, plot_speed, plot_stats_over_time
+
+    if chart == "speed":
+        # The stage includes the grade smoothing, done by plot_speed before the activity cached it
+        return plot_speed, (df, smooth_grades(df["Distance"].to_numpy(), df["Elevation Gain"].to_numpy()))
+
+    return {
+            "stats_over_time": (plot_stats_over_time, (df, summary)),
+            # The stage includes the aggregation pyramid, built by the activity before the plot
+            "elevation_over_distance": (plot_elevation_over_distance, (df, build_pyramid(*_pyramid_arguments(df))))}[chart]
+
+def _speed_chart_zoom_setup(context: dict) -> tuple:
+    """
+    Set up a speed chart zoom repetition, on a rendered chart.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The rendered speed chart figure.
+    :rtype: tuple
+    """
+    from chart_plots import render_figure
+
+    plot, args = _chart_plot("speed", _speed_data_frame(context), _activity(context).summary)
+    figure, _ = render_figure(plot, CHART_SIZE, CHART_DPI, args)
+
+    return (figure, )
+
+def _run_speed_chart_zoom(figure) -> None:
+    """
+    Zoom the speed chart on a tenth of the activity, pan it and go back to the whole activity, drawing each view.
+
+    :param figure: The rendered speed chart figure.
+    :type figure: Figure
+    :return: None
+    :rtype: None
+    """
+    chart = figure.axes[0]
+    x_min, x_max = chart.get_xlim()
+    width = (x_max - x_min)/10
+    for view in [(x_min + 4*width, x_min + 5*width), (x_min + 5*width, x_min + 6*width), (x_min, x_max)]:
+        chart.set_xlim(*view)
+        figure.canvas.draw()
+
+def _run_chart_renderer(dashboard, renderer, df: pd.DataFrame, summary) -> None:
+    """
+    Render the three dashboard charts in the renderer threads, waiting for all of them.
+
+    :param dashboard: The chart dashboard.
+    :type dashboard: ChartDashboard
+    :param renderer: The chart renderer.
+    :type renderer: ChartRenderer
+    :param df: The data frame to be plotted.
+    :type df: pandas.DataFrame
+    :param summary: The activity summary.
+    :type summary: ActivitySummary
+    :return: None
+    :rtype: None
+    """
+    canvases = {"speed": dashboard._speed_chart_canvas,
+                "stats_over_time": dashboard._stats_time_chart_canvas,
+                "elevation_over_distance": dashboard._elevation_distance_chart_canvas}
+    futures = []
+    for chart, canvas in canvases.items():
+        plot, args = _chart_plot(chart, df, summary)
+        futures.append(renderer.render(chart, plot, canvas, args))
+    for future in futures:
+        rendered = future.result()
+        if rendered.error is not None:
+            raise RuntimeError(rendered.error)
+
+def _speed_detailed_dashboard_setup(context: dict) -> tuple:
+    """
+    Set up a speed detailed dashboard repetition. The modules are imported here, so their import is not timed.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The dashboard class and the data frame to be shown.
+    :rtype: tuple
+    """
+    import density_estimation
+    from speed_detailed_dashboard import SpeedDetailedDashboard
+
+    density_estimation.signal.load()
+
+    _application(context)
+
+    return SpeedDetailedDashboard, _speed_data_frame(context)
+
+def _run_speed_detailed_dashboard(dashboard_class: type, df: pd.DataFrame):
+    """
+    Prepare the speed detailed dashboard data, including the densities of its density (KDE) charts, and build it.
+
+    :param dashboard_class: The SpeedDetailedDashboard class.
+    :type dashboard_class: type
+    :param df: The data frame with the speed columns.
+    :type df: pandas.DataFrame
+    :return: The dashboard.
+    :rtype: SpeedDetailedDashboard
+    """
+    return dashboard_class(dashboard_class.prepare_data(df))
+
+def _data_table_construction_setup(context: dict) -> tuple:
+    """
+    Set up a data table construction repetition. The module is imported here, so its import is not timed.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The viewer class and the data frame to be shown.
+    :rtype: tuple
+    """
+    from data_table_viewer import DataTableViewer
+
+    _application(context)
+
+    return DataTableViewer, _speed_data_frame(context)
+
+def _data_table_setup(context: dict) -> tuple:
+    """
+    Set up a data table paging repetition with a new viewer.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The data table viewer.
+    :rtype: tuple
+    """
+    from data_table_viewer import DataTableViewer
+
+    _application(context)
+
+    return (DataTableViewer(_speed_data_frame(context)), )
+
+def _run_data_table_paging(viewer) -> None:
+    """
+    Browse the data table pages: the next pages, a bigger page size, the last page and back to the first.
+
+    :param viewer: The data table viewer.
+    :type viewer: DataTableViewer
+    :return: None
+    :rtype: None
+    """
+    for _ in range(10):
+        viewer.go_to_next_page()
+    viewer._page_size_combobox.setCurrentIndex(viewer._page_size_combobox.count() - 1)
+    viewer.go_to_last_page()
+    viewer.go_to_first_page()
+
+def _map_html_setup(context: dict) -> tuple:
+    """
+    Set up a map html repetition, showing the whole track.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The map viewer and the track points.
+    :rtype: tuple
+    """
+    import map_viewer
+    from map_viewer import MapViewer
+
+    map_viewer.folium.load()
+    df = _data_frame(context)
+
+    return MapViewer(), list(zip(df["Latitude"], df["Longitude"]))
+
+def _pdf_report_setup(context: dict) -> tuple:
+    """
+    Set up a pdf report repetition. The report embeds the chart images kept by the dashboard.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The report generator and the output file name.
+    :rtype: tuple
+    """
+    import pdf_report_generator
+    from chart_plots import render_chart_image
+    from pdf_report_generator import PdfReportGenerator
+
+    pdf_report_generator.pisa.load()
+    if "chart_images" not in context:
+        context["chart_images"] = {chart: render_chart_image(_activity(context), chart, CHART_SIZE, CHART_DPI)
+                                   for chart in CHART_IMAGE_FILES}
+
+    return PdfReportGenerator(_speed_data_frame(context), context["chart_images"],
+                              _activity(context).summary, _activity(context).pyramid), "report.pdf"
+
+def _pyramid_arguments(df: pd.DataFrame) -> tuple:
+    """
+    Get the arguments of build_pyramid for a data frame.
+
+    :param df: The data frame with the speed columns.
+    :type df: pandas.DataFrame
+    :return: The accumulated distances, the times (UTC epoch nanoseconds) and the aggregated channels.
+    :rtype: tuple
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        grades = (100*df["Elevation Gain"]/df["Distance"]).to_numpy()
+    channels = {"distance": df["Distance"].to_numpy(),
+                "delta_time": df["Delta Time"].to_numpy(),
+                "elevation": df["Elevation"].to_numpy(),
+                "elevation_gain": df["Elevation Gain"].to_numpy(),
+                "grade": grades,
+                "speed": df["Speed"].to_numpy()}
+
+    return (df["Tot. Distance"].to_numpy(),
+            df["Time"].dt.tz_convert(None).to_numpy().astype("datetime64[ns]").view(np.int64),
+            channels)
+
+def _interval_binning_setup(context: dict) -> tuple:
+    """
+    Set up an interval binning repetition. The dashboard module is imported here, so its import is not timed.
+
+    :param context: The run context.
+    :type context: dict
+    :return: The data frame and the grade interval edges of the grade dashboard.
+    :rtype: tuple
+    """
+    from grade_detailed_dashboard import GRADE_INTERVAL_EDGES
+
+    return _speed_data_frame(context), GRADE_INTERVAL_EDGES
+
+def _run_interval_binning(df: pd.DataFrame, edges: np.ndarray) -> IntervalBinning:
+    """
+    Bin the points of a data frame in the grade intervals and count their rounded grades, as the grade dashboard does.
+
+    :param df: The data frame with the speed columns.
+    :type df: pandas.DataFrame
+    :param edges: The grade interval edges.
+    :type edges: numpy.ndarray
+    :return: The binning.
+    :rtype: IntervalBinning
+    """
+    binning = IntervalBinning.from_data_frame(df)
+    binning.totals("grade", edges)
+    binning.frequences("grade")
+
+    return binning
+
+STAGES = [
+    Stage("parse", lambda context: (context["file_name"], ), get_data_frame_from_gpx_file),
+    Stage("calculate_speed_data_frame", lambda context: (_data_frame(context).copy(), ), calculate_speed_data_frame),
+    Stage("activity_summary", _summary_setup, summarize_track),
+    Stage("grade_smoothing", _grade_smoothing_setup, smooth_grades),
+    Stage("aggregation_pyramid", lambda context: _pyramid_arguments(_speed_data_frame(context)), build_pyramid),
+    Stage("interval_binning", _interval_binning_setup, _run_interval_binning),
+    Stage("plot_speed", lambda context: (_speed_data_frame(context), _activity(context).summary),
+          lambda df, summary: _render_chart("speed", df, summary)),
+    Stage("plot_stats_over_time", lambda context: (_speed_data_frame(context), _activity(context).summary),
+          lambda df, summary: _render_chart("stats_over_time", df, summary)),
+    Stage("plot_elevation_over_distance", lambda context: (_speed_data_frame(context), _activity(context).summary),
+          lambda df, summary: _render_chart("elevation_over_distance", df, summary)),
+    Stage("speed_chart_zoom", _speed_chart_zoom_setup, _run_speed_chart_zoom),
+    Stage("render_dashboard", _chart_renderer_setup, _run_chart_renderer),
+    Stage("speed_detailed_kde", _speed_detailed_dashboard_setup, _run_speed_detailed_dashboard),
+    Stage("data_table_construction", _data_table_construction_setup, lambda viewer_class, df: viewer_class(df)),
+    Stage("data_table_paging", _data_table_setup, _run_data_table_paging),
+    Stage("map_html", _map_html_setup, lambda viewer, points: viewer.poly_line_html(points)),
+    Stage("pdf_report", _pdf_report_setup, lambda generator, file_name: generator.generate(file_name)),
+]
+
+
+def _measure(stage: Stage, context: dict, repeats: int) -> dict:
+    """
+    Time and memory profile a stage.
+
+    :param stage: The stage.
+    :type stage: Stage
+    :param context: The run context.
+    :type context: dict
+    :param repeats: The number of timed repetitions.
+    :type repeats: int
+    :return: The stage result: best and mean time, in seconds, and the peak traced memory, in bytes.
+    :rtype: dict
+    """
+    times = []
+    for _ in range(repeats):
+        arguments = stage.setup(context)
+        gc.collect()
+        start = time.perf_counter()
+        stage.run(*arguments)
+        times.append(time.perf_counter() - start)
+
+    # Tracing slows down the allocations, so the memory is measured in a separate repetition
+    arguments = stage.setup(context)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage.run(*arguments)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"status": "ok",
+            "repeats": repeats,
+            "min_seconds": min(times),
+            "mean_seconds": sum(times)/len(times),
+            "peak_memory_bytes": peak}
+
+def _git_revision() -> str | None:
+    """
+    Get the benchmarked commit.
+
+    :return: The commit hash, with a "-dirty" suffix if there are uncommitted changes, or None outside a git repository.
+    :rtype: str | None
+    """
+    try:
+        repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repository, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repository,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        return revision + ("-dirty" if status else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(point_counts: list[int], segment_counts: list[int], stage_names: list[str] | None = None,
+        repeats: int = 3, point_limits: dict[str, int] | None = None) -> dict:
+    """
+    Benchmark the pipeline stages on synthetic tracks of each size and number of segments.
+
+    :param point_counts: The number of points of each track size.
+    :type point_counts: list[int]
+    :param segment_counts: The number of segments of each track layout.
+    :type segment_counts: list[int]
+    :param stage_names: The stages to run, all of them if None.
+    :type stage_names: list[str] | None
+    :param repeats: The number of timed repetitions of each stage.
+    :type repeats: int
+    :param point_limits: The maximum number of points each stage is run with. Defaults to DEFAULT_POINT_LIMITS.
+    :type point_limits: dict[str, int] | None
+    :return: The run metadata and the results of each stage.
+    :rtype: dict
+    """
+    point_limits = DEFAULT_POINT_LIMITS if point_limits is None else point_limits
+    stages = [stage for stage in STAGES if stage_names is None or stage.name in stage_names]
+    report = {"metadata": {"revision": _git_revision(),
+                           "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                           "python": platform.python_version(),
+                           "platform": platform.platform(),
+                           "cpu_count": os.cpu_count(),
+                           "numpy": np.__version__,
+                           "pandas": pd.__version__,
+                           "matplotlib": matplotlib.__version__,
+                           "repeats": repeats},
+              "results": []}
+
+    current_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        # The pdf report is written in the working directory
+        os.chdir(folder)
+        try:
+            for number_of_points in point_counts:
+                for number_of_segments in segment_counts:
+                    file_name = write_gpx(os.path.join(folder, f"track_{number_of_points}_{number_of_segments}.gpx"),
+                                          number_of_points, number_of_segments)
+                    context = {"file_name": file_name}
+
+                    for stage in stages:
+                        result = {"stage": stage.name, "points": number_of_points, "segments": number_of_segments}
+                        if number_of_points > point_limits.get(stage.name, number_of_points):
+                            result["status"] = "skipped"
+                        else:
+                            try:
+                                result.update(_measure(stage, context, repeats))
+                            except Exception as error:
+                                result.update({"status": "error", "error": f"{type(error).__name__}: {error}"})
+                        report["results"].append(result)
+                        _print_result(result)
+                    context.pop("application", None)
+        finally:
+            os.chdir(current_directory)
+
+    return report
+
+def _print_result(result: dict) -> None:
+    """
+    Print a stage result to the standard error, keeping the standard output for the JSON report.
+
+    :param result: The stage result.
+    :type result: dict
+    :return: None
+    :rtype: None
+    """
+    prefix = f"{result['stage']:<30} {result['points']:>9} points {result['segments']:>2} segment(s):"
+    if result["status"] == "ok":
+        print(f"{prefix} {result['min_seconds']:10.4f} s (mean {result['mean_seconds']:.4f} s) "
+              f"peak {result['peak_memory_bytes']/1e6:9.2f} MB", file=sys.stderr)
+    else:
+        print(f"{prefix} {result['status']} {result.get('error', '')}", file=sys.stderr)
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1) -> bool:
+    """
+    Print the time and memory ratios between two benchmark reports.
+
+    :param baseline: The reference report.
+    :type baseline: dict
+    :param current: The report to be compared.
+    :type current: dict
+    :param tolerance: The relative slowdown (or memory increase) above which a stage is reported as a regression.
+    :type tolerance: float
+    :return: Whether any stage regressed.
+    :rtype: bool
+    """
+    result_key = lambda result: (result["stage"], result["points"], result["segments"])
+    baseline_results = {result_key(result): result for result in baseline["results"] if result["status"] == "ok"}
+
+    print(f"baseline {baseline['metadata'].get('revision')}, current {current['metadata'].get('revision')}")
+    regressed = False
+    for result in current["results"]:
+        reference = baseline_results.get(result_key(result))
+        if result["status"] != "ok" or reference is None:
+            continue
+        time_ratio = result["min_seconds"]/max(reference["min_seconds"], 1e-9)
+        memory_ratio = result["peak_memory_bytes"]/max(reference["peak_memory_bytes"], 1)
+        regression = time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        regressed = regressed or regression
+        print(f"{result['stage']:<30} {result['points']:>9} points {result['segments']:>2} segment(s): "
+              f"time x{time_ratio:6.2f}  memory x{memory_ratio:6.2f}{'  REGRESSION' if regression else ''}")
+
+    return regressed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory profile each stage of the viewer pipeline.")
+    parser.add_argument("--points", type=int, nargs="+", default=DEFAULT_POINT_COUNTS, help="Track sizes.")
+    parser.add_argument("--segments", type=int, nargs="+", default=DEFAULT_SEGMENT_COUNTS, help="Track segment counts.")
+    parser.add_argument("--stages", nargs="+", choices=[stage.name for stage in STAGES], help="Stages to run (default all).")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repetitions of each stage.")
+    parser.add_argument("--no-limits", action="store_true", help="Run the slow stages on every track size.")
+    parser.add_argument("--output", help="JSON report file (default standard output).")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two JSON reports instead of running.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative regression tolerance of --compare.")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as baseline_file, open(args.compare[1]) as current_file:
+            sys.exit(1 if compare(json.load(baseline_file), json.load(current_file), args.tolerance) else 0)
+
+    report = run(args.points, args.segments, args.stages, args.repeats, {} if args.no_limits else None)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
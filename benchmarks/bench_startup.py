@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+"""
+Application startup benchmark: time to first window.
+Each launch runs in a new Python process, as the application does, and is timed from the
+process launch until the main window has been shown and painted. The launches are measured
+twice: as the application starts (the heavy optional modules are imported on first use, see
+lazy_imports) and importing those modules before the window, as the viewer used to do.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup --output startup.json
+"""
+
+DEFAULT_LAUNCHES = 5
+
+
+def _launch_window(eager: bool, launched: float) -> None:
+    """
+    Start the application and print, as a JSON line, the time spent until its first window is shown.
+    Runs in the launched process.
+
+    :param eager: Whether the deferred modules are imported before the window is created.
+    :type eager: bool
+    :param launched: The time (UNIX timestamp) the process was launched at.
+    :type launched: float
+    :return: None
+    :rtype: None
+    """
+    start = time.time()
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import importlib
+
+    from lazy_imports import DEFERRED_MODULES
+
+    unavailable = []
+    if eager:
+        for name in DEFERRED_MODULES:
+            try:
+                importlib.import_module(name)
+            except ImportError as error:
+                unavailable.append(f"{name}: {error}")
+
+    from PyQt6.QtCore import Qt, QCoreApplication, QTimer
+    from PyQt6.QtWidgets import QApplication
+    from application_window import ApplicationWindow
+    imported = time.time()
+
+    QCoreApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts)
+    application = QApplication(sys.argv[:1])
+    window = ApplicationWindow()
+    window.show()
+
+    def report() -> None:
+        # The first timer event is processed after the show and paint events of the window
+        shown = time.time()
+        print(json.dumps({"first_window_seconds": shown - launched,
+                          "interpreter_seconds": start - launched,
+                          "import_seconds": imported - start,
+                          "window_seconds": shown - imported,
+                          "loaded_deferred_modules": [name for name in DEFERRED_MODULES if name in sys.modules],
+                          "unavailable_modules": unavailable}), flush=True)
+        application.quit()
+
+    QTimer.singleShot(0, report)
+    application.exec()
+
+def measure(eager: bool, launches: int) -> dict:
+    """
+    Launch the application several times and time its first window.
+
+    :param eager: Whether the deferred modules are imported before the window is created.
+    :type eager: bool
+    :param launches: The number of launches.
+    :type launches: int
+    :return: The best and mean time to first window, and the time details of the fastest launch.
+    :rtype: dict
+    """
+    repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    launch_results = []
+    for _ in range(launches):
+        command = [sys.executable, "-m", "benchmarks.bench_startup",
+                   "--launch", "eager" if eager else "lazy", "--launched", repr(time.time())]
+        process = subprocess.run(command, cwd=repository, capture_output=True, text=True)
+        lines = [line for line in process.stdout.splitlines() if line.startswith("{")]
+        if process.returncode != 0 or not lines:
+            error = process.stderr.strip().splitlines()
+            return {"status": "error", "error": error[-1] if error else f"exit code {process.returncode}"}
+        launch_results.append(json.loads(lines[-1]))
+
+    times = [result["first_window_seconds"] for result in launch_results]
+
+    return {**min(launch_results, key=lambda result: result["first_window_seconds"]),
+            "status": "ok",
+            "launches": launches,
+            "min_seconds": min(times),
+            "mean_seconds": sum(times)/len(times)}
+
+def run(launches: int = DEFAULT_LAUNCHES) -> dict:
+    """
+    Measure the time to first window with the deferred imports and with eager imports.
+
+    :param launches: The number of launches of each mode.
+    :type launches: int
+    :return: The run metadata and the results of each mode.
+    :rtype: dict
+    """
+    from benchmarks.bench_pipeline import _git_revision
+
+    report = {"metadata": {"revision": _git_revision(),
+                           "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                           "python": platform.python_version(),
+                           "platform": platform.platform(),
+                           "launches": launches},
+              "results": {}}
+
+    for mode in ["lazy", "eager"]:
+        result = measure(mode == "eager", launches)
+        report["results"][mode] = result
+        if result["status"] == "ok":
+            print(f"{mode:<6} first window {result['min_seconds']:.3f} s (mean {result['mean_seconds']:.3f} s): "
+                  f"interpreter {result['interpreter_seconds']:.3f} s, imports {result['import_seconds']:.3f} s, "
+                  f"window {result['window_seconds']:.3f} s", file=sys.stderr)
+            for unavailable in result["unavailable_modules"]:
+                print(f"       not imported: {unavailable}", file=sys.stderr)
+        else:
+            print(f"{mode:<6} {result['status']} {result['error']}", file=sys.stderr)
+
+    lazy, eager = report["results"]["lazy"], report["results"]["eager"]
+    if lazy["status"] == "ok" and eager["status"] == "ok":
+        print(f"deferred imports save {eager['min_seconds'] - lazy['min_seconds']:.3f} s "
+              f"(x{eager['min_seconds']/lazy['min_seconds']:.2f})", file=sys.stderr)
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the application time to first window.")
+    parser.add_argument("--launches", type=int, default=DEFAULT_LAUNCHES, help="Launches of each mode.")
+    parser.add_argument("--output", help="JSON report file (default standard output).")
+    parser.add_argument("--launch", choices=["lazy", "eager"], help=argparse.SUPPRESS)
+    parser.add_argument("--launched", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.launch:
+        _launch_window(args.launch == "eager", args.launched)
+        sys.exit(0)
+
+    report = run(args.launches)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
@@ -0,0 +1,79 @@
+import argparse
+import os
+import tempfile
+import tracemalloc
+
+from activity import Activity
+from gpx_processor import get_track_from_gpx_file
+from benchmarks.synthetic_gpx import write_gpx
+
+"""
+Memory used by a loaded activity: compact Track against the fully derived data frame, and the
+resident set the main window keeps once an activity is shown (track, memoized channels, data
+frame sharing their arrays, summary and smoothed grades, see ApplicationWindow._compute_metrics).
+Run from the repository root: python -m benchmarks.bench_track_memory
+"""
+
+
+def _retained_bytes(factory) -> tuple[object, int]:
+    """
+    Measure the memory retained by the object returned by a factory.
+
+    :param factory: A function without arguments creating the object.
+    :return: The object and the number of allocated bytes still retained after its creation.
+    :rtype: tuple[object, int]
+    """
+    tracemalloc.start()
+    result = factory()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, retained
+
+def _shown_activity(track) -> Activity:
+    """
+    Get an activity with the results computed when the main window shows it.
+
+    :param track: The activity track.
+    :type track: Track
+    :return: The activity.
+    :rtype: Activity
+    """
+    activity = Activity(track)
+    activity.data_frame
+    activity.summary
+    activity.smoothed_grades()
+
+    return activity
+
+def run(point_counts: list[int]) -> None:
+    """
+    Print the memory of the track, of the data frame and of the shown activity for each track size.
+
+    :param point_counts: The number of points of each measured track.
+    :type point_counts: list[int]
+    :return: None
+    :rtype: None
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        for number_of_points in point_counts:
+            file_name = write_gpx(os.path.join(folder, f"track_{number_of_points}.gpx"), number_of_points)
+            track = get_track_from_gpx_file(file_name)
+
+            _, track_bytes = _retained_bytes(lambda: get_track_from_gpx_file(file_name))
+            df, df_bytes = _retained_bytes(track.to_dataframe)
+            df_bytes = max(df_bytes, df.memory_usage(deep=True).sum())
+            # The track is loaded inside the measure, as it is part of the resident activity
+            _, activity_bytes = _retained_bytes(lambda: _shown_activity(get_track_from_gpx_file(file_name)))
+
+            print(f"{number_of_points:>9} points: track {track_bytes/1e6:8.2f} MB "
+                  f"({track.nbytes/number_of_points:.0f} B/point), data frame {df_bytes/1e6:8.2f} MB, "
+                  f"ratio {df_bytes/track_bytes:.2f}x, shown activity {activity_bytes/1e6:8.2f} MB "
+                  f"({activity_bytes/number_of_points:.0f} B/point)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the memory used by a loaded activity.")
+    parser.add_argument("--points", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    run(args.points)
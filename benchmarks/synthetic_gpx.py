@@ -0,0 +1,73 @@
+import numpy as np
+
+"""
+Deterministic synthetic gpx generator used by the benchmarks.
+The tracks look like a 1 Hz bike ride: a random walk with realistic speed and grade.
+"""
+
+_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<gpx creator="StravaGPX" version="1.1" xmlns="http://www.topografix.com/GPX/1/1">\n'
+           ' <metadata><time>{start}</time></metadata>\n'
+           ' <trk>\n  <name>Synthetic ride</name>\n  <type>cycling</type>\n')
+_FOOTER = ' </trk>\n</gpx>\n'
+_POINT = ('   <trkpt lat="{:.7f}" lon="{:.7f}">\n    <ele>{:.1f}</ele>\n'
+          '    <time>{}Z</time>\n   </trkpt>\n')
+_START_TIME = np.datetime64("2024-05-01T07:00:00", "s")
+
+
+def generate_gpx(number_of_points: int, number_of_segments: int = 1, seed: int = 0) -> str:
+    """
+    Generate the content of a synthetic gpx file.
+
+    :param number_of_points: The total number of track points.
+    :type number_of_points: int
+    :param number_of_segments: The number of track segments the points are split into.
+    :type number_of_segments: int
+    :param seed: The random generator seed. The same seed always generates the same file.
+    :type seed: int
+    :return: The gpx file content.
+    :rtype: str
+    """
+    rng = np.random.default_rng(seed)
+
+    speeds = np.clip(8 + np.cumsum(rng.normal(0, 0.05, number_of_points)), 1, 18) # m/s
+    headings = np.cumsum(rng.normal(0, 0.05, number_of_points))
+    latitudes = 45.0 + np.cumsum(speeds*np.cos(headings))/111_132
+    longitudes = 7.0 + np.cumsum(speeds*np.sin(headings))/(111_320*np.cos(np.radians(45.0)))
+    grades = np.clip(np.cumsum(rng.normal(0, 0.002, number_of_points)), -0.12, 0.12)
+    elevations = 300 + np.cumsum(grades*speeds) + rng.normal(0, 0.3, number_of_points)
+
+    # Each new segment starts after a 5 minutes pause
+    seconds = np.arange(number_of_points)
+    segment_ids = seconds*number_of_segments//max(number_of_points, 1)
+    times = (_START_TIME + seconds + 300*segment_ids).astype(str)
+
+    parts = [_HEADER.format(start=f"{_START_TIME}Z")]
+    for segment in range(number_of_segments):
+        parts.append('  <trkseg>\n')
+        for i in np.flatnonzero(segment_ids == segment):
+            parts.append(_POINT.format(latitudes[i], longitudes[i], elevations[i], times[i]))
+        parts.append('  </trkseg>\n')
+    parts.append(_FOOTER)
+
+    return "".join(parts)
+
+def write_gpx(file_name: str, number_of_points: int, number_of_segments: int = 1, seed: int = 0) -> str:
+    """
+    Write a synthetic gpx file.
+
+    :param file_name: The path of the file to be written.
+    :type file_name: str
+    :param number_of_points: The total number of track points.
+    :type number_of_points: int
+    :param number_of_segments: The number of track segments.
+    :type number_of_segments: int
+    :param seed: The random generator seed.
+    :type seed: int
+    :return: The path of the written file.
+    :rtype: str
+    """
+    with open(file_name, "w", encoding="utf-8") as file:
+        file.write(generate_gpx(number_of_points, number_of_segments, seed))
+
+    return file_name
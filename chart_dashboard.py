@@ -1,20 +1,66 @@
-import numpy as np
-from threading import Thread
-
 ### For embedding in Qt
 from matplotlib.backends.backend_qtagg import FigureCanvas
 from matplotlib.backends.backend_qtagg import \
     NavigationToolbar2QT as NavigationToolbar
 from matplotlib.backend_bases import MouseEvent
 from matplotlib.backends.qt_compat import QtWidgets
+from matplotlib.axes import Axes
 from matplotlib.figure import Figure
-import matplotlib.cm as cm
+import numpy as np
 from pandas import DataFrame
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QWidget, QPushButton, QToolTip
 from map_viewer import MapViewer
 
-from advanced_dashboard_viewer import AdvancedDashboardViewer
+from activity import Activity
+from advanced_dashboard_viewer import AdvancedDashboardData, AdvancedDashboardViewer
+from chart_plots import (SPEED_STEP_SIZE, chart_plot, extend_colored_area, extend_grade_area, render_chart_image,
+                         set_area_colors, speed_chart_data, speed_deviation, speed_scale_label, step_means)
+from chart_overlay import ChartCursor, ChartOverlay, ChartRangeHighlight
 from chart_range_selector import ChartRangeSelector
+from chart_renderer import ChartRenderer, RenderedChart, swap_figure
+from distance_index import DistanceIndex
+from gpx_reader import GrowableColumn
+from grade_smoothing import below_threshold, smooth_grades
+from instrumentation import span, timed
+
+# Minimum time between two updates of the speed chart tooltip and cursor
+HOVER_INTERVAL_MS = 30
+# Precision (Km/h) of the average speed the speed area is colored against: in live mode, the area
+# is colored again when the rounded average speed or its standard deviation change
+SPEED_REFERENCE_DECIMALS = 1
+
+
+def _growable_column(values: np.ndarray) -> GrowableColumn:
+    """
+    Get a growable column starting with the given values.
+
+    :param values: The values.
+    :type values: numpy.ndarray
+    :return: The column, with a copy of the values.
+    :rtype: GrowableColumn
+    """
+    column = GrowableColumn(values.dtype, len(values))
+    column.extend(values)
+
+    return column
+
+def _extend_data_limits(chart: Axes, x, y) -> None:
+    """
+    Extend the data limits of a chart with new points, instead of computing them again from all
+    its artists (see Axes.relim).
+
+    :param chart: The chart.
+    :type chart: Axes
+    :param x: The x values of the new points.
+    :type x: Iterable[float]
+    :param y: The y values of the new points.
+    :type y: Iterable[float]
+    :return: None
+    :rtype: None
+    """
+    chart.update_datalim(np.column_stack((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))))
+
 
 class ChartDashboard(QWidget):
     def __init__(self):
@@ -24,6 +70,31 @@ class ChartDashboard(QWidget):
         super().__init__()
         layout = QtWidgets.QGridLayout(self)
         self._redraw = False
+        self._grade_threshold = None
+
+        # The charts are rendered offscreen (see chart_renderer), the charts of older activities are discarded
+        self._renderer = ChartRenderer()
+        self._renderer.rendered.connect(self._show_rendered_chart)
+        self._render_generation = 0
+        self._pending_charts = set()
+        self._pending_live_activity = None
+        self._rendered_points = 0
+        # The data prepared for the advanced dashboard tabs, kept while the activity data does not change
+        self._advanced_dashboard_data = None
+        # The points of the speed chart and, once extended in live mode, their growable columns, row
+        # positions and grades. Also the growable line columns of the "Stats over time" chart
+        self._speed_chart_frame = None
+        self._speed_chart_columns = None
+        self._speed_chart_rows = None
+        self._speed_chart_grades = None
+        self._stats_columns = None
+
+        # The speed chart mouse moves are handled on a timer, for the last position only
+        self._hover_position = (None, None)
+        self._hover_timer = QTimer(self)
+        self._hover_timer.setSingleShot(True)
+        self._hover_timer.setInterval(HOVER_INTERVAL_MS)
+        self._hover_timer.timeout.connect(self._show_speed_chart_hover)
 
         canvas_factory = lambda w, h : FigureCanvas(Figure(figsize = (6,2.5)))
         
@@ -53,32 +124,46 @@ class ChartDashboard(QWidget):
     def _speed_chart_hover(self, event: MouseEvent) -> None:
         """
         Handle the hovering event on the speed chart.
+        The mouse moves are handled at most once per HOVER_INTERVAL_MS, for the last position.
 
         :param event: The hover event. 
         :type event: MouseEvent.
         :return: None
         :rtype: None
         """
-        x, y = event.xdata, event.ydata
-        text = ""
+        self._hover_position = (event.xdata, event.ydata)
+        if not self._hover_timer.isActive():
+            self._hover_timer.start()
+
+    def _show_speed_chart_hover(self) -> None:
+        """
+        Show the cursor and the tooltip of the point closest to the last mouse position over the speed chart.
 
-        self._speed_chart_canvas.setToolTip(None)
+        :return: None
+        :rtype: None
+        """
+        x, y = self._hover_position
         
         if x == None or y == None:
+            self._hover_row = None
+            self._speed_chart_cursor.hide()
+            self._speed_chart_canvas.setToolTip(None)
             QToolTip.hideText()
             return
-        
-        row_closest = self._speed_chart_data.loc[(self._speed_chart_data.KM - x).abs().idxmin()]
+
+        position = self._speed_chart_index.nearest(x)
+        if position == self._hover_row:
+            return
+        self._hover_row = position
+
+        row_closest = self._speed_chart_data.iloc[position]
+        self._speed_chart_cursor.move(row_closest.KM, row_closest["Speed rollmean"])
         text = f"<b> Distance (Km): </b> {round(row_closest.KM, 2)} <br>\
                  <b> Grade (%): </b> {round(100*row_closest['Elevation Gain']/row_closest.Distance, 1)} <br>\
                  <b> Instant speed (Km/h): </b> {round(3.6*row_closest.Distance/row_closest['Delta Time'], 2)}\
                  <b> Average speed (Km/h): </b> {round(row_closest['Avg Speed'], 2)}"
         
-        if text:
-           self._speed_chart_canvas.setToolTip(text)
-        else:
-           self._speed_chart_canvas.setToolTip(None)
-           QToolTip.hideText()
+        self._speed_chart_canvas.setToolTip(text)
 
     def _speed_chart_click(self,event : MouseEvent) -> None:
         """"
@@ -92,7 +177,7 @@ class ChartDashboard(QWidget):
         if not event.dblclick:
             return 
         
-        central_index = abs(self._speed_chart_data['KM'] - event.xdata).idxmin()
+        central_index = self._speed_chart_index.nearest(event.xdata)
         
         start = max(central_index - 150, 0)
         end = min(central_index + 150, len(self._speed_chart_data) - 1)
@@ -114,8 +199,7 @@ class ChartDashboard(QWidget):
         :return: None
         :rtype: None
         """
-        start = abs(self._speed_chart_data['KM'] - eclick.xdata).idxmin()
-        end = abs(self._speed_chart_data['KM'] - erelease.xdata).idxmin()
+        start, end = self._speed_chart_index.span(eclick.xdata, erelease.xdata)
         
         lat_long_df = self._speed_chart_data.iloc[start : end][['Latitude', 'Longitude']]
         points = list(zip(lat_long_df['Latitude'], lat_long_df['Longitude']))
@@ -123,87 +207,68 @@ class ChartDashboard(QWidget):
         self._map_viewer = MapViewer()
         self._map_viewer.show_poly_line(points)
         self._chart_range_selector.reset()
+        self._speed_chart_range_highlight.show(self._speed_chart_data.KM.iloc[start],
+                                               self._speed_chart_data.KM.iloc[max(start, end - 1)])
 
-    def _clean_speed_chart_data(self, df: DataFrame) -> DataFrame:
-        """
-        Clean the elevation grade data
-        
-        :param df: The data frame containing the data to be cleaned. 
-        :type df: pandas.DataFrame
-        :return: The clean dataframe
-        :rtype: pandas.DataFrame
-        """
-        summarized_df = df[["Latitude", "Longitude", "KM", "Elevation Gain", 
-                            "Distance", "Delta Time", "Avg Speed", "Speed rollmean"]]
-
-        rolling_mean = summarized_df[["Distance", "Elevation Gain"]].rolling(20).mean()
-        summarized_df.loc[: ,"Distance"] = rolling_mean["Distance"]
-        summarized_df.loc[:, "Elevation Gain"] = rolling_mean["Elevation Gain"]
-
-        minimum_measurements = 15
-        if len(summarized_df) < minimum_measurements:
-            return
-        
-        grades = abs(summarized_df["Elevation Gain"]/summarized_df["Distance"]).sort_values(ascending=False)
-        grade_threshold = grades.iloc[minimum_measurements - 1] - 0.02
-        return summarized_df[abs(summarized_df["Elevation Gain"]/summarized_df["Distance"]) < grade_threshold]
-
-    def _plot_speed(self, df: DataFrame) -> None:
+    def _attach_speed_chart(self, artists: dict) -> None:
         """
-        Plot the speed chart
+        Connect the rendered speed chart to the dashboard interactions. Runs in the GUI thread.
         
-        :param df: The dataframe with the data to be plot. 
-        :type df: pandas.DataFrame
+        :param artists: The chart data and artists returned by plot_speed.
+        :type artists: dict
+        :return: None
+        :rtype: None
         """
-        self._speed_chart_canvas.figure.clf()
-        chart = self._speed_chart_canvas.figure.subplots()
-
-        cleaned_df = self._clean_speed_chart_data(df)
- 
-        (avg_line, ) = chart.plot(cleaned_df["KM"], cleaned_df["Avg Speed"], label="average")
-        (instant_line, )= chart.plot(cleaned_df["KM"], cleaned_df["Speed rollmean"], label="instantaneous")
-        chart.set_xlabel("Accumulated distance (Km)")
-        chart.set_ylabel("Speed (Km/h)")
-        avg_fill = chart.fill_between(df["KM"], df["Avg Speed"], alpha=0.3)
-        instant_fill = chart.fill_between(df["KM"], df["Speed rollmean"], alpha=0.3)
-
-        self._chart_range_selector = ChartRangeSelector(chart, self.select_callback)
-
-        ax2 = chart.twinx()
-        (elevation_line, ) = ax2.plot(cleaned_df["KM"], 100*cleaned_df["Elevation Gain"]/cleaned_df["Distance"], 
-                                    color="#334455", label="Grade")
-        ax2.set_ylabel("Grade (%)")
-
-        lines, labels = chart.get_legend_handles_labels()
-        lines2, labels2 = ax2.get_legend_handles_labels()
-        leg = ax2.legend(lines + lines2, labels + labels2, loc="upper right")
+        self._speed_chart_frame = artists["data"]
+        self._speed_chart_columns = None
+        # Also smooth and filter the points appended in live mode
+        self._grade_smoothing = artists["grade_smoothing"]
+        self._grade_threshold = artists["grade_threshold"]
+        self._speed_chart_lines = artists["lines"]
+        self._speed_chart_fills = artists["fills"]
+        self._speed_chart_legend_lines = artists["legend_lines"]
+        self._speed_chart_decimator = artists["decimator"]
+        self._speed_chart_index = DistanceIndex(self._speed_chart_frame["KM"])
+        self._hover_row = None
+
+        # The interactions only redraw the toggled lines and fills, the legend, the cursor and the selection
+        self._speed_chart_overlay = ChartOverlay(self._speed_chart_canvas.figure)
+        self._speed_chart_overlay.add(*self._speed_chart_lines, *self._speed_chart_fills, artists["legend"],
+                                      toggled=True)
+        self._speed_chart_cursor = ChartCursor(self._speed_chart_overlay, artists["chart"])
+        self._speed_chart_range_highlight = ChartRangeHighlight(self._speed_chart_overlay, artists["chart"])
+        self._chart_range_selector = ChartRangeSelector(artists["chart"], self.select_callback,
+                                                        self._speed_chart_overlay)
 
-        self._speed_chart_data = cleaned_df
-
-        chart.set_picker(True)
-        ax2.set_picker(True)
         self._map_legend_to_ax = {}  # Will map legend lines to original lines.
-
-        pickradius = 5  # Points (Pt). How close the click needs to be to trigger an event.
-
-        for legend_line, ax_line in zip(leg.get_lines(), [avg_line, instant_line, elevation_line]):
-            legend_line.set_picker(pickradius)  # Enable picking on the legend line.
+        for legend_line, ax_line in zip(self._speed_chart_legend_lines, self._speed_chart_lines):
             self._map_legend_to_ax[legend_line] = []
             self._map_legend_to_ax[legend_line].append(ax_line)
-        for legend_line, fill_line in zip(leg.get_lines(), [avg_fill, instant_fill, None]):
+        for legend_line, fill_line in zip(self._speed_chart_legend_lines, [*self._speed_chart_fills, None]):
             if fill_line is None:
                 continue
             self._map_legend_to_ax[legend_line].append(fill_line)
 
-
-        self._speed_chart_canvas.figure.subplots_adjust(bottom=0.15, hspace=0.1)
-        self._speed_chart_canvas.figure.tight_layout()
-        self._speed_chart_canvas.figure.savefig("./speed_chart.png")
         self._speed_chart_canvas.figure.canvas.mpl_connect('motion_notify_event', self._speed_chart_hover)
         self._speed_chart_canvas.figure.canvas.mpl_connect('button_press_event', self._speed_chart_click)
         self._speed_chart_canvas.figure.canvas.mpl_connect('pick_event', self.on_speed_pick)  
- 
-        instant_line.figure.canvas.draw()
+
+        self._grade_detailed_chart_button.setVisible(True)
+
+    @property
+    def _speed_chart_data(self) -> DataFrame:
+        """
+        Get the points of the speed chart (see chart_plots.speed_chart_data). Once extended in live mode,
+        the dataframe is built from the growable columns, without copying them, once per update.
+
+        :return: The points of the speed chart.
+        :rtype: pandas.DataFrame
+        """
+        if self._speed_chart_frame is None:
+            self._speed_chart_frame = DataFrame({name: column.to_array() for name, column in self._speed_chart_columns.items()},
+                                                index=self._speed_chart_rows.to_array(), copy=False)
+
+        return self._speed_chart_frame
 
     def on_speed_pick(self, event: MouseEvent) -> None:
         """
@@ -227,129 +292,299 @@ class ChartDashboard(QWidget):
             # have been toggled.
             legend_line.set_alpha(1.0 if visible else 0.2)
 
-        self._speed_chart_canvas.figure.canvas.draw()
+        self._speed_chart_overlay.update()
 
 
-    def _plot_stats_over_time(self, df: DataFrame) -> None:
+    def _attach_stats_over_time(self, artists: dict) -> None:
         """
-        Plot the chart "Stats over time", that show the average speed and distance vs total time.
+        Keep the lines of the rendered "Stats over time" chart. Runs in the GUI thread.
         
-        :param df: The dataframe containing the data to be plotted. 
-        :type df: pandas.DataFrame. 
+        :param artists: The lines, speed area and speed reference returned by plot_stats_over_time.
+        :type artists: dict
+        :return: None
+        :rtype: None
         """
-        self._stats_time_chart_canvas.figure.clf()
-        chart = self._stats_time_chart_canvas.figure.subplots()
-
-        speed_std_dev = df["Avg Speed"].std()
-        final_avg = df.iloc[-1]["Avg Speed"]
-        lb = final_avg - 3*speed_std_dev
-        ub = final_avg + 3*speed_std_dev
-        
-        deviation = [min(1, (final_avg - x)/(final_avg - lb))/2 if x < final_avg else
-                     0.5 + min(1, (x - final_avg)/(ub - final_avg))/2 for x in df["Speed"]]
-
-        cmap = cm.coolwarm
-        step_size = 20
-        if len(df) > step_size:
-            for i in range(step_size, len(df), step_size):
-                chart.fill_between(df.iloc[i - step_size: i]["Tot. Time"].dt.total_seconds()/60, 
-                                   df.iloc[i - step_size : i]["KM"],
-                                   color= cmap(1 - np.array(deviation[i - step_size : i]).mean()))
+        self._stats_distance_line = artists["distance_line"]
+        self._stats_elevation_line = artists["elevation_line"]
+        self._stats_speed_area = artists["speed_area"]
+        self._stats_speed_label = artists["speed_label"]
+        self._stats_speed_reference = artists["speed_reference"]
+        self._stats_columns = None
+
+    def _attach_elevation_over_distance(self, artists: dict) -> None:
+        """
+        Keep the line of the rendered elevation vs distance chart. Runs in the GUI thread.
         
-        chart.annotate('speed: red < average < blue', xy = (0.05, 1.05), xycoords='axes fraction')
-
-        plot, = chart.plot(df["Tot. Time"].dt.total_seconds()/60, df["KM"], label ="Distance")
-        chart.set_xlabel("Time (minutes)")
-        chart.set_ylabel("Distance (Km)")
-        chart.grid(color = 'green', linestyle = '--', linewidth = 0.3)
-        chart.legend(loc="upper left")
-
-        positive_elevation_gain_df = df[df["Elevation Gain"] > 0]
-        ax2 = chart.twinx()
-        ax2.plot(positive_elevation_gain_df["Tot. Time"].dt.total_seconds()/60, 
-                 positive_elevation_gain_df["Elevation Gain"].cumsum(), 
-                 color="#334455", label="Elevation Gain")
-        ax2.set_ylabel("Elevation gain (m)")
-        ax2.legend(loc="lower right")
-
-        self._stats_time_chart_canvas.figure.subplots_adjust(bottom=0.15, hspace=0.2)
-        self._stats_time_chart_canvas.figure.savefig("./time_stats_chart.png")
-        plot.figure.canvas.draw()
-
-    def _normalized_grade(self, df: DataFrame, index: int, step_size: int) -> float:
-        """
-        Normalizes the road grade to remove noise/outliers. 
-        In this function, gradients over 12% are considered outliers and are normalized to 12%. 
+        :param artists: The line, grade area and decimator returned by plot_elevation_over_distance.
+        :type artists: dict
+        :return: None
+        :rtype: None
+        """
+        self._elevation_line = artists["elevation_line"]
+        self._elevation_grade_area = artists["grade_area"]
+        self._elevation_decimator = artists["decimator"]
+
+    def open_grade_detailed_chart(self) -> NotImplementedError:
+        """
+        Open a window with detailed charts. 
         
-        :param df: The dataframe with the data to be normalized. 
-        :type df: pandas.DataFrame
-        :param index: The index of the last element to be normalized 
-        :type index: int
-        :param step_size: The normalization step size. 
-        :type step_size: int
+        :return: None
+        :rtype: None
+        """
+        with span("action.open_advanced_dashboard"):
+            if self._advanced_dashboard_data is None or self._advanced_dashboard_data.data_frame is not self._speed_chart_data:
+                self._advanced_dashboard_data = AdvancedDashboardData(self._speed_chart_data)
+            self._advanced_dashboard = AdvancedDashboardViewer(self._advanced_dashboard_data)
+            self._advanced_dashboard.show() 
+    
+    def _chart_canvases(self) -> dict[str, FigureCanvas]:
+        """
+        Get the canvas of each chart.
 
-        :return: The normalized road grade. 
-        :rtype: float
+        :return: The canvases, by chart name (see chart_plots.CHART_IMAGE_FILES).
+        :rtype: dict[str, FigureCanvas]
         """
-        grade = (100*df.iloc[index - step_size : index]["Elevation Gain"]/df.iloc[index - step_size : index]["Distance"]).mean()
-        grade = min(max(grade, -12), 12) # Keeps the grade between -12 and 12
-        return (12 + grade)/24 # A value between 0 and 1
+        return {"speed": self._speed_chart_canvas,
+                "stats_over_time": self._stats_time_chart_canvas,
+                "elevation_over_distance": self._elevation_distance_chart_canvas}
+
+    def chart_images(self, activity: Activity) -> dict[str, bytes]:
+        """
+        Get the png images of the charts of an activity, at the size they are shown.
+        The images rendered for the dashboard are reused from the shared chart image cache.
+
+        :param activity: The activity.
+        :type activity: Activity
+        :return: The png file contents, by chart name.
+        :rtype: dict[str, bytes]
+        """
+        return {chart: render_chart_image(activity, chart, tuple(canvas.figure.get_size_inches()), canvas.figure.dpi)
+                for chart, canvas in self._chart_canvases().items()}
+
+    @timed("chart.dashboard")
+    def initialize_charts(self, activity: Activity):
+        """
+        Initialize all the charts in the dashboard. The charts are rendered in parallel, offscreen,
+        and shown as soon as each one is ready (see chart_renderer).
+        
+        :param activity: The activity with the data to be plotted.
+        :param activity: Activity. 
+        """
+        df = activity.data_frame
+
+        self._render_generation += 1
+        self._pending_charts = set(self._chart_canvases())
+        self._pending_live_activity = None
+        self._rendered_points = len(df)
+        self._grade_threshold = None
+        self._grade_detailed_chart_button.setVisible(False)
+
+        # The images are kept for the pdf export (see chart_image_cache)
+        for chart, canvas in self._chart_canvases().items():
+            plot, args = chart_plot(activity, chart)
+            self._renderer.render(chart, plot, canvas, args, self._render_generation, activity.key)
 
-    def _plot_elevation_over_distance(self, df: DataFrame) -> None:
+    def _show_rendered_chart(self, rendered: RenderedChart) -> None:
         """
-        Plot the elevation vs distance chart.
+        Show a chart rendered offscreen, swapping it into its canvas. Runs in the GUI thread.
         
-        :param df: The database containing the data to be plotted. 
-        :type df: Pandas dataframe. 
+        :param rendered: The rendered chart.
+        :type rendered: RenderedChart
         :return: None
         :rtype: None
         """
-        self._elevation_distance_chart_canvas.figure.clf()
-        chart = self._elevation_distance_chart_canvas.figure.subplots()
+        if rendered.tag != self._render_generation:
+            return # Chart of an activity that is not shown anymore
 
-        plot, = chart.plot(df["KM"], df["Elevation"])
-        chart.set_xlabel("Distance (Km)")
-        chart.set_ylabel("Elevation (m)")
-        self._elevation_distance_chart_canvas.figure.subplots_adjust(bottom=0.15)
+        self._pending_charts.discard(rendered.name)
+        if rendered.error is not None:
+            print(f"Error rendering the {rendered.name} chart: {rendered.error}")
+        else:
+            canvas, attach = {"speed": (self._speed_chart_canvas, self._attach_speed_chart),
+                              "stats_over_time": (self._stats_time_chart_canvas, self._attach_stats_over_time),
+                              "elevation_over_distance": (self._elevation_distance_chart_canvas,
+                                                          self._attach_elevation_over_distance)}[rendered.name]
+            with span("chart.swap", chart=rendered.name):
+                swap_figure(canvas, rendered.figure)
+                attach(rendered.artists)
+
+        if not self._pending_charts and self._pending_live_activity is not None:
+            # Points appended to the live activity while its charts were rendered
+            activity = self._pending_live_activity
+            self._pending_live_activity = None
+            self.append_to_charts(activity, self._rendered_points)
+
+    def is_rendering(self) -> bool:
+        """
+        Check whether charts are still being rendered.
         
-        cmap = cm.coolwarm
+        :return: True if a chart of the current activity was not shown yet.
+        :rtype: bool
+        """
+        return len(self._pending_charts) > 0
 
-        step_size = 10
-        if len(df) > step_size:
-            for i in range(step_size, len(df), step_size):
-                chart.fill_between(df.iloc[i - step_size: i]["KM"], df.iloc[i - step_size : i]["Elevation"],\
-                        color= cmap(self._normalized_grade(df, i, step_size)))
+    @timed("chart.live_append")
+    def append_to_charts(self, activity: Activity, start: int) -> None:
+        """
+        Extend the charts with the points appended to a live activity (see live_activity), 
+        without redrawing the charts from scratch. Only the new line points and area fills are added.
+        
+        :param activity: The activity with the data to be plotted.
+        :type activity: Activity
+        :param start: The index of the first new point.
+        :type start: int
+        :return: None
+        :rtype: None
+        """
+        if start > 0 and self._pending_charts:
+            # Appended once the charts being rendered are shown
+            self._pending_live_activity = activity
+            return
+        if start == 0 or self._grade_threshold is None:
+            self.initialize_charts(activity)
+            return
+        if start >= len(activity):
+            return
+        self._rendered_points = len(activity)
 
-        chart.annotate('grade scale: blue < 0% < red', xy = (0.05, 1.05), xycoords='axes fraction')
-        chart.grid(color = 'green', linestyle = '--', linewidth = 0.3)
+        self._append_to_speed_chart(activity, start)
+        self._append_to_stats_over_time(activity, start)
+        self._append_to_elevation_over_distance(activity, start)
 
-        self._elevation_distance_chart_canvas.figure.savefig("./elevation_distance_chart.png")
-        plot.figure.canvas.draw()
+        for canvas in [self._speed_chart_canvas, self._stats_time_chart_canvas, self._elevation_distance_chart_canvas]:
+            for chart in canvas.figure.axes:
+                # The data limits were extended with the new points (see _extend_data_limits)
+                chart.autoscale_view()
+            canvas.draw_idle()
 
-    def open_grade_detailed_chart(self) -> NotImplementedError:
+    def _append_to_speed_chart(self, activity: Activity, start: int) -> None:
         """
-        Open a window with detailed charts. 
+        Append the new points of a live activity to the speed chart.
         
+        :param activity: The activity with the data to be plotted.
+        :type activity: Activity
+        :param start: The index of the first new point.
+        :type start: int
         :return: None
         :rtype: None
         """
-        self._advanced_dashboard = AdvancedDashboardViewer(self._speed_chart_data)
-        self._advanced_dashboard.show() 
-    
-    def initialize_charts(self, df: DataFrame):
+        # The grades of the new rows only depend on the previous points of their window (see grade_smoothing)
+        window_start = self._grade_smoothing.history(activity["total_distance"], start)
+        rows = slice(window_start, len(activity))
+        tail_df = DataFrame({"Latitude": activity["latitude"][rows],
+                             "Longitude": activity["longitude"][rows],
+                             "KM": activity["km"][rows],
+                             "Delta Time": activity["delta_time"][rows],
+                             "Avg Speed": activity["avg_speed"][rows],
+                             "Speed rollmean": activity["speed_rollmean"][rows]},
+                            index=range(window_start, len(activity)))
+        grades = smooth_grades(activity["distance"][rows], activity["elevation_gain"][rows], self._grade_smoothing)
+        kept = below_threshold(grades.grade, self._grade_threshold)
+        kept[:start - window_start] = False
+        new_df = speed_chart_data(tail_df, grades, kept)
+        new_grades = 100*new_df["Elevation Gain"].to_numpy()/new_df["Distance"].to_numpy()
+
+        avg_line, instant_line, elevation_line = self._speed_chart_lines
+        avg_fill, instant_fill = self._speed_chart_fills
+        decimator = self._speed_chart_decimator
+        if self._speed_chart_columns is None:
+            # The points are extended in place from now on, the grade line values are the ones already drawn
+            data = self._speed_chart_frame
+            self._speed_chart_columns = {name: _growable_column(data[name].to_numpy()) for name in data.columns}
+            self._speed_chart_rows = _growable_column(data.index.to_numpy())
+            self._speed_chart_grades = _growable_column(decimator.data(elevation_line)[1])
+
+        columns = self._speed_chart_columns
+        for name in new_df.columns:
+            columns[name].extend(new_df[name].to_numpy())
+        self._speed_chart_rows.extend(new_df.index.to_numpy())
+        self._speed_chart_grades.extend(new_grades)
+        self._speed_chart_frame = None
+        km = columns["KM"].to_array()
+        self._speed_chart_index = DistanceIndex(km)
+        self._hover_row = None
+
+        # The decimator draws the visible part of the extended lines and areas
+        decimator.extend_data(avg_line, km, columns["Avg Speed"].to_array())
+        decimator.extend_data(instant_line, km, columns["Speed rollmean"].to_array())
+        decimator.extend_data(elevation_line, km, self._speed_chart_grades.to_array())
+        decimator.extend_data(avg_fill, activity["km"], activity["avg_speed"])
+        decimator.extend_data(instant_fill, activity["km"], activity["speed_rollmean"])
+
+        # The fills already reach 0
+        _extend_data_limits(avg_line.axes, new_df["KM"], new_df["Avg Speed"])
+        _extend_data_limits(instant_line.axes, new_df["KM"], new_df["Speed rollmean"])
+        _extend_data_limits(elevation_line.axes, new_df["KM"], new_grades)
+        _extend_data_limits(avg_fill.axes, activity["km"][start:], activity["avg_speed"][start:])
+        _extend_data_limits(instant_fill.axes, activity["km"][start:], activity["speed_rollmean"][start:])
+
+    def _append_to_stats_over_time(self, activity: Activity, start: int) -> None:
         """
-        Initialize, with a parallel processing, all the charts in the dashboard.
+        Append the new points of a live activity to the "Stats over time" chart.
         
-        :param df: Dataframe with the data to be plotted.
-        :param df: pandas.DataFrame. 
+        :param activity: The activity with the data to be plotted.
+        :type activity: Activity
+        :param start: The index of the first new point.
+        :type start: int
+        :return: None
+        :rtype: None
         """
-        threads = []
-        threads.append(Thread(target=self._plot_speed, args=[df]))
-        threads.append(Thread(target=self._plot_stats_over_time, args=[df]))
-        threads.append(Thread(target=self._plot_elevation_over_distance, args=[df]))
-        self._grade_detailed_chart_button.setVisible(True)
-        for thread in threads:
-            thread.start()
-        for thread in threads:
-            thread.join()
+        km = activity["km"]
+        elevation_gains = activity["elevation_gain"]
+        if self._stats_columns is None:
+            # The lines are extended in place from now on
+            minutes = activity["total_time"][:start]/60
+            positive = elevation_gains[:start] > 0
+            self._stats_columns = {"minutes": _growable_column(minutes),
+                                   "climb_minutes": _growable_column(minutes[positive]),
+                                   "elevation_gain": _growable_column(elevation_gains[:start][positive].cumsum())}
+
+        columns = self._stats_columns
+        new_minutes = activity["total_time"][start:]/60
+        positive = elevation_gains[start:] > 0
+        climbed = columns["elevation_gain"].to_array()[-1:].sum()
+        new_elevation_gains = climbed + elevation_gains[start:][positive].cumsum()
+        columns["minutes"].extend(new_minutes)
+        columns["climb_minutes"].extend(new_minutes[positive])
+        columns["elevation_gain"].extend(new_elevation_gains)
+
+        minutes = columns["minutes"].to_array()
+        self._stats_distance_line.set_data(minutes, km)
+        self._stats_elevation_line.set_data(columns["climb_minutes"].to_array(), columns["elevation_gain"].to_array())
+        # The speed area is below the distance line
+        _extend_data_limits(self._stats_distance_line.axes, new_minutes, km[start:])
+        _extend_data_limits(self._stats_elevation_line.axes, new_minutes[positive], new_elevation_gains)
+
+        # Same steps as plot_stats_over_time (see chart_plots), the new ones colored against the same average speed
+        area = self._stats_speed_area
+        speeds = activity["speed"]
+        steps = len(area.get_paths())
+        deviation = speed_deviation(speeds[steps*SPEED_STEP_SIZE:], *self._stats_speed_reference)
+        extend_colored_area(area, minutes, km, 1 - step_means(deviation, SPEED_STEP_SIZE), SPEED_STEP_SIZE)
+
+        summary = activity.summary
+        reference = (summary.average_speed, summary.average_speed_std_dev)
+        if not np.array_equal(np.round(reference, SPEED_REFERENCE_DECIMALS),
+                              np.round(self._stats_speed_reference, SPEED_REFERENCE_DECIMALS)):
+            self._stats_speed_reference = reference
+            self._stats_speed_label.set_text(speed_scale_label(summary.average_speed))
+            deviation = speed_deviation(speeds, *reference)
+            set_area_colors(area, 1 - step_means(deviation, SPEED_STEP_SIZE))
+
+    def _append_to_elevation_over_distance(self, activity: Activity, start: int) -> None:
+        """
+        Append the new points of a live activity to the elevation vs distance chart.
+        
+        :param activity: The activity with the data to be plotted.
+        :type activity: Activity
+        :param start: The index of the first new point.
+        :type start: int
+        :return: None
+        :rtype: None
+        """
+        self._elevation_decimator.extend_data(self._elevation_line, activity["km"], activity["elevation"])
+        # The grade area is below the line
+        _extend_data_limits(self._elevation_line.axes, activity["km"][start:], activity["elevation"][start:])
 
+        # Same buckets as plot_elevation_over_distance (see chart_plots), the pyramid is extended (see live_activity)
+        extend_grade_area(self._elevation_grade_area, activity.pyramid)
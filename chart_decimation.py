@@ -0,0 +1,215 @@
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.axes import Axes
+from matplotlib.backend_bases import ResizeEvent
+from matplotlib.collections import PolyCollection
+from matplotlib.lines import Line2D
+
+"""
+Level of detail of the distance charts.
+A chart line with more points than horizontal pixels is drawn with, for each pixel column,
+only the first, last, lowest and highest of its points: the drawn line looks the same as the
+full one, peaks included, but costs a few points per pixel. The full resolution data is kept,
+and the visible part is decimated again whenever the x limits change (zoom, pan, home) or the
+canvas is resized, so zooming in shows every point again.
+"""
+
+
+def min_max_indices(x: np.ndarray, y: np.ndarray, x_min: float, x_max: float, buckets: int) -> np.ndarray:
+    """
+    Get the points of a series to draw in an x range, split in buckets of the same width.
+
+    :param x: The x values, in increasing order.
+    :type x: numpy.ndarray
+    :param y: The y values.
+    :type y: numpy.ndarray
+    :param x_min: The lower bound of the x range.
+    :type x_min: float
+    :param x_max: The upper bound of the x range.
+    :type x_max: float
+    :param buckets: The number of buckets, usually one per pixel column.
+    :type buckets: int
+    :return: The sorted indices of the first, last, minimum and maximum point of each bucket, plus the
+             points just outside the range, so the line reaches the chart borders.
+    :rtype: numpy.ndarray
+    """
+    first = max(0, int(np.searchsorted(x, x_min, side="left")) - 1)
+    last = min(len(x), int(np.searchsorted(x, x_max, side="right")) + 1)
+    if last - first <= 4*buckets:
+        return np.arange(first, last)
+
+    edges = np.searchsorted(x[first:last], np.linspace(x[first], x[last - 1], buckets + 1)[1:-1], side="left")
+    starts = np.unique(np.concatenate(([0], edges)))
+    starts = starts[starts < last - first]
+    ends = np.append(starts[1:], last - first)
+
+    values = y[first:last]
+    bucket_ids = np.repeat(np.arange(len(starts)), ends - starts)
+    indices = [starts, ends - 1]
+    # NaN values are ignored, a bucket without any other value only keeps its first and last points
+    for reduce in (np.fmin, np.fmax):
+        extremes = reduce.reduceat(values, starts)
+        hits = np.flatnonzero(values == extremes[bucket_ids])
+        _, first_hits = np.unique(bucket_ids[hits], return_index=True)
+        indices.append(hits[first_hits])
+
+    return first + np.unique(np.concatenate(indices))
+
+
+class ChartDecimator:
+    def __init__(self, axes: Axes):
+        """
+        Class constructor.
+        Decimates the lines and the area fills of a chart, and of its twin charts (sharing the x axis).
+
+        :param axes: The chart whose x limits and width set the level of detail.
+        :type axes: Axes
+        """
+        self._axes = axes
+        # The full resolution data of each artist
+        self._series: dict[Artist, tuple[np.ndarray, np.ndarray, bool]] = {}
+        self._view = None
+
+        axes.callbacks.connect("xlim_changed", self._on_xlim_changed)
+        # Connected to the figure, so the connection is kept when the figure is shown in another canvas
+        axes.figure.canvas.mpl_connect("resize_event", self._on_resize)
+
+    def set_data(self, artist: Line2D | PolyCollection, x, y) -> None:
+        """
+        Set the full resolution data of a line, or of an area filled from 0 to the y values, and draw its visible part.
+
+        :param artist: The line, or the fill created by fill_between.
+        :type artist: Line2D | PolyCollection
+        :param x: The x values, in increasing order.
+        :type x: Iterable[float]
+        :param y: The y values.
+        :type y: Iterable[float]
+        :return: None
+        :rtype: None
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        # Unordered series (never the case of the distance charts) are drawn in full
+        ordered = bool(np.all(x[1:] >= x[:-1]))
+        self._series[artist] = (x, y, ordered)
+        self._decimate(artist, *self._visible_range())
+
+    def extend_data(self, artist: Line2D | PolyCollection, x, y) -> None:
+        """
+        Set the full resolution data of an artist to its previous data followed by new points (e.g. of a
+        live activity), and draw its visible part. Only the order of the new points is checked.
+
+        :param artist: The line, or the fill created by fill_between, with data already set.
+        :type artist: Line2D | PolyCollection
+        :param x: The x values, starting with the previous ones.
+        :type x: Iterable[float]
+        :param y: The y values, starting with the previous ones.
+        :type y: Iterable[float]
+        :return: None
+        :rtype: None
+        """
+        previous_x, _, ordered = self._series[artist]
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        start = max(0, len(previous_x) - 1)
+        ordered = ordered and bool(np.all(x[start + 1:] >= x[start:-1]))
+        self._series[artist] = (x, y, ordered)
+        self._decimate(artist, *self._visible_range())
+
+    def data(self, artist: Artist) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the full resolution data of an artist.
+
+        :param artist: The line or fill.
+        :type artist: Artist
+        :return: The x and y values.
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        x, y, _ = self._series[artist]
+
+        return x, y
+
+    def update(self) -> None:
+        """
+        Decimate the visible part of every artist again, if the x limits or the chart width changed.
+
+        :return: None
+        :rtype: None
+        """
+        view = self._visible_range()
+        if view == self._view:
+            return
+
+        self._view = view
+        for artist in self._series:
+            self._decimate(artist, *view)
+
+    def _visible_range(self) -> tuple[float, float, int]:
+        """
+        Get the x range shown and the number of pixel columns of the chart.
+
+        :return: The lower and upper x bounds and the chart width in pixels.
+        :rtype: tuple[float, float, int]
+        """
+        width = max(1, int(self._axes.bbox.width))
+        if self._axes.get_autoscalex_on():
+            # The limits follow the data, which are shown in full
+            return -np.inf, np.inf, width
+
+        x_min, x_max = sorted(self._axes.get_xlim())
+
+        return x_min, x_max, width
+
+    def _decimate(self, artist: Artist, x_min: float, x_max: float, buckets: int) -> None:
+        """
+        Draw the points of an artist needed at the given range and width.
+
+        :param artist: The line or fill.
+        :type artist: Artist
+        :param x_min: The lower bound of the x range.
+        :type x_min: float
+        :param x_max: The upper bound of the x range.
+        :type x_max: float
+        :param buckets: The chart width in pixels.
+        :type buckets: int
+        :return: None
+        :rtype: None
+        """
+        x, y, ordered = self._series[artist]
+        if ordered and len(x) > 0:
+            indices = min_max_indices(x, y, x_min, x_max, buckets)
+            x, y = x[indices], y[indices]
+
+        if isinstance(artist, Line2D):
+            artist.set_data(x, y)
+        else:
+            finite = np.isfinite(y)
+            x, y = x[finite], y[finite]
+            if len(x) > 0:
+                # The area below the line, closed on the x axis
+                artist.set_verts([np.column_stack((np.concatenate(([x[0]], x, [x[-1]])),
+                                                   np.concatenate(([0], y, [0]))))])
+            else:
+                artist.set_verts([])
+
+    def _on_xlim_changed(self, axes: Axes) -> None:
+        """
+        Handle a change of the x limits (zoom, pan or autoscale).
+
+        :param axes: The chart.
+        :type axes: Axes
+        :return: None
+        :rtype: None
+        """
+        self.update()
+
+    def _on_resize(self, event: ResizeEvent) -> None:
+        """
+        Handle the canvas resize.
+
+        :param event: The resize event.
+        :type event: ResizeEvent
+        :return: None
+        :rtype: None
+        """
+        self.update()
@@ -0,0 +1,161 @@
+import base64
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.image import imsave
+
+"""
+In-memory cache of the rendered chart images.
+The charts are kept as png bytes, keyed by the activity content key (see activity_cache), the
+chart name, the figure size and its resolution. The dashboard fills it while rendering its
+charts, and the pdf reports embed the cached images directly, so exporting an activity already
+shown, or exporting it again, neither draws the charts nor writes image files. The cache is
+bounded in size, evicting the least recently used images.
+"""
+
+DEFAULT_MAX_SIZE_BYTES = 64*1024*1024
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """
+    Encode a rendered image as png.
+
+    :param rgba: The image pixels, with shape (height, width, 4), e.g. the buffer of an Agg canvas.
+    :type rgba: numpy.ndarray
+    :return: The png file content.
+    :rtype: bytes
+    """
+    output = io.BytesIO()
+    imsave(output, rgba, format="png")
+
+    return output.getvalue()
+
+def png_data_uri(png: bytes) -> str:
+    """
+    Get the data URI of a png image, to embed it in an HTML document.
+
+    :param png: The png file content.
+    :type png: bytes
+    :return: The data URI.
+    :rtype: str
+    """
+    return "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+
+
+class ChartImageCache:
+    def __init__(self, max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES):
+        """
+        Class constructor. The cache can be used from any thread.
+
+        :param max_size_bytes: The maximum total size of the cached images.
+        :type max_size_bytes: int
+        """
+        self._max_size_bytes = max_size_bytes
+        self._images: OrderedDict[tuple, bytes] = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(activity_key: str, chart: str, size: tuple[float, float], dpi: float) -> tuple:
+        """
+        Get the cache key of a chart image.
+
+        :param activity_key: The activity content key (see activity_cache).
+        :type activity_key: str
+        :param chart: The chart name (see chart_plots.CHART_IMAGE_FILES).
+        :type chart: str
+        :param size: The figure size in inches.
+        :type size: tuple[float, float]
+        :param dpi: The figure resolution.
+        :type dpi: float
+        :return: The cache key.
+        :rtype: tuple
+        """
+        return activity_key, chart, tuple(round(float(value), 3) for value in size), round(float(dpi), 3)
+
+    def __len__(self) -> int:
+        """
+        Get the number of cached images.
+
+        :return: The number of cached images.
+        :rtype: int
+        """
+        return len(self._images)
+
+    @property
+    def size_bytes(self) -> int:
+        """
+        Get the total size of the cached images.
+
+        :return: The size in bytes.
+        :rtype: int
+        """
+        return self._size_bytes
+
+    def get(self, key: tuple) -> bytes | None:
+        """
+        Get a cached image, marking it as the most recently used.
+
+        :param key: The cache key (see key).
+        :type key: tuple
+        :return: The png file content, None if not cached.
+        :rtype: bytes | None
+        """
+        with self._lock:
+            png = self._images.get(key)
+            if png is not None:
+                self._images.move_to_end(key)
+
+        return png
+
+    def put(self, key: tuple, png: bytes) -> None:
+        """
+        Store an image, evicting the least recently used ones if the cache gets too large.
+
+        :param key: The cache key (see key).
+        :type key: tuple
+        :param png: The png file content.
+        :type png: bytes
+        :return: None
+        :rtype: None
+        """
+        if len(png) > self._max_size_bytes:
+            return
+
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self._size_bytes -= len(previous)
+            self._images[key] = png
+            self._size_bytes += len(png)
+
+            while self._size_bytes > self._max_size_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self._size_bytes -= len(evicted)
+
+    def clear(self) -> None:
+        """
+        Remove every cached image.
+
+        :return: None
+        :rtype: None
+        """
+        with self._lock:
+            self._images.clear()
+            self._size_bytes = 0
+
+
+# Shared by the dashboard, the pdf export and the batch reports of a process
+_shared_cache = ChartImageCache()
+
+
+def shared_chart_image_cache() -> ChartImageCache:
+    """
+    Get the chart image cache shared by the whole application.
+
+    :return: The shared cache.
+    :rtype: ChartImageCache
+    """
+    return _shared_cache
@@ -0,0 +1,233 @@
+from matplotlib.artist import Artist
+from matplotlib.axes import Axes
+from matplotlib.backend_bases import DrawEvent
+from matplotlib.figure import Figure
+
+"""
+Chart interactions drawn with blitting.
+The artists changed by the interactions are animated: the full chart draws skip them, and the
+pixels of the other artists are kept once per full draw. There are two kinds of animated artists:
+- the moving ones (the cursor following the mouse, the selection...), drawn on every update;
+- the toggled ones (the lines shown or hidden from the legend...), drawn over the kept pixels once
+  per combination of visible artists, and then kept with them.
+An interaction then only restores pixels and draws the moving artists over them, so its cost
+does not depend on the size of the chart data.
+"""
+
+
+class ChartOverlay:
+    def __init__(self, figure: Figure):
+        """
+        Class constructor.
+        The layer of animated artists of a figure.
+
+        :param figure: The chart figure.
+        :type figure: Figure
+        """
+        self._figure = figure
+        self._toggled: list[Artist] = []
+        # The pixels of the static artists, and of the static and toggled artists for each visibility combination
+        self._background = None
+        self._scenes = {}
+        # Set when artists already drawn in the last full draw become animated
+        self._stale = False
+        # Connected to the figure, so the connection is kept when the figure is shown in another canvas
+        figure.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def add(self, *artists: Artist, toggled: bool = False) -> None:
+        """
+        Move artists to the animated layer.
+
+        :param artists: The artists changed by the interactions.
+        :type artists: Artist
+        :param toggled: Whether the artists only change on some interactions (e.g. shown or hidden),
+                        instead of on every update.
+        :type toggled: bool
+        :return: None
+        :rtype: None
+        """
+        for artist in artists:
+            if toggled and artist not in self._toggled:
+                self._toggled.append(artist)
+                self._scenes.clear()
+            if not artist.get_animated():
+                artist.set_animated(True)
+                # The last full draw has it, the background is taken again before the next update
+                self._stale = self._stale or artist.get_visible()
+
+    def update(self) -> None:
+        """
+        Repaint the animated artists over the static part of the chart.
+
+        :return: None
+        :rtype: None
+        """
+        canvas = self._figure.canvas
+        if getattr(canvas, "renderer", None) is None:
+            return # Not drawn yet, the animated artists are drawn with the chart
+        if self._stale:
+            # Done once, the draw event takes the background and draws the animated artists
+            canvas.draw()
+            return
+        if self._background is None:
+            # The chart was shown without a draw of this canvas (see chart_renderer.swap_figure)
+            self._background = canvas.copy_from_bbox(self._figure.bbox)
+
+        self._restore_scene()
+        self._draw_animated(self._is_moving)
+        canvas.blit(self._figure.bbox)
+
+    def _is_moving(self, artist: Artist) -> bool:
+        """
+        Check whether an animated artist is drawn on every update.
+
+        :param artist: The animated artist.
+        :type artist: Artist
+        :return: True if it is not a toggled artist.
+        :rtype: bool
+        """
+        return artist not in self._toggled
+
+    def _restore_scene(self) -> None:
+        """
+        Restore the pixels of the static artists and of the visible toggled artists.
+
+        :return: None
+        :rtype: None
+        """
+        canvas = self._figure.canvas
+        key = tuple(artist.get_visible() for artist in self._toggled)
+        if key in self._scenes:
+            canvas.restore_region(self._scenes[key])
+            return
+
+        canvas.restore_region(self._background)
+        self._draw_animated(lambda artist: not self._is_moving(artist))
+        self._scenes[key] = canvas.copy_from_bbox(self._figure.bbox)
+
+    def _draw_animated(self, accept) -> None:
+        """
+        Draw visible animated artists, in the order of a full draw.
+
+        :param accept: Selects the artists to draw.
+        :type accept: Callable[[Artist], bool]
+        :return: None
+        :rtype: None
+        """
+        for axes in self._figure.axes:
+            artists = [artist for artist in axes.get_children()
+                       if artist.get_animated() and artist.get_visible() and accept(artist)]
+            for artist in sorted(artists, key=lambda artist: artist.get_zorder()):
+                axes.draw_artist(artist)
+
+    def _on_draw(self, event: DrawEvent) -> None:
+        """
+        Keep the pixels of a full chart draw, and draw the animated artists over them.
+
+        :param event: The draw event.
+        :type event: DrawEvent
+        :return: None
+        :rtype: None
+        """
+        if self._figure.canvas.is_saving():
+            return # Saved figures are drawn with their animated artists
+
+        self._background = self._figure.canvas.copy_from_bbox(self._figure.bbox)
+        self._scenes.clear()
+        self._stale = False
+        self._restore_scene()
+        self._draw_animated(self._is_moving)
+
+
+class ChartCursor:
+    def __init__(self, overlay: ChartOverlay, axes: Axes, color: str = "#334455"):
+        """
+        Class constructor.
+        Crosshair lines marking a point of the chart.
+
+        :param overlay: The animated layer of the chart figure.
+        :type overlay: ChartOverlay
+        :param axes: The chart.
+        :type axes: Axes
+        :param color: The lines color.
+        :type color: str
+        """
+        self._overlay = overlay
+        self._vertical_line = axes.axvline(0, color=color, linewidth=0.8, linestyle="--", visible=False)
+        self._horizontal_line = axes.axhline(0, color=color, linewidth=0.8, linestyle=":", visible=False)
+        overlay.add(self._vertical_line, self._horizontal_line)
+
+    def move(self, x: float, y: float | None = None) -> None:
+        """
+        Show the cursor at a point.
+
+        :param x: The point position, in data coordinates.
+        :type x: float
+        :param y: The point value, in data coordinates. Only the vertical line is shown if None.
+        :type y: float | None
+        :return: None
+        :rtype: None
+        """
+        self._vertical_line.set_xdata([x, x])
+        self._vertical_line.set_visible(True)
+        if y is not None:
+            self._horizontal_line.set_ydata([y, y])
+        self._horizontal_line.set_visible(y is not None)
+        self._overlay.update()
+
+    def hide(self) -> None:
+        """
+        Hide the cursor.
+
+        :return: None
+        :rtype: None
+        """
+        if self._vertical_line.get_visible():
+            self._vertical_line.set_visible(False)
+            self._horizontal_line.set_visible(False)
+            self._overlay.update()
+
+
+class ChartRangeHighlight:
+    def __init__(self, overlay: ChartOverlay, axes: Axes, color: str = "#ffcc00"):
+        """
+        Class constructor.
+        A band highlighting a range of the chart x axis.
+
+        :param overlay: The animated layer of the chart figure.
+        :type overlay: ChartOverlay
+        :param axes: The chart.
+        :type axes: Axes
+        :param color: The band color.
+        :type color: str
+        """
+        self._overlay = overlay
+        self._band = axes.axvspan(0, 1, color=color, alpha=0.3, linewidth=0, visible=False)
+        overlay.add(self._band)
+
+    def show(self, start: float, end: float) -> None:
+        """
+        Highlight a range.
+
+        :param start: The range start, in data coordinates.
+        :type start: float
+        :param end: The range end, in data coordinates.
+        :type end: float
+        :return: None
+        :rtype: None
+        """
+        self._band.set_x(start)
+        self._band.set_width(end - start)
+        self._band.set_visible(True)
+        self._overlay.update()
+
+    def hide(self) -> None:
+        """
+        Remove the highlight.
+
+        :return: None
+        :rtype: None
+        """
+        if self._band.get_visible():
+            self._band.set_visible(False)
+            self._overlay.update()
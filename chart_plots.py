@@ -0,0 +1,563 @@
+import numpy as np
+import matplotlib.cm as cm
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import Collection, PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.path import Path
+from pandas import DataFrame
+from typing import Callable
+
+from activity import Activity
+from activity_summary import ActivitySummary
+from aggregation_pyramid import DISTANCE, AggregationLevel, AggregationPyramid
+from chart_decimation import ChartDecimator
+from chart_image_cache import ChartImageCache, encode_png, shared_chart_image_cache
+from grade_smoothing import SmoothedGrades
+from instrumentation import span, timed
+
+"""
+Plots of the dashboard charts, without any Qt dependency.
+Each plot function draws a chart on a given figure and returns the artists the dashboard
+needs for its interactions. They are used by the dashboard, rendering offscreen (see
+chart_renderer), and by the headless reports (see batch_report).
+"""
+
+# Chart names, with the image files written by the batch reports
+CHART_IMAGE_FILES = {"speed": "speed_chart.png",
+                     "stats_over_time": "time_stats_chart.png",
+                     "elevation_over_distance": "elevation_distance_chart.png"}
+# Resolution of the KM channel, the x values of the distance charts, in meters
+KM_RESOLUTION = 100
+# Number of points of each colored step of the speed area of the "Stats over time" chart
+SPEED_STEP_SIZE = 20
+
+
+def speed_chart_data(df: DataFrame, grades: SmoothedGrades, kept: np.ndarray | None = None) -> DataFrame:
+    """
+    Get the points of the speed chart: the points with a smoothed grade, without the elevation errors.
+
+    :param df: The dataframe of the activity, or of its last points.
+    :type df: pandas.DataFrame
+    :param grades: The smoothed grades of the dataframe points (see grade_smoothing).
+    :type grades: SmoothedGrades
+    :param kept: The points to keep, by default the points kept by the grades threshold.
+    :type kept: numpy.ndarray | None
+    :return: The points, with the smoothed distance and elevation gain, indexed by their dataframe position.
+    :rtype: pandas.DataFrame
+    """
+    rows = np.flatnonzero(grades.kept if kept is None else kept)
+    column = lambda name: df[name].to_numpy()[rows]
+
+    return DataFrame({"Latitude": column("Latitude"),
+                      "Longitude": column("Longitude"),
+                      "KM": column("KM"),
+                      "Elevation Gain": grades.elevation_gain[rows],
+                      "Distance": grades.distance[rows],
+                      "Delta Time": column("Delta Time"),
+                      "Avg Speed": column("Avg Speed"),
+                      "Speed rollmean": column("Speed rollmean")},
+                     index=df.index[rows])
+
+def plot_speed(figure: Figure, df: DataFrame, grades: SmoothedGrades) -> dict:
+    """
+    Plot the speed chart. It only changes the given figure, so it can run in any thread.
+
+    :param figure: The offscreen figure the chart is plotted in.
+    :type figure: Figure
+    :param df: The dataframe with the data to be plot. 
+    :type df: pandas.DataFrame
+    :param grades: The smoothed grades of the activity (see Activity.smoothed_grades).
+    :type grades: SmoothedGrades
+    :return: The chart data and artists used by the interactions.
+    :rtype: dict
+    """
+    chart = figure.subplots()
+
+    cleaned_df = speed_chart_data(df, grades)
+
+    (avg_line, ) = chart.plot(cleaned_df["KM"], cleaned_df["Avg Speed"], label="average")
+    (instant_line, )= chart.plot(cleaned_df["KM"], cleaned_df["Speed rollmean"], label="instantaneous")
+    chart.set_xlabel("Accumulated distance (Km)")
+    chart.set_ylabel("Speed (Km/h)")
+    avg_fill = chart.fill_between(df["KM"], df["Avg Speed"], alpha=0.3)
+    instant_fill = chart.fill_between(df["KM"], df["Speed rollmean"], alpha=0.3)
+
+    ax2 = chart.twinx()
+    (elevation_line, ) = ax2.plot(cleaned_df["KM"], 100*cleaned_df["Elevation Gain"]/cleaned_df["Distance"], 
+                                color="#334455", label="Grade")
+    ax2.set_ylabel("Grade (%)")
+
+    lines, labels = chart.get_legend_handles_labels()
+    lines2, labels2 = ax2.get_legend_handles_labels()
+    leg = ax2.legend(lines + lines2, labels + labels2, loc="upper right")
+
+    chart.set_picker(True)
+    ax2.set_picker(True)
+
+    pickradius = 5  # Points (Pt). How close the click needs to be to trigger an event.
+    for legend_line in leg.get_lines():
+        legend_line.set_picker(pickradius)  # Enable picking on the legend line.
+
+    figure.subplots_adjust(bottom=0.15, hspace=0.1)
+    figure.tight_layout()
+
+    # Drawn at the chart resolution, once the chart width is known (see chart_decimation)
+    decimator = ChartDecimator(chart)
+    decimator.set_data(avg_line, cleaned_df["KM"], cleaned_df["Avg Speed"])
+    decimator.set_data(instant_line, cleaned_df["KM"], cleaned_df["Speed rollmean"])
+    decimator.set_data(elevation_line, cleaned_df["KM"], 100*cleaned_df["Elevation Gain"]/cleaned_df["Distance"])
+    decimator.set_data(avg_fill, df["KM"], df["Avg Speed"])
+    decimator.set_data(instant_fill, df["KM"], df["Speed rollmean"])
+
+    return {"data": cleaned_df,
+            "grade_smoothing": grades.smoothing,
+            "grade_threshold": grades.threshold,
+            "chart": chart,
+            "lines": (avg_line, instant_line, elevation_line),
+            "fills": (avg_fill, instant_fill),
+            "legend": leg,
+            "legend_lines": leg.get_lines(),
+            "decimator": decimator}
+
+@timed("chart.stats_over_time")
+def plot_stats_over_time(figure: Figure, df: DataFrame, summary: ActivitySummary) -> dict:
+    """
+    Plot the chart "Stats over time", that show the average speed and distance vs total time.
+    It only changes the given figure, so it can run in any thread.
+
+    :param figure: The offscreen figure the chart is plotted in.
+    :type figure: Figure
+    :param df: The dataframe containing the data to be plotted. 
+    :type df: pandas.DataFrame. 
+    :param summary: The activity summary, giving the average speed the speeds are colored against.
+    :type summary: ActivitySummary
+    :return: The lines, the speed area and its label extended in live mode, and the speeds the area is colored against.
+    :rtype: dict
+    """
+    chart = figure.subplots()
+
+    deviation = speed_deviation(df["Speed"], summary.average_speed, summary.average_speed_std_dev)
+
+    minutes = df["Tot. Time"].dt.total_seconds().to_numpy()/60
+    speed_area = colored_area(chart, minutes, df["KM"].to_numpy(), 1 - step_means(deviation, SPEED_STEP_SIZE),
+                              SPEED_STEP_SIZE)
+
+    speed_label = chart.annotate(speed_scale_label(summary.average_speed), xy = (0.05, 1.05),
+                                 xycoords='axes fraction')
+
+    distance_line, = chart.plot(df["Tot. Time"].dt.total_seconds()/60, df["KM"], label ="Distance")
+    chart.set_xlabel("Time (minutes)")
+    chart.set_ylabel("Distance (Km)")
+    chart.grid(color = 'green', linestyle = '--', linewidth = 0.3)
+    chart.legend(loc="upper left")
+
+    positive_elevation_gain_df = df[df["Elevation Gain"] > 0]
+    ax2 = chart.twinx()
+    elevation_line, = ax2.plot(positive_elevation_gain_df["Tot. Time"].dt.total_seconds()/60, 
+                               positive_elevation_gain_df["Elevation Gain"].cumsum(), 
+                               color="#334455", label="Elevation Gain")
+    ax2.set_ylabel("Elevation gain (m)")
+    ax2.legend(loc="lower right")
+
+    figure.subplots_adjust(bottom=0.15, hspace=0.2)
+
+    return {"distance_line": distance_line, "elevation_line": elevation_line, "speed_area": speed_area,
+            "speed_label": speed_label, "speed_reference": (summary.average_speed, summary.average_speed_std_dev)}
+
+def speed_scale_label(average_speed: float) -> str:
+    """
+    Get the label of the speed colors of the "Stats over time" chart.
+
+    :param average_speed: The average speed the speeds are colored against (Km/h).
+    :type average_speed: float
+    :return: The label.
+    :rtype: str
+    """
+    return f'speed: red < average ({average_speed:.1f} Km/h) < blue'
+
+def speed_deviation(speeds, final_avg: float, speed_std_dev: float) -> np.ndarray:
+    """
+    Get how much each speed deviates from the final average speed, in the color map scale.
+
+    :param speeds: The speeds (Km/h).
+    :type speeds: numpy.ndarray
+    :param final_avg: The average speed of the activity (Km/h).
+    :type final_avg: float
+    :param speed_std_dev: The standard deviation of the average speed.
+    :type speed_std_dev: float
+    :return: A value between 0 (3 standard deviations below the average) and 1 (3 above) for each speed.
+    :rtype: numpy.ndarray
+    """
+    speeds = np.asarray(speeds, dtype=np.float64)
+    lb = final_avg - 3*speed_std_dev
+    ub = final_avg + 3*speed_std_dev
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(speeds < final_avg, np.fmin(1, (final_avg - speeds)/(final_avg - lb))/2,
+                        0.5 + np.fmin(1, (speeds - final_avg)/(ub - final_avg))/2)
+
+def normalized_grades(level: AggregationLevel, first: int = 0) -> np.ndarray:
+    """
+    Get the road grade between each bucket of distance and the next one (see grade_area), in the color map scale.
+    Grades over 12% are considered outliers and are normalized to 12%.
+
+    :param level: The distance aggregates of the activity (see aggregation_pyramid).
+    :type level: AggregationLevel
+    :param first: The first bucket of the pairs.
+    :type first: int
+    :return: The grade between each pair of consecutive buckets, as a value between 0 (-12%) and 1 (12%).
+    :rtype: numpy.ndarray
+    """
+    # The grade of the whole bucket, its elevation change over its distance
+    gains = level.values("elevation_gain", "sum")[first + 1:]
+    distances = level.values("distance", "sum")[first + 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        grade = np.where(distances > 0, 100*gains/distances, 0)
+    grade = np.clip(grade, -12, 12) # Keeps the grade between -12 and 12
+    return (12 + grade)/24 # A value between 0 and 1
+
+def step_means(values: np.ndarray, step_size: int) -> np.ndarray:
+    """
+    Get the mean of the values of each full step (see colored_area).
+
+    :param values: The values.
+    :type values: numpy.ndarray
+    :param step_size: The step size.
+    :type step_size: int
+    :return: The mean of each step.
+    :rtype: numpy.ndarray
+    """
+    steps = max(0, (len(values) - 1)//step_size)
+
+    return np.asarray(values[:steps*step_size], dtype=np.float64).reshape(steps, step_size).mean(axis=1)
+
+def _step_polygons(x, y, step_size: int) -> np.ndarray:
+    """
+    Get the areas between the x axis and a line, one per step of points.
+
+    :param x: The x values.
+    :type x: Iterable[float]
+    :param y: The y values.
+    :type y: Iterable[float]
+    :param step_size: The number of points of each step.
+    :type step_size: int
+    :return: The vertices of each step area, with shape (steps, step_size + 2, 2).
+    :rtype: numpy.ndarray
+    """
+    steps = max(0, (len(x) - 1)//step_size)
+    xs = np.asarray(x[:steps*step_size], dtype=np.float64).reshape(steps, step_size)
+    ys = np.asarray(y[:steps*step_size], dtype=np.float64).reshape(steps, step_size)
+
+    vertices = np.zeros((steps, step_size + 2, 2))
+    vertices[:, 1:-1, 0] = xs
+    vertices[:, 1:-1, 1] = ys
+    vertices[:, 0, 0] = xs[:, 0]
+    vertices[:, -1, 0] = xs[:, -1]
+
+    return vertices
+
+def colored_area(chart: Axes, x, y, values: np.ndarray, step_size: int) -> PolyCollection:
+    """
+    Fill the area below a line with one color per step of points, in a single collection.
+    Only the full steps before the last point are filled, e.g. points 0 to 9, 10 to 19... for a step size of 10.
+
+    :param chart: The chart.
+    :type chart: Axes
+    :param x: The x values.
+    :type x: Iterable[float]
+    :param y: The y values.
+    :type y: Iterable[float]
+    :param values: The value of each step, between 0 and 1, in the color map scale.
+    :type values: numpy.ndarray
+    :param step_size: The number of points of each step.
+    :type step_size: int
+    :return: The colored area.
+    :rtype: PolyCollection
+    """
+    area = PolyCollection([])
+    update_colored_area(area, x, y, values, step_size)
+    chart.add_collection(area)
+
+    return area
+
+def update_colored_area(area: PolyCollection, x, y, values: np.ndarray, step_size: int) -> None:
+    """
+    Set the line and step colors of an area created by colored_area.
+
+    :param area: The colored area.
+    :type area: PolyCollection
+    :param x: The x values.
+    :type x: Iterable[float]
+    :param y: The y values.
+    :type y: Iterable[float]
+    :param values: The value of each step, between 0 and 1, in the color map scale.
+    :type values: numpy.ndarray
+    :param step_size: The number of points of each step.
+    :type step_size: int
+    :return: None
+    :rtype: None
+    """
+    _set_polygons(area, _step_polygons(x, y, step_size), values)
+
+def extend_colored_area(area: PolyCollection, x, y, values: np.ndarray, step_size: int) -> None:
+    """
+    Add to an area created by colored_area the steps completed by new points (e.g. of a live activity).
+    Only the polygons of the new steps are built.
+
+    :param area: The colored area.
+    :type area: PolyCollection
+    :param x: The x values of all the points.
+    :type x: numpy.ndarray
+    :param y: The y values of all the points.
+    :type y: numpy.ndarray
+    :param values: The value of each new step, between 0 and 1, in the color map scale.
+    :type values: numpy.ndarray
+    :param step_size: The number of points of each step.
+    :type step_size: int
+    :return: None
+    :rtype: None
+    """
+    steps = len(area.get_paths())
+    start = steps*step_size
+    vertices = _step_polygons(x[start:], y[start:], step_size)
+    if len(vertices) > 0:
+        _extend_polygons(area, steps, vertices, values)
+
+def _bucket_polygons(level: AggregationLevel, first: int = 0) -> np.ndarray:
+    """
+    Get the areas below the elevation line between each bucket of distance and the next one.
+    The points of a bucket share the same KM, so the line only moves forward between buckets.
+
+    :param level: The distance aggregates of the activity (see aggregation_pyramid).
+    :type level: AggregationLevel
+    :param first: The first bucket of the areas.
+    :type first: int
+    :return: The vertices of each area, with shape (buckets - first - 1, 4, 2).
+    :rtype: numpy.ndarray
+    """
+    x = level.positions[first:]
+    y = level.values("elevation", "last")[first:]
+
+    vertices = np.zeros((max(0, len(x) - 1), 4, 2))
+    vertices[:, :2, 0] = x[:-1, np.newaxis]
+    vertices[:, 2:, 0] = x[1:, np.newaxis]
+    vertices[:, 1, 1] = y[:-1]
+    vertices[:, 2, 1] = y[1:]
+
+    return vertices
+
+def grade_area(chart: Axes, pyramid: AggregationPyramid) -> PolyCollection:
+    """
+    Fill the area below the elevation line with the color of its grade, one polygon per bucket of
+    distance at the KM resolution, in a single collection.
+
+    :param chart: The chart.
+    :type chart: Axes
+    :param pyramid: The aggregates of the activity (see Activity.pyramid).
+    :type pyramid: AggregationPyramid
+    :return: The colored area.
+    :rtype: PolyCollection
+    """
+    area = PolyCollection([])
+    update_grade_area(area, pyramid)
+    chart.add_collection(area)
+
+    return area
+
+def update_grade_area(area: PolyCollection, pyramid: AggregationPyramid) -> None:
+    """
+    Set the polygons and colors of an area created by grade_area.
+
+    :param area: The colored area.
+    :type area: PolyCollection
+    :param pyramid: The aggregates of the activity (see Activity.pyramid).
+    :type pyramid: AggregationPyramid
+    :return: None
+    :rtype: None
+    """
+    # The coarsest level the KM values can show
+    level = pyramid.level_for(DISTANCE, KM_RESOLUTION)
+    _set_polygons(area, _bucket_polygons(level), normalized_grades(level))
+
+def extend_grade_area(area: PolyCollection, pyramid: AggregationPyramid) -> None:
+    """
+    Update an area created by grade_area with the points appended to the activity (e.g. of a live activity).
+    Only the last bucket of the area can have changed: the polygons from it on are built again, the others are kept.
+
+    :param area: The colored area.
+    :type area: PolyCollection
+    :param pyramid: The aggregates of the activity with the new points (see Activity.pyramid).
+    :type pyramid: AggregationPyramid
+    :return: None
+    :rtype: None
+    """
+    level = pyramid.level_for(DISTANCE, KM_RESOLUTION)
+    # The polygon of the last bucket pair ends in the last bucket
+    kept = max(0, len(area.get_paths()) - 1)
+    _extend_polygons(area, kept, _bucket_polygons(level, kept), normalized_grades(level, kept))
+
+def _extend_polygons(area: PolyCollection, kept: int, vertices: np.ndarray, values: np.ndarray) -> None:
+    """
+    Replace the polygons of a colored area after its first ones, building only the paths of the new polygons.
+
+    :param area: The colored area.
+    :type area: PolyCollection
+    :param kept: The number of polygons kept, with their colors.
+    :type kept: int
+    :param vertices: The vertices of each new polygon.
+    :type vertices: numpy.ndarray
+    :param values: The value of each new polygon, between 0 and 1, in the color map scale.
+    :type values: numpy.ndarray
+    :return: None
+    :rtype: None
+    """
+    # Closed as set_verts closes them, back to their first vertex
+    new_paths = [Path(np.concatenate((polygon, polygon[:1])), closed=True) for polygon in vertices]
+    colors = np.concatenate([area.get_facecolor()[:kept], cm.coolwarm(values)])
+    # PolyCollection.set_paths expects vertices, the kept paths are reused as they are
+    Collection.set_paths(area, [*area.get_paths()[:kept], *new_paths])
+    area.set_facecolor(colors)
+    area.set_edgecolor(colors)
+
+def _set_polygons(area: PolyCollection, vertices: np.ndarray, values: np.ndarray) -> None:
+    """
+    Set the polygons of a colored area and their colors.
+
+    :param area: The colored area.
+    :type area: PolyCollection
+    :param vertices: The vertices of each polygon.
+    :type vertices: numpy.ndarray
+    :param values: The value of each polygon, between 0 and 1, in the color map scale.
+    :type values: numpy.ndarray
+    :return: None
+    :rtype: None
+    """
+    area.set_verts(vertices)
+    set_area_colors(area, values)
+
+def set_area_colors(area: PolyCollection, values: np.ndarray) -> None:
+    """
+    Set the colors of the polygons of a colored area.
+
+    :param area: The colored area.
+    :type area: PolyCollection
+    :param values: The value of each polygon, between 0 and 1, in the color map scale.
+    :type values: numpy.ndarray
+    :return: None
+    :rtype: None
+    """
+    colors = cm.coolwarm(values)
+    # Edges of the step color, as fill_between(color=...) draws them, so neighbor steps have no gap
+    area.set_facecolor(colors)
+    area.set_edgecolor(colors)
+
+@timed("chart.elevation_over_distance")
+def plot_elevation_over_distance(figure: Figure, df: DataFrame, pyramid: AggregationPyramid) -> dict:
+    """
+    Plot the elevation vs distance chart. It only changes the given figure, so it can run in any thread.
+
+    :param figure: The offscreen figure the chart is plotted in.
+    :type figure: Figure
+    :param df: The database containing the data to be plotted. 
+    :type df: Pandas dataframe. 
+    :param pyramid: The aggregates of the activity (see Activity.pyramid), giving the grade of each 100 meters.
+    :type pyramid: AggregationPyramid
+    :return: The line and the grade area extended in live mode, and the line decimator.
+    :rtype: dict
+    """
+    chart = figure.subplots()
+
+    elevation_line, = chart.plot(df["KM"], df["Elevation"])
+    chart.set_xlabel("Distance (Km)")
+    chart.set_ylabel("Elevation (m)")
+    figure.subplots_adjust(bottom=0.15)
+
+    elevation_grade_area = grade_area(chart, pyramid)
+
+    chart.annotate('grade scale: blue < 0% < red', xy = (0.05, 1.05), xycoords='axes fraction')
+    chart.grid(color = 'green', linestyle = '--', linewidth = 0.3)
+
+    decimator = ChartDecimator(chart)
+    decimator.set_data(elevation_line, df["KM"], df["Elevation"])
+
+    return {"elevation_line": elevation_line, "grade_area": elevation_grade_area, "decimator": decimator}
+
+def render_figure(plot: Callable, size: tuple[float, float], dpi: float, args: tuple = (),
+                  image_key: tuple | None = None) -> tuple[Figure, object]:
+    """
+    Plot and rasterize a chart on a new offscreen figure. Safe to be called from any thread.
+
+    :param plot: The plot function. It receives the figure followed by args, and must only change that figure.
+    :type plot: Callable
+    :param size: The figure size in inches.
+    :type size: tuple[float, float]
+    :param dpi: The figure resolution.
+    :type dpi: float
+    :param args: The plot function arguments.
+    :type args: tuple
+    :param image_key: Key of the rendered chart image in the shared chart image cache (see chart_image_cache).
+    :type image_key: tuple | None
+    :return: The rendered figure and the value returned by the plot function.
+    :rtype: tuple[Figure, object]
+    """
+    figure = Figure(figsize=size, dpi=dpi)
+    canvas = FigureCanvasAgg(figure)
+    artists = plot(figure, *args)
+
+    with span("chart.draw", width=int(figure.bbox.width), height=int(figure.bbox.height)):
+        canvas.draw()
+    if image_key is not None:
+        # The buffer already has the chart pixels, savefig would draw the figure again
+        shared_chart_image_cache().put(image_key, encode_png(np.asarray(canvas.buffer_rgba())))
+
+    return figure, artists
+
+def chart_plot(activity: Activity, chart: str) -> tuple[Callable, tuple]:
+    """
+    Get the plot function of a chart and its arguments for an activity.
+
+    :param activity: The activity.
+    :type activity: Activity
+    :param chart: The chart name (see CHART_IMAGE_FILES).
+    :type chart: str
+    :return: The plot function and its arguments, after the figure.
+    :rtype: tuple[Callable, tuple]
+    """
+    df = activity.data_frame
+    if chart == "speed":
+        return plot_speed, (df, activity.smoothed_grades())
+    if chart == "stats_over_time":
+        return plot_stats_over_time, (df, activity.summary)
+    if chart == "elevation_over_distance":
+        return plot_elevation_over_distance, (df, activity.pyramid)
+
+    raise ValueError(f"Unknown chart: {chart}")
+
+def render_chart_image(activity: Activity, chart: str, size: tuple[float, float], dpi: float) -> bytes:
+    """
+    Get the png image of a chart, from the shared chart image cache if it was already rendered at that size.
+    Safe to be called from any thread.
+
+    :param activity: The activity.
+    :type activity: Activity
+    :param chart: The chart name (see CHART_IMAGE_FILES).
+    :type chart: str
+    :param size: The figure size in inches.
+    :type size: tuple[float, float]
+    :param dpi: The figure resolution.
+    :type dpi: float
+    :return: The png file content.
+    :rtype: bytes
+    """
+    # Activities without a content key (e.g. followed live) change, their images are not cached
+    key = ChartImageCache.key(activity.key, chart, size, dpi) if activity.key is not None else None
+    png = shared_chart_image_cache().get(key) if key is not None else None
+    if png is None:
+        plot, args = chart_plot(activity, chart)
+        figure, _ = render_figure(plot, size, dpi, args)
+        png = encode_png(np.asarray(figure.canvas.buffer_rgba()))
+        if key is not None:
+            shared_chart_image_cache().put(key, png)
+
+    return png
@@ -1,45 +1,133 @@
+import matplotlib
 import matplotlib.pyplot as plt
 from typing import Callable
 
 from matplotlib.widgets import RectangleSelector
 from matplotlib.backend_bases import MouseEvent, MouseButton
 
-class ChartRangeSelector:
-    def __init__(self, ax: plt.Axes, select_callback: Callable[[MouseEvent, MouseButton], None]):
+from chart_overlay import ChartOverlay
+
+# The matplotlib versions (minimum included, maximum excluded) whose selector blitting OverlayRectangleSelector
+# replaces (see requirements.txt). With the other versions, the selection is drawn by the stock selector.
+OVERLAY_SELECTOR_MATPLOTLIB_VERSIONS = ((3, 5), (3, 12))
+
+class ClearableRectangleSelector(RectangleSelector):
+    def __init__(self, ax: plt.Axes, select_callback: Callable[[MouseEvent, MouseButton], None], **kwargs):
         """
         Class constructor.
+        A rectangle selector whose selection can be cleared by the select callback.
 
-        :param ax: The axis selected. 
+        :param ax: The axis selected.
         :type ax: Axes
-        :param select_callback: The function to be called after the range selection. 
+        :param select_callback: The function to be called after the range selection.
         :type select_callback: Function[MouseEvent, MouseEvent]
         """
-        self._ax = ax
-        self._select_callback = select_callback
+        self._releasing = False
+        self._clear_pending = False
+        super().__init__(ax, select_callback, useblit=True, **kwargs)
 
-        self._init_selector()
+    def release(self, event: MouseEvent) -> bool:
+        """
+        Handle the button release, which calls the select callback.
 
-    def reset(self) -> None:
+        :param event: The release event.
+        :type event: MouseEvent
+        :return: True if the event was handled.
+        :rtype: bool
+        """
+        self._releasing = True
+        try:
+            return super().release(event)
+        finally:
+            self._releasing = False
+            if self._clear_pending:
+                self._clear_pending = False
+                self.clear()
+
+    def clear(self) -> None:
+        """
+        Clear the selection. Done once the release is handled if called by the select callback,
+        the release marks the selection as completed after the callback.
+
+        :return: None
+        :rtype: None
+        """
+        if self._releasing:
+            self._clear_pending = True
+        else:
+            super().clear()
+
+
+class OverlayRectangleSelector(ClearableRectangleSelector):
+    def __init__(self, ax: plt.Axes, select_callback: Callable[[MouseEvent, MouseButton], None],
+                 overlay: ChartOverlay, **kwargs):
+        """
+        Class constructor.
+        A rectangle selector drawn by the chart animated layer, which keeps the chart background,
+        instead of keeping its own one (drawing the whole chart again when it is taken).
+        It replaces selector internals, so it is only used with the supported matplotlib versions
+        (see OVERLAY_SELECTOR_MATPLOTLIB_VERSIONS).
+
+        :param ax: The axis selected.
+        :type ax: Axes
+        :param select_callback: The function to be called after the range selection.
+        :type select_callback: Function[MouseEvent, MouseEvent]
+        :param overlay: The animated layer of the chart figure.
+        :type overlay: ChartOverlay
+        """
+        self._overlay = overlay
+        super().__init__(ax, select_callback, **kwargs)
+        overlay.add(*self.artists)
+
+    def update_background(self, event) -> None:
         """
-        Reset the range selection
+        Nothing to do, the background is kept by the chart animated layer.
 
         :return: None
         :rtype: None
         """
-        self._selector = None
-        self._init_selector()
-    
-    def _init_selector(self):
+
+    def update(self) -> None:
+        """
+        Draw the selection rectangle.
+
+        :return: None
+        :rtype: None
+        """
+        if self.ax.get_visible():
+            self._overlay.update()
+
+
+class ChartRangeSelector:
+    def __init__(self, ax: plt.Axes, select_callback: Callable[[MouseEvent, MouseButton], None],
+                 overlay: ChartOverlay):
+        """
+        Class constructor.
+
+        :param ax: The axis selected.
+        :type ax: Axes
+        :param select_callback: The function to be called after the range selection.
+        :type select_callback: Function[MouseEvent, MouseEvent]
+        :param overlay: The animated layer of the chart figure.
+        :type overlay: ChartOverlay
         """
-        Init range selection.
-        
+        self._ax = ax
+        self._select_callback = select_callback
+
+        options = dict(button=[1, 3],  # disable middle button
+                       minspanx=5, minspany=5,
+                       spancoords='pixels')
+        minimum, maximum = OVERLAY_SELECTOR_MATPLOTLIB_VERSIONS
+        if minimum <= matplotlib.__version_info__[:2] < maximum:
+            self._selector = OverlayRectangleSelector(self._ax, self._select_callback, overlay, **options)
+        else:
+            self._selector = ClearableRectangleSelector(self._ax, self._select_callback, **options)
+
+    def reset(self) -> None:
+        """
+        Reset the range selection, hiding the selection rectangle.
+
         :return: None
         :rtype: None
         """
-        self._selector = RectangleSelector(
-            self._ax, self._select_callback,
-            useblit=True,
-            button=[1, 3],  # disable middle button
-            minspanx=5, minspany=5,
-            spancoords='pixels')
-        
\ No newline at end of file
+        self._selector.clear()
@@ -0,0 +1,150 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+import matplotlib
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from chart_image_cache import ChartImageCache
+from chart_plots import render_figure
+
+"""
+Offscreen chart rendering.
+The charts are plotted and rasterized by worker threads, each on its own Agg figure, which is
+never shared with another thread while it is rendered. The GUI thread only swaps the rendered
+figure, and its pixel buffer, into the Qt canvas: it does not plot nor draw anything.
+"""
+
+# One worker per dashboard chart, so the charts of an activity render at the same time
+RENDER_WORKERS = min(3, os.cpu_count() or 1)
+
+# The matplotlib versions (minimum included, maximum excluded) whose Agg canvas internals swap_figure reuses
+# (see requirements.txt). With the other versions, the canvas draws the swapped figure again.
+BUFFER_SWAP_MATPLOTLIB_VERSIONS = ((3, 5), (3, 12))
+_REUSES_RENDERED_BUFFER = (BUFFER_SWAP_MATPLOTLIB_VERSIONS[0] <= matplotlib.__version_info__[:2]
+                           < BUFFER_SWAP_MATPLOTLIB_VERSIONS[1])
+
+
+class RenderedChart:
+    __slots__ = ("name", "tag", "figure", "artists", "error")
+
+    def __init__(self, name: str, tag: object, figure: Figure | None, artists: object, error: str | None = None):
+        """
+        Class constructor.
+
+        :param name: The chart name.
+        :type name: str
+        :param tag: Value given when the chart was submitted, e.g. to recognize the charts of an old activity.
+        :type tag: object
+        :param figure: The rendered figure, None if the chart failed.
+        :type figure: Figure | None
+        :param artists: The value returned by the plot function (lines, fills...).
+        :type artists: object
+        :param error: The error message if the chart failed.
+        :type error: str | None
+        """
+        self.name = name
+        self.tag = tag
+        self.figure = figure
+        self.artists = artists
+        self.error = error
+
+
+def swap_figure(canvas: FigureCanvasAgg, figure: Figure) -> None:
+    """
+    Show a figure rendered by render_figure (see chart_plots) in a Qt canvas. Must be called in the GUI thread.
+    The rendered pixels are shown without drawing the figure again with the supported matplotlib versions
+    (see BUFFER_SWAP_MATPLOTLIB_VERSIONS).
+
+    :param canvas: The Qt canvas.
+    :type canvas: FigureCanvasAgg
+    :param figure: The rendered figure.
+    :type figure: Figure
+    :return: None
+    :rtype: None
+    """
+    size = canvas.figure.get_size_inches()
+    dpi = canvas.figure.dpi
+    # Keeps the device pixel ratio handling of the canvas working with the new figure
+    original_dpi = getattr(canvas.figure, "_original_dpi", dpi)
+    rendered_canvas = figure.canvas
+
+    figure.set_canvas(canvas)
+    canvas.figure = figure
+    figure._original_dpi = original_dpi
+
+    if _REUSES_RENDERED_BUFFER and np.allclose(size, figure.get_size_inches()) and dpi == figure.dpi:
+        # The Qt canvas paints the buffer of its renderer, the rendered one is reused as is
+        canvas.renderer = rendered_canvas.renderer
+        canvas._lastKey = rendered_canvas._lastKey
+        canvas.update()
+    else:
+        # The canvas was resized while the chart was rendered, or its renderer can not be replaced
+        figure.set_size_inches(size, forward=False)
+        figure.set_dpi(dpi)
+        canvas.draw_idle()
+
+
+class ChartRenderer(QObject):
+    # Delivered in the GUI thread, with a RenderedChart
+    rendered = pyqtSignal(object)
+
+    def __init__(self, workers: int = RENDER_WORKERS):
+        """
+        Class constructor.
+
+        :param workers: The number of rendering threads.
+        :type workers: int
+        """
+        super().__init__()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chart-render")
+
+    def render(self, name: str, plot: Callable, canvas: FigureCanvasAgg, args: tuple = (), tag: object = None,
+               activity_key: str | None = None) -> Future:
+        """
+        Render a chart in background, at the size of the canvas it will be shown in.
+        The rendered signal is emitted once it is done.
+
+        :param name: The chart name.
+        :type name: str
+        :param plot: The plot function (see chart_plots.render_figure).
+        :type plot: Callable
+        :param canvas: The Qt canvas the chart will be shown in. Only its size is read.
+        :type canvas: FigureCanvasAgg
+        :param args: The plot function arguments.
+        :type args: tuple
+        :param tag: Value passed back in the rendered chart.
+        :type tag: object
+        :param activity_key: The content key of the plotted activity. If given, the chart image is kept in the
+                             shared chart image cache (see chart_image_cache), under the chart name.
+        :type activity_key: str | None
+        :return: The future of the rendered chart.
+        :rtype: Future
+        """
+        size = tuple(canvas.figure.get_size_inches())
+        dpi = canvas.figure.dpi
+        image_key = ChartImageCache.key(activity_key, name, size, dpi) if activity_key is not None else None
+
+        def run() -> RenderedChart:
+            try:
+                figure, artists = render_figure(plot, size, dpi, args, image_key)
+                chart = RenderedChart(name, tag, figure, artists)
+            except Exception as error:
+                chart = RenderedChart(name, tag, None, None, f"{type(error).__name__}: {error}")
+            self.rendered.emit(chart)
+
+            return chart
+
+        return self._executor.submit(run)
+
+    def shutdown(self) -> None:
+        """
+        Stop the rendering threads, without waiting for the charts being rendered.
+
+        :return: None
+        :rtype: None
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
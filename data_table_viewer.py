@@ -13,6 +13,7 @@ from PyQt6.QtWidgets import (
     QAbstractItemView
 )
 
+from instrumentation import timed
 from map_viewer import MapViewer
 from pandas_model import PandasModel
 from page_model import PageModel
@@ -45,7 +46,7 @@ class DataTableViewer(QWidget):
 
         ## Clean the data, create a filter/page model and use it to fill the table. 
         self._format_data()
-        model = PandasModel(self._df.drop(columns=["Elevation Gain", "Delta Time"], axis=1))
+        model = PandasModel(self._df.drop(columns=["Elevation Gain", "Delta Time"]))
         
         self._page_model = PageModel(self._page_size, self)
         self._page_model.setSourceModel(model)
@@ -123,6 +124,7 @@ class DataTableViewer(QWidget):
         self._map_viewer = MapViewer()
         self._map_viewer.show_marker(latitude, longitude)
 
+    @timed("table.format")
     def _format_data(self) -> None:
         """
         Format the data to be shown on the table. 
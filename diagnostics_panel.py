@@ -0,0 +1,141 @@
+from datetime import datetime
+
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtWidgets import (
+    QWidget,
+    QTableWidget,
+    QTableWidgetItem,
+    QLabel,
+    QPushButton,
+    QVBoxLayout,
+    QHBoxLayout,
+    QAbstractItemView
+)
+
+from instrumentation import (RECENT_SPANS, SpanRecord, add_span_listener, clear_spans, recent_spans,
+                             remove_span_listener)
+
+"""
+Window showing the timing spans of the application (see instrumentation), the newest first.
+It is opened with Ctrl+Shift+D on the main window, which reuses the same panel. The panel only
+listens to the spans while it is shown, and shows at most the RECENT_SPANS kept by instrumentation.
+"""
+
+_COLUMNS = ["Span", "Duration (ms)", "Started", "Thread", "Details"]
+
+
+class _SpanSignal(QObject):
+    # Spans finish in worker threads, the signal delivers them to the panel in the GUI thread
+    recorded = pyqtSignal(object)
+
+
+class DiagnosticsPanel(QWidget):
+    def __init__(self):
+        """
+        Class constructor.
+        """
+        super().__init__()
+        self.resize(900, 600)
+        self.setWindowTitle("Diagnostics")
+
+        self._table = QTableWidget(0, len(_COLUMNS))
+        self._table.setHorizontalHeaderLabels(_COLUMNS)
+        self._table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self._table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self._table.horizontalHeader().setStretchLastSection(True)
+
+        self._clear_button = QPushButton("Clear")
+        self._clear_button.setFixedSize(100, 30)
+        self._clear_button.clicked.connect(self.clear)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(QLabel("Set GPX_VIEWER_PROFILE to a span name to write its cProfile."))
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self._clear_button)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self._table)
+        layout.addLayout(buttons_layout)
+
+        self._signal = _SpanSignal()
+        self._signal.recorded.connect(self._add_span)
+        self._listener = self._signal.recorded.emit
+        self._listening = False
+
+    def _set_span(self, row: int, record: SpanRecord) -> None:
+        """
+        Show a span in a row of the table.
+
+        :param row: The row.
+        :type row: int
+        :param record: The finished span.
+        :type record: SpanRecord
+        :return: None
+        :rtype: None
+        """
+        details = ", ".join(f"{key}={value}" for key, value in record.attributes.items())
+        values = ["  "*record.depth + record.name,
+                  f"{1000*record.duration:.1f}",
+                  datetime.fromtimestamp(record.start).strftime("%H:%M:%S.%f")[:-3],
+                  record.thread,
+                  details]
+
+        for column, value in enumerate(values):
+            self._table.setItem(row, column, QTableWidgetItem(value))
+
+    def _add_span(self, record: SpanRecord) -> None:
+        """
+        Add a span at the top of the table.
+
+        :param record: The finished span.
+        :type record: SpanRecord
+        :return: None
+        :rtype: None
+        """
+        self._table.insertRow(0)
+        self._set_span(0, record)
+        # The oldest spans are dropped, as in the span buffer
+        if self._table.rowCount() > RECENT_SPANS:
+            self._table.setRowCount(RECENT_SPANS)
+
+    def clear(self) -> None:
+        """
+        Remove all the spans, from the panel and from the span buffer.
+
+        :return: None
+        :rtype: None
+        """
+        clear_spans()
+        self._table.setRowCount(0)
+
+    def showEvent(self, event) -> None:
+        """
+        Show the last spans and start listening to the new ones when the panel is shown.
+
+        :param event: The show event.
+        :type event: QShowEvent
+        :return: None
+        :rtype: None
+        """
+        if not self._listening:
+            # The spans finished while the panel was closed are in the span buffer
+            records = recent_spans()
+            self._table.setRowCount(len(records))
+            for row, record in enumerate(reversed(records)):
+                self._set_span(row, record)
+            add_span_listener(self._listener)
+            self._listening = True
+        super().showEvent(event)
+
+    def closeEvent(self, event) -> None:
+        """
+        Stop listening to the spans when the panel is closed.
+
+        :param event: The close event.
+        :type event: QCloseEvent
+        :return: None
+        :rtype: None
+        """
+        remove_span_listener(self._listener)
+        self._listening = False
+        super().closeEvent(event)
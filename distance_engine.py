@@ -0,0 +1,136 @@
+import numpy as np
+from geopy import distance
+
+"""
+Batched distance engine.
+Computes the distance between consecutive track points for whole coordinate arrays at once,
+instead of calling geopy once per point.
+
+Available models and their error against the geopy geodesic (WGS-84, Karney) result,
+measured on 1 Hz cycling/running tracks (steps up to a few hundred meters):
+
+- "haversine": spherical earth with the mean radius. Fastest. Relative error up to 0.56%
+  (depends on latitude and heading, 0.13% to 0.4% on average).
+- "ellipsoidal": local tangent plane using the WGS-84 meridional and prime vertical radii
+  of curvature at the mid latitude of each step. The relative error grows with the latitude
+  and the step length: for 1 km steps it is below 1e-8 up to about 60° latitude, 3e-8 at 70°,
+  1e-7 at 80° and 4e-7 at 85°; steps under 100 m (1 Hz tracks) stay below 1e-8 up to 85°.
+  Near the poles it reaches 1e-5 (1 km steps at 89°). This is the default.
+- "geodesic": the exact geopy geodesic, evaluated point by point. Slow, kept as reference.
+"""
+
+HAVERSINE = "haversine"
+ELLIPSOIDAL = "ellipsoidal"
+GEODESIC = "geodesic"
+
+DISTANCE_MODELS = (HAVERSINE, ELLIPSOIDAL, GEODESIC)
+DEFAULT_DISTANCE_MODEL = ELLIPSOIDAL
+
+_MEAN_EARTH_RADIUS = 6371008.8
+_WGS84_SEMI_MAJOR_AXIS = 6378137.0
+_WGS84_FLATTENING = 1/298.257223563
+_WGS84_ECCENTRICITY_SQUARED = _WGS84_FLATTENING*(2 - _WGS84_FLATTENING)
+
+
+def _haversine_flat_distances(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Calculate the spherical (haversine) distance between consecutive points.
+
+    :param lat: The latitudes in radians.
+    :type lat: numpy.ndarray
+    :param lon: The longitudes in radians.
+    :type lon: numpy.ndarray
+    :return: The n - 1 distances in meters.
+    :rtype: numpy.ndarray
+    """
+    sin_half_delta_lat = np.sin(np.diff(lat)/2)
+    sin_half_delta_lon = np.sin(np.diff(lon)/2)
+    h = sin_half_delta_lat**2 + np.cos(lat[:-1])*np.cos(lat[1:])*sin_half_delta_lon**2
+
+    return 2*_MEAN_EARTH_RADIUS*np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+def _ellipsoidal_flat_distances(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Calculate the distance between consecutive points projecting each step on the plane
+    tangent to the WGS-84 ellipsoid at the step mid latitude.
+
+    :param lat: The latitudes in radians.
+    :type lat: numpy.ndarray
+    :param lon: The longitudes in radians.
+    :type lon: numpy.ndarray
+    :return: The n - 1 distances in meters.
+    :rtype: numpy.ndarray
+    """
+    mid_lat = (lat[:-1] + lat[1:])/2
+    delta_lon = np.diff(lon)
+    delta_lon = (delta_lon + np.pi) % (2*np.pi) - np.pi # Handles the antimeridian crossing
+
+    w = 1 - _WGS84_ECCENTRICITY_SQUARED*np.sin(mid_lat)**2
+    meridional_radius = _WGS84_SEMI_MAJOR_AXIS*(1 - _WGS84_ECCENTRICITY_SQUARED)/(w*np.sqrt(w))
+    prime_vertical_radius = _WGS84_SEMI_MAJOR_AXIS/np.sqrt(w)
+
+    return np.hypot(meridional_radius*np.diff(lat), prime_vertical_radius*np.cos(mid_lat)*delta_lon)
+
+def _geodesic_flat_distances(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Calculate the exact geodesic distance between consecutive points using geopy.
+
+    :param lat: The latitudes in degrees.
+    :type lat: numpy.ndarray
+    :param lon: The longitudes in degrees.
+    :type lon: numpy.ndarray
+    :return: The n - 1 distances in meters.
+    :rtype: numpy.ndarray
+    """
+    points = list(zip(lat.tolist(), lon.tolist()))
+
+    return np.fromiter((distance.distance(a, b).m for a, b in zip(points[:-1], points[1:])),
+                       dtype=np.float64, count=max(len(points) - 1, 0))
+
+def calculate_step_distances(latitudes: np.ndarray,
+                             longitudes: np.ndarray,
+                             elevations: np.ndarray,
+                             segment_starts: np.ndarray | None = None,
+                             model: str = DEFAULT_DISTANCE_MODEL) -> np.ndarray:
+    """
+    Calculate the 3D distance between each point and the previous one in a single pass.
+    The first point, and the first point of each segment, have distance 0.
+
+    :param latitudes: The point latitudes in degrees.
+    :type latitudes: numpy.ndarray
+    :param longitudes: The point longitudes in degrees.
+    :type longitudes: numpy.ndarray
+    :param elevations: The point elevations in meters. NaN elevations are ignored in the vertical component.
+    :type elevations: numpy.ndarray
+    :param segment_starts: The indexes of the first point of each track segment.
+    :type segment_starts: numpy.ndarray | None
+    :param model: The distance model, one of DISTANCE_MODELS.
+    :type model: str
+    :return: An array with one distance (in meters) per point.
+    :rtype: numpy.ndarray
+    """
+    if model not in DISTANCE_MODELS:
+        raise ValueError(f"Unknown distance model '{model}'. Expected one of {DISTANCE_MODELS}")
+
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    elevations = np.asarray(elevations, dtype=np.float64)
+
+    distances = np.zeros(len(latitudes), dtype=np.float64)
+    if len(latitudes) < 2:
+        return distances
+
+    if model == GEODESIC:
+        flat_distances = _geodesic_flat_distances(latitudes, longitudes)
+    elif model == HAVERSINE:
+        flat_distances = _haversine_flat_distances(np.radians(latitudes), np.radians(longitudes))
+    else:
+        flat_distances = _ellipsoidal_flat_distances(np.radians(latitudes), np.radians(longitudes))
+
+    elevation_differences = np.nan_to_num(np.diff(elevations))
+    distances[1:] = np.hypot(flat_distances, elevation_differences)
+
+    if segment_starts is not None:
+        distances[np.asarray(segment_starts, dtype=np.int64)] = 0
+
+    return distances
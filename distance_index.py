@@ -0,0 +1,68 @@
+import numpy as np
+
+"""
+Lookup of chart points by distance.
+The charts map the mouse position to the closest point by its accumulated distance. The
+distances of a track only grow, so the closest point is found with a binary search instead
+of scanning every point on each mouse event.
+"""
+
+
+class DistanceIndex:
+    __slots__ = ("_distances", )
+
+    def __init__(self, distances):
+        """
+        Class constructor.
+
+        :param distances: The accumulated distance of each point, in increasing order.
+        :type distances: Iterable[float]
+        """
+        self._distances = np.asarray(distances, dtype=np.float64)
+
+    def __len__(self) -> int:
+        """
+        Get the number of points.
+
+        :return: The number of points.
+        :rtype: int
+        """
+        return len(self._distances)
+
+    def nearest(self, distance: float) -> int:
+        """
+        Get the position of the point closest to a distance. Among points at the same distance, the first one.
+
+        :param distance: The distance.
+        :type distance: float
+        :return: The point position, -1 if there is no point.
+        :rtype: int
+        """
+        distances = self._distances
+        if len(distances) == 0:
+            return -1
+
+        after = int(np.searchsorted(distances, distance, side="left"))
+        if after == len(distances):
+            candidate = distances[-1]
+        elif after == 0 or distances[after] - distance < distance - distances[after - 1]:
+            return after
+        else:
+            candidate = distances[after - 1]
+
+        return int(np.searchsorted(distances, candidate, side="left"))
+
+    def span(self, start: float, end: float) -> tuple[int, int]:
+        """
+        Get the positions of the points closest to the bounds of a distance range.
+
+        :param start: A bound of the range.
+        :type start: float
+        :param end: The other bound of the range.
+        :type end: float
+        :return: The lower and upper positions.
+        :rtype: tuple[int, int]
+        """
+        positions = sorted((self.nearest(start), self.nearest(end)))
+
+        return positions[0], positions[1]
@@ -4,6 +4,18 @@ import math
 from geopy import distance
 from pandas import DataFrame
 import numpy as np
+from typing import Callable
+from distance_engine import DEFAULT_DISTANCE_MODEL
+from gpx_reader import (GpxColumns, UnsupportedGpxError, UnterminatedGpxError, read_gpx_columns,
+                        read_gpx_columns_with_gpxpy)
+from gpx_sources import open_gpx_source
+from instrumentation import span, timed
+from metrics import speed, rolling_mean
+from track import Track
+
+# Must be increased whenever the data frame columns or the way they are calculated change,
+# so persisted activities (see activity_cache) are recalculated.
+PROCESSOR_VERSION = 2
 
 
 def calculate_distance(a: gpxpy.gpx.GPXTrackPoint, b: gpxpy.gpx.GPXTrackPoint) -> float:
@@ -23,67 +35,84 @@ def calculate_distance(a: gpxpy.gpx.GPXTrackPoint, b: gpxpy.gpx.GPXTrackPoint) -
 
     return math.sqrt(flat_distance**2 + (p2[2] - p1[2])**2)
 
-def get_data_frame_from_gpx_file(file_name: str) -> DataFrame: 
+def read_gpx_file_columns(file_name: str, progress_callback: Callable[[int, int], None] | None = None) -> GpxColumns:
+    """
+    Read the track points of a gpx file with the streaming reader, falling back to gpxpy
+    for the files it does not support.
+
+    :param file_name: The path of the gpx file, which may be compressed or inside a zip archive (see gpx_sources).
+    :type file_name: str
+    :param progress_callback: Called while reading with the number of bytes read so far and the total.
+    :type progress_callback: Callable[[int, int], None] | None
+    :return: The track point columns.
+    :rtype: GpxColumns
+    :raises UnterminatedGpxError: If the file ends before its closing tags (e.g. it is still being written).
+    """
+    with span("gpx.parse", file=file_name) as details:
+        try:
+            with open_gpx_source(file_name, progress_callback) as source:
+                columns = read_gpx_columns(source)
+            details["reader"] = "streaming"
+        except UnterminatedGpxError:
+            # gpxpy can not read it either
+            raise
+        except UnsupportedGpxError:
+            with open_gpx_source(file_name, progress_callback) as source:
+                columns = read_gpx_columns_with_gpxpy(source)
+            details["reader"] = "gpxpy"
+        details["points"] = len(columns)
+
+    return columns
+
+def get_track_from_gpx_file(file_name: str, distance_model: str = DEFAULT_DISTANCE_MODEL,
+                            progress_callback: Callable[[int, int], None] | None = None) -> Track:
+    """
+    Read the data from a gpx file into a compact track.
+
+    :param file_name: The path of the gpx file.
+    :type file_name: str
+    :param distance_model: The model used to calculate the distance between points (see distance_engine).
+    :type distance_model: str
+    :param progress_callback: Called while reading with the number of bytes read so far and the total.
+    :type progress_callback: Callable[[int, int], None] | None
+    :return: The track read from the gpx file.
+    :rtype: Track
+    """
+    with span("gpx.track", file=file_name, distance_model=distance_model):
+        return Track.from_gpx_columns(read_gpx_file_columns(file_name, progress_callback), distance_model)
+
+def get_data_frame_from_gpx_file(file_name: str, distance_model: str = DEFAULT_DISTANCE_MODEL) -> DataFrame: 
     """
     Read the data from a gpx file and use it to fill a pandas dataframe.
 
     :param file_name: The path of the gpx file.
     :type file_name: str
+    :param distance_model: The model used to calculate the distance between points (see distance_engine).
+    :type distance_model: str
     :return: A pandas dataframe containing the data from the gpx file.
     :rtype: pandas.DataFrame
     """
-    gpx_file = open(file_name, 'r')
-    gpx = gpxpy.parse(gpx_file)
-    rows = []
-    accumulated_distance = 0
-    
-    for track in gpx.tracks:
-        for segment in track.segments:
-            if len(segment.points) == 0:
-                continue
-            previous = segment.points[0]
-            first_time = segment.points[0].time
-            for point in segment.points:
-                lat, long, elevation, time = point.latitude, point.longitude, point.elevation, point.time
-                dist = round(calculate_distance(previous, point), 5)
-                accumulated_distance += dist        
-                accumulated_time = time - first_time
-                rows.append([time, lat, long, elevation, dist, accumulated_distance, accumulated_time])
-                previous = point
-            
-    df = DataFrame(columns= ["Time",
-                                "Latitude", 
-                                "Longitude", 
-                                "Elevation", 
-                                "Distance",
-                                "Tot. Distance", 
-                                "Tot. Time"], 
-                      data=rows)
-    
-    df["Delta Time"] = df["Time"].diff().dt.total_seconds()
-    df.at[0, "Delta Time"] = 0
-    df["Elevation Gain"] = df["Elevation"].diff()
-    df.at[0, "Elevation Gain"] = 0
-
-    return df
+    return get_track_from_gpx_file(file_name, distance_model).to_dataframe(include_speed=False)
 
+@timed("metrics.speed_data_frame")
 def calculate_speed_data_frame(df: DataFrame) -> None:
     """
     Calculate the instantaneous speed on each measurement. 
+    The "Delta Time" and "Elevation Gain" columns are only calculated if they are missing.
 
     :param df: The dataframe containing the data.
     :type df: pandas.DataFrame
     :return: None
     :rtype: None
     """
-    toSeconds = lambda timeDelta: timeDelta.dt.total_seconds()
-    speedEval = lambda time, distance : np.where(time > 0, 3.6*distance/time, 0)
-    df["Delta Time"] = toSeconds(df["Time"].diff())
-    df.at[0, "Delta Time"] = 0
-    df["Elevation Gain"] = df["Elevation"].diff()
-    df.at[0, "Elevation Gain"] = 0
-    df["Speed"] = speedEval(df["Delta Time"], df["Distance"])
-    df["Speed rollmean"] = df["Speed"].rolling(20).mean()
-    df["Avg Speed"] = speedEval(toSeconds(df["Tot. Time"]), df["Tot. Distance"])
+    toSeconds = lambda timeDelta: timeDelta.dt.total_seconds().to_numpy()
+    if "Delta Time" not in df:
+        df["Delta Time"] = toSeconds(df["Time"].diff())
+        df.at[0, "Delta Time"] = 0
+    if "Elevation Gain" not in df:
+        df["Elevation Gain"] = df["Elevation"].diff()
+        df.at[0, "Elevation Gain"] = 0
+    df["Speed"] = speed(df["Delta Time"].to_numpy(), df["Distance"].to_numpy())
+    df["Speed rollmean"] = rolling_mean(df["Speed"].to_numpy())
+    df["Avg Speed"] = speed(toSeconds(df["Tot. Time"]), df["Tot. Distance"].to_numpy())
     df["KM"] = (df["Tot. Distance"]/100).astype(int)/10
-
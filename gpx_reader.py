@@ -0,0 +1,392 @@
+import os
+import re
+import numpy as np
+import gpxpy
+from datetime import datetime, timezone
+from typing import BinaryIO
+from xml.etree.ElementTree import Element, XMLPullParser, iterparse, ParseError
+from xml.parsers.expat import errors as expat_errors
+
+"""
+Streaming GPX reader.
+Fills columnar NumPy arrays (time, latitude, longitude and elevation) straight from the XML
+events, clearing every parsed track point so memory stays flat even for very large files.
+Files the streaming reader does not understand are read through gpxpy.
+IncrementalGpxReader reads files that are still being written, parsing only the appended points.
+"""
+
+_NANOSECONDS_PER_SECOND = 1_000_000_000
+_CLOSING_TRACK_POINT = re.compile(rb"</(?:[\w.-]+:)?trkpt\s*>")
+# The parser errors raised when the document ends before its closing tags
+_UNTERMINATED_DOCUMENT_ERRORS = {expat_errors.codes[message] for message in
+                                 [expat_errors.XML_ERROR_NO_ELEMENTS, expat_errors.XML_ERROR_UNCLOSED_TOKEN,
+                                  expat_errors.XML_ERROR_PARTIAL_CHAR]}
+
+
+class UnsupportedGpxError(ValueError):
+    """
+    Raised when the streaming reader can not handle a gpx file.
+    """
+
+
+class UnterminatedGpxError(UnsupportedGpxError):
+    """
+    Raised when a gpx document ends before its closing tags, e.g. a file still being written by a recorder.
+    """
+
+
+def _parse_error(error: Exception) -> UnsupportedGpxError:
+    """
+    Get the error raised for a gpx file the XML parser could not read.
+
+    :param error: The parser error.
+    :type error: Exception
+    :return: UnterminatedGpxError if the document ends too early, UnsupportedGpxError otherwise.
+    :rtype: UnsupportedGpxError
+    """
+    if isinstance(error, ParseError) and error.code in _UNTERMINATED_DOCUMENT_ERRORS:
+        return UnterminatedGpxError(str(error))
+
+    return UnsupportedGpxError(str(error))
+
+
+class GrowableColumn:
+    __slots__ = ("_data", "_size")
+
+    def __init__(self, dtype: np.dtype, capacity: int = 4096):
+        """
+        Class constructor.
+
+        :param dtype: The column data type.
+        :type dtype: numpy.dtype
+        :param capacity: The number of preallocated values.
+        :type capacity: int
+        """
+        self._data = np.empty(max(1, capacity), dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        """
+        Get the number of values in the column.
+
+        :return: The number of values.
+        :rtype: int
+        """
+        return self._size
+
+    def append(self, value) -> None:
+        """
+        Append a value to the column, doubling the capacity when it is full.
+
+        :param value: The value to be appended.
+        :return: None
+        :rtype: None
+        """
+        if self._size == len(self._data):
+            grown = np.empty(2*len(self._data), dtype=self._data.dtype)
+            grown[:self._size] = self._data
+            self._data = grown
+
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values: np.ndarray) -> None:
+        """
+        Append several values to the column, growing the capacity at least twofold when needed.
+
+        :param values: The values to be appended.
+        :type values: numpy.ndarray
+        :return: None
+        :rtype: None
+        """
+        size = self._size + len(values)
+        if size > len(self._data):
+            grown = np.empty(max(size, 2*len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+        self._data[self._size:size] = values
+        self._size = size
+
+    def to_array(self) -> np.ndarray:
+        """
+        Get the column values, without the unused capacity.
+
+        :return: A view on the filled part of the column.
+        :rtype: numpy.ndarray
+        """
+        return self._data[:self._size]
+
+
+class GpxColumns:
+    __slots__ = ("times", "latitudes", "longitudes", "elevations", "segment_starts")
+
+    def __init__(self, times: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray,
+                 elevations: np.ndarray, segment_starts: np.ndarray):
+        """
+        Class constructor.
+
+        :param times: The point times, as UTC epoch nanoseconds.
+        :type times: numpy.ndarray
+        :param latitudes: The point latitudes in degrees.
+        :type latitudes: numpy.ndarray
+        :param longitudes: The point longitudes in degrees.
+        :type longitudes: numpy.ndarray
+        :param elevations: The point elevations in meters (NaN when missing).
+        :type elevations: numpy.ndarray
+        :param segment_starts: The index of the first point of each non empty segment.
+        :type segment_starts: numpy.ndarray
+        """
+        self.times = times
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.elevations = elevations
+        self.segment_starts = segment_starts
+
+    def __len__(self) -> int:
+        """
+        Get the number of points.
+
+        :return: The number of points.
+        :rtype: int
+        """
+        return len(self.times)
+
+
+def _local_name(tag: str) -> str:
+    """
+    Remove the namespace from a XML tag.
+
+    :param tag: The tag, possibly in the "{namespace}name" form.
+    :type tag: str
+    :return: The tag name without namespace.
+    :rtype: str
+    """
+    return tag[tag.rfind("}") + 1:]
+
+def _to_epoch_nanoseconds(value: datetime) -> int:
+    """
+    Convert a datetime to UTC epoch nanoseconds. Naive datetimes are considered to be in UTC.
+
+    :param value: The datetime to be converted.
+    :type value: datetime
+    :return: The number of nanoseconds since the epoch.
+    :rtype: int
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    return (delta.days*86400 + delta.seconds)*_NANOSECONDS_PER_SECOND + delta.microseconds*1000
+
+def _parse_time(text: str | None) -> int:
+    """
+    Parse a gpx time element text.
+
+    :param text: The element text, in ISO 8601 format.
+    :type text: str | None
+    :return: The time as UTC epoch nanoseconds.
+    :rtype: int
+    """
+    if not text:
+        raise UnsupportedGpxError("Track point without time")
+    try:
+        return _to_epoch_nanoseconds(datetime.fromisoformat(text.strip()))
+    except ValueError as error:
+        raise UnsupportedGpxError(f"Unsupported time format '{text}'") from error
+
+
+class _TrackPointCollector:
+    def __init__(self):
+        """
+        Class constructor.
+        Collects the track points from the XML parser events, keeping the parsing state
+        (current track and segment) between calls.
+        """
+        self._in_track = False
+        self._segment = None
+        self._segment_started = False
+        self._reset_columns()
+
+    def _reset_columns(self) -> None:
+        """
+        Start new, empty, columns.
+
+        :return: None
+        :rtype: None
+        """
+        self._times = GrowableColumn(np.int64)
+        self._latitudes = GrowableColumn(np.float64)
+        self._longitudes = GrowableColumn(np.float64)
+        self._elevations = GrowableColumn(np.float64)
+        self._segment_starts = []
+
+    def handle(self, event: str, element: Element) -> None:
+        """
+        Handle a XML parser event.
+
+        :param event: The event type, "start" or "end".
+        :type event: str
+        :param element: The element of the event.
+        :type element: xml.etree.ElementTree.Element
+        :return: None
+        :rtype: None
+        :raises UnsupportedGpxError: If the track point can not be read.
+        """
+        name = _local_name(element.tag)
+        if event == "start":
+            if name == "trk":
+                self._in_track = True
+            elif name == "trkseg" and self._in_track:
+                self._segment = element
+                self._segment_started = False
+            return
+
+        if name == "trkpt" and self._segment is not None:
+            elevation, time = np.nan, None
+            for child in element:
+                child_name = _local_name(child.tag)
+                if child_name == "ele" and child.text:
+                    elevation = float(child.text)
+                elif child_name == "time":
+                    time = child.text
+
+            if not self._segment_started:
+                self._segment_starts.append(len(self._times))
+                self._segment_started = True
+            self._times.append(_parse_time(time))
+            self._latitudes.append(float(element.attrib["lat"]))
+            self._longitudes.append(float(element.attrib["lon"]))
+            self._elevations.append(elevation)
+            # Drops the parsed point, so the XML tree never grows
+            self._segment.remove(element)
+        elif name == "trkseg":
+            self._segment = None
+        elif name == "trk":
+            self._in_track = False
+            element.clear()
+
+    def take_columns(self) -> GpxColumns:
+        """
+        Get the points collected since the last call.
+
+        :return: The collected track point columns. Segment starts are relative to the returned points.
+        :rtype: GpxColumns
+        """
+        columns = GpxColumns(self._times.to_array(),
+                             self._latitudes.to_array(),
+                             self._longitudes.to_array(),
+                             self._elevations.to_array(),
+                             np.array(self._segment_starts, dtype=np.int64))
+        self._reset_columns()
+
+        return columns
+
+
+def read_gpx_columns(source: str | BinaryIO) -> GpxColumns:
+    """
+    Read the track points of a gpx file in a streaming fashion.
+
+    :param source: The path of the gpx file or a binary file object.
+    :type source: str | BinaryIO
+    :return: The track point columns.
+    :rtype: GpxColumns
+    :raises UnsupportedGpxError: If the file can not be read by the streaming reader.
+    :raises UnterminatedGpxError: If the file ends before its closing tags.
+    """
+    collector = _TrackPointCollector()
+    try:
+        for event, element in iterparse(source, events=("start", "end")):
+            collector.handle(event, element)
+    except UnsupportedGpxError:
+        raise
+    except (ParseError, KeyError, ValueError) as error:
+        raise _parse_error(error) from error
+
+    return collector.take_columns()
+
+
+class IncrementalGpxReader:
+    def __init__(self, file_name: str):
+        """
+        Class constructor.
+        Reads a gpx file that is still being written, parsing only the bytes appended since the previous read.
+
+        :param file_name: The path of the gpx file.
+        :type file_name: str
+        """
+        self._file_name = file_name
+        self._offset = 0
+        self._parser = XMLPullParser(events=("start", "end"))
+        self._collector = _TrackPointCollector()
+
+    def read_new_points(self) -> GpxColumns:
+        """
+        Read the track points appended to the file since the previous call.
+        Only complete track points are consumed, so the closing tags a recorder may write
+        (and later overwrite) at the end of the file are never parsed.
+
+        :return: The new track point columns. A segment start at 0 means the points do not continue the previous segment.
+        :rtype: GpxColumns
+        :raises UnsupportedGpxError: If the file was truncated or rewritten, or can not be parsed.
+        """
+        if os.path.getsize(self._file_name) < self._offset:
+            raise UnsupportedGpxError("The file was truncated")
+
+        with open(self._file_name, "rb") as file:
+            file.seek(self._offset)
+            data = file.read()
+
+        last_point_end = None
+        for last_point_end in _CLOSING_TRACK_POINT.finditer(data):
+            pass
+        if last_point_end is None:
+            return self._collector.take_columns()
+
+        try:
+            self._parser.feed(data[:last_point_end.end()])
+            for event, element in self._parser.read_events():
+                self._collector.handle(event, element)
+        except UnsupportedGpxError:
+            raise
+        except (ParseError, KeyError, ValueError) as error:
+            raise UnsupportedGpxError(str(error)) from error
+        self._offset += last_point_end.end()
+
+        return self._collector.take_columns()
+
+def read_gpx_columns_with_gpxpy(source: str | BinaryIO) -> GpxColumns:
+    """
+    Read the track points of a gpx file loading the whole gpxpy object tree.
+    It is slower and uses more memory than read_gpx_columns, but accepts more unusual files.
+
+    :param source: The path of the gpx file or a binary file object.
+    :type source: str | BinaryIO
+    :return: The track point columns.
+    :rtype: GpxColumns
+    """
+    if isinstance(source, str):
+        with open(source, 'r') as gpx_file:
+            gpx = gpxpy.parse(gpx_file)
+    else:
+        gpx = gpxpy.parse(source)
+
+    times, latitudes, longitudes, elevations = [], [], [], []
+    segment_starts = []
+
+    for track in gpx.tracks:
+        for segment in track.segments:
+            if len(segment.points) == 0:
+                continue
+            segment_starts.append(len(times))
+            for point in segment.points:
+                times.append(_to_epoch_nanoseconds(point.time))
+                latitudes.append(point.latitude)
+                longitudes.append(point.longitude)
+                elevations.append(np.nan if point.elevation is None else point.elevation)
+
+    return GpxColumns(np.array(times, dtype=np.int64),
+                      np.array(latitudes, dtype=np.float64),
+                      np.array(longitudes, dtype=np.float64),
+                      np.array(elevations, dtype=np.float64),
+                      np.array(segment_starts, dtype=np.int64))
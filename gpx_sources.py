@@ -0,0 +1,196 @@
+import bz2
+import gzip
+import os
+import zipfile
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import BinaryIO, Callable, Iterator
+
+"""
+Sources of gpx data: plain .gpx files, .gpx.gz and .gpx.bz2 files, and gpx files inside zip
+archives, such as the Strava bulk export (activities/*.gpx.gz in a zip).
+A file inside an archive is addressed by the archive path followed by the member name,
+e.g. "export.zip/activities/1234.gpx.gz". Everything is decompressed on the fly, straight
+into the reader, without extracting anything to disk.
+"""
+
+GPX_EXTENSIONS = (".gpx", ".gpx.gz", ".gpx.bz2")
+ARCHIVE_EXTENSION = ".zip"
+
+_ARCHIVE_MEMBER_SEPARATOR = "/"
+
+
+def is_gpx_file_name(name: str) -> bool:
+    """
+    Check whether a file name is a, possibly compressed, gpx file.
+
+    :param name: The file name or path.
+    :type name: str
+    :return: True if the name has a gpx extension.
+    :rtype: bool
+    """
+    return name.lower().endswith(GPX_EXTENSIONS)
+
+def split_archive_path(path: str) -> tuple[str, str | None]:
+    """
+    Split a path into the archive path and the member name.
+
+    :param path: The path of a file, or of a member inside a zip archive.
+    :type path: str
+    :return: The archive path and the member name, or the path and None if it is not inside an archive.
+    :rtype: tuple[str, str | None]
+    """
+    if os.path.exists(path):
+        return path, None
+
+    lower_path = path.lower()
+    position = lower_path.find(ARCHIVE_EXTENSION + _ARCHIVE_MEMBER_SEPARATOR)
+    while position >= 0:
+        archive_end = position + len(ARCHIVE_EXTENSION)
+        if os.path.isfile(path[:archive_end]):
+            return path[:archive_end], path[archive_end + 1:]
+        position = lower_path.find(ARCHIVE_EXTENSION + _ARCHIVE_MEMBER_SEPARATOR, archive_end)
+
+    return path, None
+
+
+class _ProgressFile:
+    __slots__ = ("_file", "_total", "_done", "_progress_callback")
+
+    def __init__(self, file: BinaryIO, total: int, progress_callback: Callable[[int, int], None]):
+        """
+        Class constructor.
+        Binary file wrapper reporting the number of bytes read.
+
+        :param file: The wrapped file.
+        :type file: BinaryIO
+        :param total: The number of bytes of the file.
+        :type total: int
+        :param progress_callback: Called after each read with the number of bytes read so far and the total.
+        :type progress_callback: Callable[[int, int], None]
+        """
+        self._file = file
+        self._total = total
+        self._done = 0
+        self._progress_callback = progress_callback
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Read bytes from the wrapped file, reporting the progress.
+
+        :param size: The maximum number of bytes, -1 to read everything.
+        :type size: int
+        :return: The bytes read.
+        :rtype: bytes
+        """
+        data = self._file.read(size)
+        self._done += len(data)
+        self._progress_callback(self._done, self._total)
+
+        return data
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
+
+
+@lru_cache(maxsize=8)
+def _open_archive(archive_path: str, modification_time: float) -> zipfile.ZipFile:
+    """
+    Open a zip archive, reusing it while it is not modified.
+    Reading the central directory of a large archive is slow, so it is done once per process
+    and not once per member. ZipFile supports reading members from several threads.
+
+    :param archive_path: The archive path.
+    :type archive_path: str
+    :param modification_time: The archive modification time, part of the cache key.
+    :type modification_time: float
+    :return: The open archive.
+    :rtype: zipfile.ZipFile
+    """
+    return zipfile.ZipFile(archive_path)
+
+def _archive(archive_path: str) -> zipfile.ZipFile:
+    """
+    Get an open zip archive.
+
+    :param archive_path: The archive path.
+    :type archive_path: str
+    :return: The open archive.
+    :rtype: zipfile.ZipFile
+    """
+    return _open_archive(os.path.abspath(archive_path), os.path.getmtime(archive_path))
+
+def list_archive_gpx_files(archive_path: str) -> list[str]:
+    """
+    List the gpx files inside a zip archive.
+
+    :param archive_path: The archive path.
+    :type archive_path: str
+    :return: The sorted paths of the gpx members (archive path followed by the member name).
+    :rtype: list[str]
+    """
+    names = [name for name in _archive(archive_path).namelist() if is_gpx_file_name(name)]
+
+    return sorted(archive_path + _ARCHIVE_MEMBER_SEPARATOR + name for name in names)
+
+@contextmanager
+def open_raw_source(path: str) -> Iterator[BinaryIO]:
+    """
+    Open the stored bytes of a file or archive member, without decompressing .gz or .bz2 files.
+    Used to hash the content of a source.
+
+    :param path: The path of a file, or of a member inside a zip archive.
+    :type path: str
+    :return: The binary file object.
+    :rtype: Iterator[BinaryIO]
+    """
+    archive_path, member = split_archive_path(path)
+    file = _archive(archive_path).open(member) if member is not None else open(path, "rb")
+    try:
+        yield file
+    finally:
+        file.close()
+
+def _source_size(path: str) -> int:
+    """
+    Get the size of a file or archive member.
+
+    :param path: The path of a file, or of a member inside a zip archive.
+    :type path: str
+    :return: The (uncompressed, for archive members) size in bytes.
+    :rtype: int
+    """
+    archive_path, member = split_archive_path(path)
+    if member is not None:
+        return _archive(archive_path).getinfo(member).file_size
+
+    return os.path.getsize(path)
+
+@contextmanager
+def open_gpx_source(path: str, progress_callback: Callable[[int, int], None] | None = None) -> Iterator[BinaryIO]:
+    """
+    Open a gpx source, decompressing it on the fly if needed.
+
+    :param path: The path of a .gpx, .gpx.gz or .gpx.bz2 file, possibly inside a zip archive.
+    :type path: str
+    :param progress_callback: Called while reading with the number of stored bytes read so far and the total.
+    :type progress_callback: Callable[[int, int], None] | None
+    :return: The binary file object with the gpx xml content.
+    :rtype: Iterator[BinaryIO]
+    """
+    lower_path = path.lower()
+    with open_raw_source(path) as raw_file:
+        if progress_callback is not None:
+            raw_file = _ProgressFile(raw_file, _source_size(path), progress_callback)
+        if lower_path.endswith(".gz"):
+            file = gzip.GzipFile(fileobj=raw_file, mode="rb")
+        elif lower_path.endswith(".bz2"):
+            file = bz2.BZ2File(raw_file, mode="rb")
+        else:
+            yield raw_file
+            return
+
+        try:
+            yield file
+        finally:
+            file.close()
@@ -1,18 +1,24 @@
 import numpy as np
-from pandas import DataFrame, Series, cut
+from pandas import DataFrame, Series
 
 from matplotlib.backends.qt_compat import QtWidgets
 from matplotlib.backends.backend_qtagg import FigureCanvas
 from matplotlib.figure import Figure
 from PyQt6.QtWidgets import QWidget
 
+from instrumentation import timed
+from interval_binning import IntervalBinning
+
+# The edges of the grade intervals (%) of the interval charts
+GRADE_INTERVAL_EDGES = np.concatenate([[-np.inf], np.arange(-10, 10.00001, 2), [np.inf]])
+
 class GradeDetailedDashboard(QWidget):
-    def __init__(self, data_frame: DataFrame):
+    def __init__(self, data: dict):
         """
         Class consturctor.
         
-        :param data_frame: The data frame to be used in the dashboard.
-        :type data_frame: pandas.DataFrame
+        :param data: The data of the charts, prepared from the activity data frame (see prepare_data).
+        :type data: dict
         """
         super().__init__()
         layout = QtWidgets.QVBoxLayout(self)
@@ -35,48 +41,62 @@ class GradeDetailedDashboard(QWidget):
 
         self.setLayout(layout)
         
-        self._create_charts(data_frame)
+        self._create_charts(data)
 
         self._grade_frequence_canvas.figure.subplots_adjust(bottom=0.25, hspace=0.2)
         self._speed_grade_canvas.figure.subplots_adjust(bottom=0.25, hspace=0.2)
         self._distance_grade_canvas.figure.subplots_adjust(bottom=0.25, hspace=0.2)
         self._time_grade_canvas.figure.subplots_adjust(bottom=0.25, hspace=0.2)
 
-    def _process_data(self, data_frame: DataFrame) -> DataFrame: 
+    @staticmethod
+    @timed("chart.grade_detailed_data")
+    def prepare_data(data_frame: DataFrame) -> dict:
+        """
+        Prepare the data of the charts. It does not use any widget, so it can run in a worker thread.
+
+        :param data_frame: The data frame to be used in the dashboard.
+        :type data_frame: pandas.DataFrame
+        :return: The grade frequences, the totals of each grade interval and the interval binning of the
+                 points, which aggregates other intervals without deriving the grades again.
+        :rtype: dict
+        """
+        binning = IntervalBinning.from_data_frame(data_frame)
+        count_series = binning.frequences("grade")
+
+        return {"grade_counts": count_series[count_series > 10],
+                "grade_intervals": GradeDetailedDashboard._process_data(binning),
+                "interval_binning": binning}
+
+    @staticmethod
+    def _process_data(binning: IntervalBinning) -> DataFrame: 
         """
         Process object data to be used on charts.
         
-        :param data_frame: The data frame to be processed.
-        :type data_frame: pandas.DataFrame
+        :param binning: The interval binning of the points.
+        :type binning: IntervalBinning
         :return: The processed data frame.
         :rtype: pandas.DataFrame
         """
-        ## Process data
-        intervals = np.arange(-10, 10.00001, 2)
-        intervals = np.append(np.array([-np.inf]), intervals)
-        intervals = np.append(intervals, np.array([np.inf]))
-        cuts = cut(100*data_frame["Elevation Gain"]/data_frame["Distance"], intervals)
-        
-        new_data = data_frame[["Elevation Gain", "Distance", "Delta Time"]].groupby(cuts, observed = True).sum()
+        new_data = binning.totals("grade", GRADE_INTERVAL_EDGES).to_data_frame()
         new_data["Speed"] = np.where(new_data["Delta Time"] > 0, 3.6*new_data["Distance"]/new_data["Delta Time"], 0)
         new_data = new_data[new_data["Distance"] > 0]
 
         return new_data
 
-    def _create_charts(self, df: DataFrame) -> None:
+    @timed("chart.grade_detailed")
+    def _create_charts(self, data: dict) -> None:
         """
         Create the charts to be shown in the dashboard.
         
-        :param df: The data frame to be used in the charts.
-        :type df: pandas.DataFrame
+        :param data: The data of the charts (see prepare_data).
+        :type data: dict
         :return: None
         :rtype: None
         """
-        processed_df = self._process_data(df)
+        processed_df = data["grade_intervals"]
 
         chart = self._grade_frequence_canvas.figure.subplots()
-        count_series = round(100*df["Elevation Gain"]/df["Distance"], 1).value_counts()
-        count_series = count_series[count_series > 10]
+        count_series = data["grade_counts"]
         chart.bar(x = count_series.index, height = count_series.values, width=0.1)
         chart.set_xlabel("Grade")
         chart.set_ylabel("Frequence")
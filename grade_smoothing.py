@@ -0,0 +1,364 @@
+import numpy as np
+
+from instrumentation import timed
+from lazy_imports import lazy_import
+
+# Imported on the first use of the median or Savitzky-Golay smoothing (see lazy_imports)
+ndimage = lazy_import("scipy.ndimage")
+signal = lazy_import("scipy.signal")
+
+"""
+Grade smoothing.
+The grade between two consecutive points is mostly noise (elevation rounding, GPS jitter over a
+few meters), so the speed chart, its tooltip and the advanced dashboards use grades smoothed
+over a window of points, or of meters. The smoothing is vectorized and runs once per activity
+(see Activity.smoothed_grades), its result is shared by all of them.
+
+Methods:
+- mean: the elevation change over the distance of a trailing window, i.e. the window mean of the
+  elevation gains over the window mean of the distances (the default, over 20 points);
+- median: the median of the point grades of a centered window;
+- savgol: the Savitzky-Golay derivative of the elevation, resampled at regular distances.
+The largest grades left are elevation errors: they are removed with a threshold just below the
+OUTLIER_GRADES largest absolute grade, found with a partial selection instead of a sort.
+"""
+
+MEAN = "mean"
+MEDIAN = "median"
+SAVGOL = "savgol"
+
+SMOOTHING_METHODS = (MEAN, MEDIAN, SAVGOL)
+# The default window, in points
+DEFAULT_WINDOW_POINTS = 20
+# Number of the largest absolute grades removed as elevation errors, and margin of the threshold below them
+OUTLIER_GRADES = 15
+OUTLIER_MARGIN = 0.02
+# Largest Savitzky-Golay window, in samples: longer windows are sampled at larger distance steps
+SAVGOL_MAX_SAMPLES = 51
+
+
+class GradeSmoothing:
+    __slots__ = ("method", "points", "meters", "polyorder")
+
+    def __init__(self, method: str = MEAN, points: int | None = None, meters: float | None = None,
+                 polyorder: int = 2):
+        """
+        Class constructor.
+        The settings of a grade smoothing. Without window, the window is DEFAULT_WINDOW_POINTS points.
+
+        :param method: The smoothing method, one of SMOOTHING_METHODS.
+        :type method: str
+        :param points: The window size in points.
+        :type points: int | None
+        :param meters: The window size in meters, instead of points.
+        :type meters: float | None
+        :param polyorder: The polynomial order of the Savitzky-Golay filter.
+        :type polyorder: int
+        """
+        if method not in SMOOTHING_METHODS:
+            raise ValueError(f"Unknown smoothing method '{method}'. Expected one of {SMOOTHING_METHODS}")
+        if points is not None and meters is not None:
+            raise ValueError("The smoothing window is either a number of points or a distance, not both")
+
+        self.method = method
+        self.points = DEFAULT_WINDOW_POINTS if points is None and meters is None else points
+        self.meters = meters
+        self.polyorder = polyorder
+
+    def _key(self) -> tuple:
+        """
+        Get the values identifying the settings.
+
+        :return: The method, the windows and the polynomial order.
+        :rtype: tuple
+        """
+        return self.method, self.points, self.meters, self.polyorder
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, GradeSmoothing) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        window = f"points={self.points}" if self.points is not None else f"meters={self.meters}"
+        return f"GradeSmoothing({self.method!r}, {window})"
+
+    def history(self, total_distances: np.ndarray, start: int) -> int:
+        """
+        Get the first point needed to smooth the points from a given one, with the mean method.
+        The mean only depends on previous points, so the points appended to an activity can be
+        smoothed alone, with this history.
+
+        :param total_distances: The accumulated distance of each point.
+        :type total_distances: numpy.ndarray
+        :param start: The first point to be smoothed.
+        :type start: int
+        :return: The index of the first point needed.
+        :rtype: int
+        """
+        if self.points is not None:
+            return max(0, start - self.points + 1)
+
+        # The point before the window tells that the window is complete
+        return max(0, int(np.searchsorted(total_distances, total_distances[start] - self.meters, side="left")) - 1)
+
+
+class SmoothedGrades:
+    __slots__ = ("smoothing", "distance", "elevation_gain", "grade", "threshold", "kept")
+
+    def __init__(self, smoothing: GradeSmoothing, distance: np.ndarray, elevation_gain: np.ndarray,
+                 grade: np.ndarray, threshold: float | None):
+        """
+        Class constructor.
+
+        :param smoothing: The smoothing settings.
+        :type smoothing: GradeSmoothing
+        :param distance: The window mean distance of each point, in meters.
+        :type distance: numpy.ndarray
+        :param elevation_gain: The window mean elevation gain of each point, in meters.
+        :type elevation_gain: numpy.ndarray
+        :param grade: The smoothed grades, as a fraction. NaN where unknown (e.g. before the first full window).
+        :type grade: numpy.ndarray
+        :param threshold: The absolute grade from which the grades are elevation errors, None if there are too few points.
+        :type threshold: float | None
+        """
+        self.smoothing = smoothing
+        self.distance = distance
+        self.elevation_gain = elevation_gain
+        self.grade = grade
+        self.threshold = threshold
+        # The points with a known grade, below the threshold
+        self.kept = below_threshold(grade, threshold)
+        for values in (distance, elevation_gain, grade, self.kept):
+            values.flags.writeable = False
+
+
+def below_threshold(grades: np.ndarray, threshold: float | None) -> np.ndarray:
+    """
+    Get the grades kept by an outlier threshold.
+
+    :param grades: The smoothed grades.
+    :type grades: numpy.ndarray
+    :param threshold: The outlier threshold (see SmoothedGrades), None to keep every finite grade.
+    :type threshold: float | None
+    :return: Whether each grade is kept.
+    :rtype: numpy.ndarray
+    """
+    if threshold is None:
+        return np.isfinite(grades)
+
+    return np.abs(grades) < threshold
+
+def outlier_threshold(grades: np.ndarray, outliers: int = OUTLIER_GRADES, margin: float = OUTLIER_MARGIN) -> float | None:
+    """
+    Get the threshold removing the largest absolute grades.
+
+    :param grades: The smoothed grades, NaN where unknown.
+    :type grades: numpy.ndarray
+    :param outliers: The number of largest absolute grades removed.
+    :type outliers: int
+    :param margin: The margin of the threshold below the smallest of them.
+    :type margin: float
+    :return: The threshold, None if there are fewer known grades than outliers.
+    :rtype: float | None
+    """
+    known = np.abs(grades[~np.isnan(grades)])
+    if len(known) < outliers:
+        return None
+
+    # Only the outliers-th largest value is put in place, the others are not sorted
+    kth = len(known) - outliers
+
+    return float(np.partition(known, kth)[kth]) - margin
+
+def _window_sums(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Sum the values of trailing windows.
+
+    :param values: The values.
+    :type values: numpy.ndarray
+    :param starts: The first index of the window ending at each value.
+    :type starts: numpy.ndarray
+    :return: The sum of each window, NaN if the window has a NaN value (as the pandas rolling sum).
+    :rtype: numpy.ndarray
+    """
+    missing = np.isnan(values)
+    if not missing.any():
+        sums = np.concatenate(([0.0], np.cumsum(values)))
+        return sums[1:] - sums[starts]
+
+    # A NaN value only makes the windows that contain it NaN, not all the following ones
+    sums = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, values))))
+    missing_counts = np.concatenate(([0], np.cumsum(missing)))
+
+    return np.where(missing_counts[1:] > missing_counts[starts], np.nan, sums[1:] - sums[starts])
+
+def _point_spacing(distances: np.ndarray) -> float:
+    """
+    Get the usual distance between two points.
+
+    :param distances: The distance of each point from the previous one.
+    :type distances: numpy.ndarray
+    :return: The median of the positive distances, 1 meter without any.
+    :rtype: float
+    """
+    moving = distances[distances > 0]
+
+    return float(np.median(moving)) if len(moving) > 0 else 1.0
+
+def _odd_window(size: float, minimum: int) -> int:
+    """
+    Round a window size to an odd number of samples, as the centered filters need.
+
+    :param size: The window size, in samples.
+    :type size: float
+    :param minimum: The smallest window.
+    :type minimum: int
+    :return: The odd window size.
+    :rtype: int
+    """
+    size = max(minimum, int(round(size)))
+
+    return size if size % 2 == 1 else size + 1
+
+def _mean_grades(distances: np.ndarray, elevation_gains: np.ndarray,
+                 smoothing: GradeSmoothing) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Smooth the distances and gains with trailing window means.
+
+    :param distances: The distance of each point from the previous one.
+    :type distances: numpy.ndarray
+    :param elevation_gains: The elevation gain of each point from the previous one.
+    :type elevation_gains: numpy.ndarray
+    :param smoothing: The smoothing settings.
+    :type smoothing: GradeSmoothing
+    :return: The window mean distances and elevation gains, NaN before the first full window.
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    indices = np.arange(len(distances))
+    if smoothing.points is not None:
+        starts = indices - smoothing.points + 1
+        complete = starts >= 0
+    else:
+        total_distances = np.cumsum(distances)
+        starts = np.searchsorted(total_distances, total_distances - smoothing.meters, side="left")
+        complete = total_distances - total_distances[0] >= smoothing.meters
+    starts = np.maximum(starts, 0)
+    counts = indices - starts + 1
+
+    with np.errstate(invalid="ignore"):
+        mean_distances = np.where(complete, _window_sums(distances, starts)/counts, np.nan)
+        mean_gains = np.where(complete, _window_sums(elevation_gains, starts)/counts, np.nan)
+
+    return mean_distances, mean_gains
+
+def _centered_mean_distances(distances: np.ndarray, window: int) -> np.ndarray:
+    """
+    Smooth the distances with centered window means, for the centered methods.
+
+    :param distances: The distance of each point from the previous one.
+    :type distances: numpy.ndarray
+    :param window: The window size, in points.
+    :type window: int
+    :return: The window mean distances.
+    :rtype: numpy.ndarray
+    """
+    return ndimage.uniform_filter1d(distances, window, mode="nearest")
+
+def _median_grades(distances: np.ndarray, elevation_gains: np.ndarray,
+                   smoothing: GradeSmoothing) -> tuple[np.ndarray, int]:
+    """
+    Smooth the point grades with a centered median filter.
+
+    :param distances: The distance of each point from the previous one.
+    :type distances: numpy.ndarray
+    :param elevation_gains: The elevation gain of each point from the previous one.
+    :type elevation_gains: numpy.ndarray
+    :param smoothing: The smoothing settings.
+    :type smoothing: GradeSmoothing
+    :return: The smoothed grades and the window size, in points.
+    :rtype: tuple[numpy.ndarray, int]
+    """
+    window = smoothing.points if smoothing.points is not None else smoothing.meters/_point_spacing(distances)
+    window = _odd_window(window, 3)
+    # A point without distance (stopped) has no grade of its own, it is taken as flat
+    with np.errstate(divide="ignore", invalid="ignore"):
+        grades = np.where(distances > 0, elevation_gains/distances, 0.0)
+
+    return ndimage.median_filter(grades, size=window, mode="nearest"), window
+
+def _savgol_grades(distances: np.ndarray, elevation_gains: np.ndarray,
+                   smoothing: GradeSmoothing) -> tuple[np.ndarray, int]:
+    """
+    Get the Savitzky-Golay derivative of the elevation, resampled at regular distances.
+
+    :param distances: The distance of each point from the previous one.
+    :type distances: numpy.ndarray
+    :param elevation_gains: The elevation gain of each point from the previous one.
+    :type elevation_gains: numpy.ndarray
+    :param smoothing: The smoothing settings.
+    :type smoothing: GradeSmoothing
+    :return: The smoothed grades, NaN if the activity is shorter than the window, and the window size, in samples.
+    :rtype: tuple[numpy.ndarray, int]
+    """
+    spacing = _point_spacing(distances)
+    meters = smoothing.meters if smoothing.meters is not None else smoothing.points*spacing
+    spacing = max(spacing, meters/SAVGOL_MAX_SAMPLES)
+    window = _odd_window(meters/spacing, smoothing.polyorder + 2)
+
+    total_distances = np.cumsum(distances)
+    # The gains of the points without elevation are interpolated, the elevation profile goes on after them
+    missing = np.isnan(elevation_gains)
+    if missing.all():
+        return np.full(len(distances), np.nan), window
+    if missing.any():
+        elevation_gains = elevation_gains.copy()
+        elevation_gains[missing] = np.interp(total_distances[missing], total_distances[~missing],
+                                             elevation_gains[~missing])
+    elevations = np.cumsum(elevation_gains)
+    samples = np.arange(total_distances[0], total_distances[-1] + spacing, spacing)
+    if len(samples) < window:
+        return np.full(len(distances), np.nan), window
+
+    # The distances only grow, repeated values (stopped points) keep their first elevation
+    sample_elevations = np.interp(samples, total_distances, elevations)
+    slopes = signal.savgol_filter(sample_elevations, window, smoothing.polyorder, deriv=1, delta=spacing)
+
+    return np.interp(total_distances, samples, slopes), window
+
+@timed("metrics.grade_smoothing")
+def smooth_grades(distances: np.ndarray, elevation_gains: np.ndarray,
+                  smoothing: GradeSmoothing | None = None) -> SmoothedGrades:
+    """
+    Smooth the grades of a track.
+
+    :param distances: The distance of each point from the previous one, in meters.
+    :type distances: numpy.ndarray
+    :param elevation_gains: The elevation gain of each point from the previous one, in meters.
+    :type elevation_gains: numpy.ndarray
+    :param smoothing: The smoothing settings, the default mean if None.
+    :type smoothing: GradeSmoothing | None
+    :return: The smoothed grades and the outlier threshold.
+    :rtype: SmoothedGrades
+    """
+    smoothing = smoothing if smoothing is not None else GradeSmoothing()
+    distances = np.asarray(distances, dtype=np.float64)
+    elevation_gains = np.asarray(elevation_gains, dtype=np.float64)
+
+    if len(distances) == 0:
+        empty = np.zeros(0, dtype=np.float64)
+        return SmoothedGrades(smoothing, empty, empty.copy(), empty.copy(), None)
+
+    if smoothing.method == MEAN:
+        mean_distances, mean_gains = _mean_grades(distances, elevation_gains, smoothing)
+        # Like the pandas division, it is +-inf or NaN where the mean distance is 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            grades = mean_gains/mean_distances
+    else:
+        smooth = _median_grades if smoothing.method == MEDIAN else _savgol_grades
+        grades, window = smooth(distances, elevation_gains, smoothing)
+        mean_distances = _centered_mean_distances(distances, window)
+        mean_gains = grades*mean_distances
+
+    return SmoothedGrades(smoothing, mean_distances, mean_gains, grades, outlier_threshold(grades))
@@ -0,0 +1,261 @@
+import cProfile
+import fnmatch
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+"""
+Lightweight timing instrumentation.
+The hot paths (gpx parsing, metric derivation, chart plots, table formatting, map rendering
+and pdf creation) run inside named spans. Every finished span is kept in a small in-memory
+buffer, shown by the diagnostics panel (see diagnostics_panel), and logged as a JSON line.
+
+Environment variables:
+- GPX_VIEWER_TIMING_LOG: file the spans are appended to, as JSON lines ("-" for the standard error).
+- GPX_VIEWER_PROFILE: comma separated span names (shell patterns, e.g. "action.*") to be profiled.
+  Each profiled span writes a cProfile file (readable with pstats or snakeviz). cProfile only
+  sees the thread the span runs in, the spans of the worker threads must be profiled by name.
+- GPX_VIEWER_PROFILE_DIR: directory of the profile files (default: the working directory).
+"""
+
+RECENT_SPANS = 2000
+
+_logger = logging.getLogger("gpx_viewer.timing")
+_lock = threading.Lock()
+_recent_spans = deque(maxlen=RECENT_SPANS)
+_listeners = []
+_local = threading.local()
+_configured = False
+
+
+class SpanRecord:
+    __slots__ = ("name", "start", "duration", "thread", "parent", "depth", "attributes")
+
+    def __init__(self, name: str, start: float, duration: float, thread: str, parent: str | None,
+                 depth: int, attributes: dict):
+        """
+        Class constructor.
+
+        :param name: The span name.
+        :type name: str
+        :param start: The span start, as a UNIX timestamp.
+        :type start: float
+        :param duration: The span duration in seconds.
+        :type duration: float
+        :param thread: The name of the thread the span ran in.
+        :type thread: str
+        :param parent: The name of the enclosing span of the same thread, None for a top level span.
+        :type parent: str | None
+        :param depth: The number of enclosing spans.
+        :type depth: int
+        :param attributes: Additional span details (file name, number of points...).
+        :type attributes: dict
+        """
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.thread = thread
+        self.parent = parent
+        self.depth = depth
+        self.attributes = attributes
+
+    def to_dict(self) -> dict:
+        """
+        Get the span as a JSON serializable dictionary.
+
+        :return: The span fields, with the duration in milliseconds.
+        :rtype: dict
+        """
+        return {"span": self.name,
+                "start": round(self.start, 6),
+                "duration_ms": round(1000*self.duration, 3),
+                "thread": self.thread,
+                "parent": self.parent,
+                "depth": self.depth,
+                **self.attributes}
+
+
+def _configure() -> None:
+    """
+    Set up the timing log from the environment, on the first finished span.
+
+    :return: None
+    :rtype: None
+    """
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        _configured = True
+
+        log_file = os.environ.get("GPX_VIEWER_TIMING_LOG")
+        if not log_file:
+            return
+        handler = logging.StreamHandler() if log_file == "-" else logging.FileHandler(log_file, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+
+def _profile_patterns() -> list[str]:
+    """
+    Get the names of the spans to be profiled.
+
+    :return: The span name patterns set in GPX_VIEWER_PROFILE.
+    :rtype: list[str]
+    """
+    return [pattern.strip() for pattern in os.environ.get("GPX_VIEWER_PROFILE", "").split(",") if pattern.strip()]
+
+def profiling_enabled(name: str) -> bool:
+    """
+    Check whether a span is profiled.
+
+    :param name: The span name.
+    :type name: str
+    :return: True if the span name matches GPX_VIEWER_PROFILE.
+    :rtype: bool
+    """
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in _profile_patterns())
+
+def _profile_file_name(name: str) -> str:
+    """
+    Get a new profile file path for a span.
+
+    :param name: The span name.
+    :type name: str
+    :return: The profile file path.
+    :rtype: str
+    """
+    directory = os.environ.get("GPX_VIEWER_PROFILE_DIR", ".")
+    os.makedirs(directory, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+
+    return os.path.join(directory, f"{name}-{timestamp}-{threading.get_ident()}.prof")
+
+def add_span_listener(listener: Callable[[SpanRecord], None]) -> None:
+    """
+    Register a function called with every finished span. It is called in the thread that ran the span.
+
+    :param listener: The function to be called.
+    :type listener: Callable[[SpanRecord], None]
+    :return: None
+    :rtype: None
+    """
+    with _lock:
+        _listeners.append(listener)
+
+def remove_span_listener(listener: Callable[[SpanRecord], None]) -> None:
+    """
+    Unregister a span listener.
+
+    :param listener: The function registered with add_span_listener.
+    :type listener: Callable[[SpanRecord], None]
+    :return: None
+    :rtype: None
+    """
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+def recent_spans() -> list[SpanRecord]:
+    """
+    Get the last finished spans, oldest first.
+
+    :return: Up to RECENT_SPANS spans.
+    :rtype: list[SpanRecord]
+    """
+    with _lock:
+        return list(_recent_spans)
+
+def clear_spans() -> None:
+    """
+    Forget the finished spans.
+
+    :return: None
+    :rtype: None
+    """
+    with _lock:
+        _recent_spans.clear()
+
+def _record(record: SpanRecord) -> None:
+    """
+    Store, log and notify a finished span.
+
+    :param record: The finished span.
+    :type record: SpanRecord
+    :return: None
+    :rtype: None
+    """
+    _configure()
+    with _lock:
+        _recent_spans.append(record)
+        listeners = list(_listeners)
+
+    if _logger.isEnabledFor(logging.INFO):
+        _logger.info(json.dumps(record.to_dict(), default=str))
+    for listener in listeners:
+        listener(record)
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[dict]:
+    """
+    Time the enclosed block as a named span.
+
+    :param name: The span name, dot separated by area (e.g. "chart.speed").
+    :type name: str
+    :param attributes: Span details, added to the record.
+    :return: The attributes dictionary, details known only inside the block can be added to it.
+    :rtype: Iterator[dict]
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+
+    profiler = None
+    if not getattr(_local, "profiling", False) and profiling_enabled(name):
+        # A single profiler can be active in a thread, the nested spans are part of its profile
+        profiler = cProfile.Profile()
+        _local.profiling = True
+        profiler.enable()
+
+    stack.append(name)
+    start = time.time()
+    counter = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        duration = time.perf_counter() - counter
+        stack.pop()
+        if profiler is not None:
+            profiler.disable()
+            _local.profiling = False
+            attributes["profile"] = _profile_file_name(name)
+            profiler.dump_stats(attributes["profile"])
+
+        _record(SpanRecord(name, start, duration, threading.current_thread().name, parent, len(stack), attributes))
+
+def timed(name: str) -> Callable:
+    """
+    Decorator running every call of the decorated function as a named span.
+
+    :param name: The span name.
+    :type name: str
+    :return: The decorator.
+    :rtype: Callable
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
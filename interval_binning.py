@@ -0,0 +1,216 @@
+import numpy as np
+from pandas import DataFrame, IntervalIndex, Series
+
+from instrumentation import timed
+
+"""
+Totals of the points of an activity in intervals of a channel, e.g. the distance and the time
+ridden in each grade or speed interval of the advanced dashboards.
+The interval of every point is found once with np.digitize, and the totals of all the intervals
+are summed with np.bincount, in O(n) for any interval edges. An IntervalBinning keeps the
+channels of the points, so new edges (e.g. edited by the user) are aggregated without deriving
+the channels again, and it caches the totals of each (channel, edges) and the frequences of each
+(channel, rounding), so they are computed once per activity.
+As pandas.cut, the intervals are closed on the right: (left, right]. The points with an unknown
+(NaN) value, or out of the edges, are in no interval, and the unknown summed values are ignored.
+"""
+
+# The data frame column of each channel (see metrics.build_data_frame)
+DATA_FRAME_COLUMNS = {"grade": "Grade", "speed": "Speed", "distance": "Distance",
+                      "delta_time": "Delta Time", "elevation_gain": "Elevation Gain"}
+# The channels summed in each interval
+SUMMED_CHANNELS = ("distance", "delta_time", "elevation_gain")
+# The rounded values are counted in an array covering their range (np.bincount) while the range
+# is smaller than this number of times the number of points, otherwise they are sorted (np.unique)
+MAX_COUNTED_RANGE_RATIO = 4
+
+
+class IntervalTotals:
+    __slots__ = ("channel", "edges", "counts", "_sums")
+
+    def __init__(self, channel: str, edges: np.ndarray, counts: np.ndarray, sums: dict[str, np.ndarray]):
+        """
+        Class constructor.
+        The totals of the points in each interval of a channel. The arrays are read only, as they are shared.
+
+        :param channel: The channel the points are binned on.
+        :type channel: str
+        :param edges: The interval edges, increasing.
+        :type edges: numpy.ndarray
+        :param counts: The number of points in each interval.
+        :type counts: numpy.ndarray
+        :param sums: The sum of each summed channel in each interval, by channel name.
+        :type sums: dict[str, numpy.ndarray]
+        """
+        self.channel = channel
+        self.edges = edges
+        self.counts = counts
+        self._sums = sums
+
+        for values in [edges, counts, *sums.values()]:
+            values.flags.writeable = False
+
+    def __len__(self) -> int:
+        """
+        Get the number of intervals.
+
+        :return: The number of intervals, with or without points.
+        :rtype: int
+        """
+        return len(self.counts)
+
+    def sums(self, channel: str) -> np.ndarray:
+        """
+        Get the sum of a channel in each interval.
+
+        :param channel: The summed channel name, one of SUMMED_CHANNELS.
+        :type channel: str
+        :return: The read only sums, 0 in the intervals without points.
+        :rtype: numpy.ndarray
+        """
+        if channel not in self._sums:
+            raise ValueError(f"Unknown summed channel '{channel}'. Expected one of {tuple(self._sums)}")
+
+        return self._sums[channel]
+
+    def to_data_frame(self) -> DataFrame:
+        """
+        Get the totals of the intervals with points, as pandas.cut and groupby(observed=True).sum() give them.
+
+        :return: The sums, in the data frame columns of the channels, indexed by interval.
+        :rtype: pandas.DataFrame
+        """
+        observed = self.counts > 0
+        intervals = IntervalIndex.from_breaks(self.edges, closed="right")[observed]
+
+        return DataFrame({DATA_FRAME_COLUMNS[channel]: sums[observed] for channel, sums in self._sums.items()},
+                         index=intervals)
+
+
+class IntervalBinning:
+    __slots__ = ("_channels", "_weights", "_totals", "_frequences")
+
+    def __init__(self, channels: dict[str, np.ndarray]):
+        """
+        Class constructor.
+
+        :param channels: The channel values of the points, by channel name: the channels binned on and the
+                         summed ones (see SUMMED_CHANNELS) available.
+        :type channels: dict[str, numpy.ndarray]
+        """
+        self._channels = {name: np.asarray(values, dtype=np.float64) for name, values in channels.items()}
+        # The summed channels, with their unknown values as 0
+        self._weights = {name: np.where(np.isnan(self._channels[name]), 0, self._channels[name])
+                         for name in SUMMED_CHANNELS if name in self._channels}
+        # The totals by channel and edges, and the frequences by channel and decimals
+        self._totals = {}
+        self._frequences = {}
+
+    @classmethod
+    def from_data_frame(cls, data_frame: DataFrame) -> "IntervalBinning":
+        """
+        Get the binning of the points of a data frame. The grade and the speed are derived if they are not columns.
+
+        :param data_frame: The data frame, with at least the distance, delta time and elevation gain columns.
+        :type data_frame: pandas.DataFrame
+        :return: The binning.
+        :rtype: IntervalBinning
+        """
+        channels = {channel: data_frame[column].to_numpy(dtype=np.float64)
+                    for channel, column in DATA_FRAME_COLUMNS.items() if column in data_frame.columns}
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if "grade" not in channels:
+                channels["grade"] = 100*channels["elevation_gain"]/channels["distance"]
+            if "speed" not in channels:
+                channels["speed"] = np.where(channels["delta_time"] > 0, 3.6*channels["distance"]/channels["delta_time"], 0)
+
+        return cls(channels)
+
+    def _values(self, channel: str) -> np.ndarray:
+        """
+        Get the values of a channel.
+
+        :param channel: The channel name.
+        :type channel: str
+        :return: The values of the points.
+        :rtype: numpy.ndarray
+        """
+        if channel not in self._channels:
+            raise ValueError(f"Unknown channel '{channel}'. Expected one of {tuple(self._channels)}")
+
+        return self._channels[channel]
+
+    def totals(self, channel: str, edges: np.ndarray) -> IntervalTotals:
+        """
+        Get the number of points and the sum of the summed channels in each interval of a channel, cached.
+
+        :param channel: The channel the points are binned on.
+        :type channel: str
+        :param edges: The interval edges, increasing. The first and the last ones can be infinite.
+        :type edges: numpy.ndarray
+        :return: The totals.
+        :rtype: IntervalTotals
+        """
+        edges = np.asarray(edges, dtype=np.float64)
+        key = (channel, edges.tobytes())
+        if key not in self._totals:
+            self._totals[key] = self._aggregate(channel, edges)
+
+        return self._totals[key]
+
+    @timed("metrics.interval_totals")
+    def _aggregate(self, channel: str, edges: np.ndarray) -> IntervalTotals:
+        """
+        Sum the points in each interval of a channel.
+
+        :param channel: The channel the points are binned on.
+        :type channel: str
+        :param edges: The interval edges, increasing.
+        :type edges: numpy.ndarray
+        :return: The totals.
+        :rtype: IntervalTotals
+        """
+        if len(edges) < 2 or np.any(np.diff(edges) <= 0):
+            raise ValueError(f"The interval edges must be at least 2 increasing values, got {edges}")
+
+        # The interval of each point, from 1: the values before the first edge are in the bin 0, those
+        # after the last one (and NaN) in the bin len(edges), both dropped from the totals
+        bins = np.digitize(self._values(channel), edges, right=True)
+        number_of_bins = len(edges) + 1
+
+        counts = np.bincount(bins, minlength=number_of_bins)[1:-1]
+        sums = {name: np.bincount(bins, weights=weights, minlength=number_of_bins)[1:-1]
+                for name, weights in self._weights.items()}
+
+        return IntervalTotals(channel, edges.copy(), counts, sums)
+
+    @timed("metrics.rounded_frequences")
+    def frequences(self, channel: str, decimals: int = 1) -> Series:
+        """
+        Get the number of points of each rounded value of a channel, as round(values, decimals).value_counts(), cached.
+
+        :param channel: The channel name.
+        :type channel: str
+        :param decimals: The number of decimals the values are rounded to.
+        :type decimals: int
+        :return: The number of points, indexed by the rounded values with points, increasing. The
+                 non-finite values are not counted.
+        :rtype: pandas.Series
+        """
+        key = (channel, decimals)
+        if key not in self._frequences:
+            values = self._values(channel)
+            scale = 10.0**decimals
+            keys = np.rint(values[np.isfinite(values)]*scale).astype(np.int64)
+
+            if len(keys) > 0 and keys.max() - keys.min() < MAX_COUNTED_RANGE_RATIO*len(keys):
+                counts = np.bincount(keys - keys.min())
+                counted = np.flatnonzero(counts)
+                rounded_keys, counts = counted + keys.min(), counts[counted]
+            else:
+                rounded_keys, counts = np.unique(keys, return_counts=True)
+
+            self._frequences[key] = Series(counts, index=rounded_keys/scale, name="count")
+
+        return self._frequences[key]
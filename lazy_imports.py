@@ -0,0 +1,78 @@
+import importlib
+import threading
+from types import ModuleType
+
+from instrumentation import span
+
+"""
+Deferred imports of the heavy optional parts of the viewer.
+QtWebEngine and folium (maps), scipy (advanced dashboard and grade smoothing filters) and
+xhtml2pdf (pdf export) take most of the application import time, yet they are only needed when
+the user opens a map, the advanced dashboard, smooths the grades with a filter or exports a pdf.
+The modules using them get a LazyModule instead, which imports the real module the first time
+one of its attributes is used.
+
+QtWebEngine must be imported before the QApplication is created, unless the
+AA_ShareOpenGLContexts attribute is set: main sets it, so the map can be loaded later.
+"""
+
+# The modules imported on first use. PyInstaller does not see them, main.spec lists them as hidden imports.
+DEFERRED_MODULES = ["PyQt6.QtWebEngineWidgets", "folium", "folium.features", "scipy.ndimage", "scipy.signal",
+                    "xhtml2pdf.pisa"]
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        """
+        Class constructor.
+        Stand-in for a module, imported on the first attribute access.
+
+        :param name: The full module name.
+        :type name: str
+        """
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        Check whether the module was imported.
+
+        :return: True if the module was imported through this object.
+        :rtype: bool
+        """
+        return self._module is not None
+
+    def load(self) -> ModuleType:
+        """
+        Import the module, if not done yet.
+
+        :return: The module.
+        :rtype: ModuleType
+        """
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    with span("import.lazy", module=self._name):
+                        self._module = importlib.import_module(self._name)
+
+        return self._module
+
+    def __getattr__(self, name: str):
+        return getattr(self.load(), name)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self._name}' ({'loaded' if self.is_loaded else 'not loaded'})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Get a module which is only imported when it is used.
+
+    :param name: The full module name, e.g. "scipy.stats".
+    :type name: str
+    :return: The lazy module.
+    :rtype: LazyModule
+    """
+    return LazyModule(name)
@@ -0,0 +1,213 @@
+import numpy as np
+
+from activity import Activity
+from distance_engine import calculate_step_distances, DEFAULT_DISTANCE_MODEL
+from gpx_reader import GpxColumns, GrowableColumn, IncrementalGpxReader
+from metrics import NANOSECONDS_PER_SECOND, ROLLING_MEAN_WINDOW, rolling_mean, speed
+from track import Track
+
+"""
+Activity of a gpx file that is still being written (e.g. by a recorder during a long event).
+Each update parses only the appended track points and extends the track arrays and the
+cumulative channels (totals, average speed, rolling means...) in O(new points). The aggregation
+pyramid of the new activity is extended from the one of the previous update (see aggregation_pyramid).
+"""
+
+# Channels extended on each update, with their data type. The others are computed lazily by the activity.
+_BASE_COLUMNS = {
+    "times": np.int64,
+    "latitudes": np.float64,
+    "longitudes": np.float64,
+    "elevations": np.float32,
+    "distances": np.float32,
+}
+_CHANNEL_COLUMNS = {
+    "elevation": np.float64,
+    "distance": np.float64,
+    "delta_time": np.float64,
+    "total_time_ns": np.int64,
+    "total_time": np.float64,
+    "total_distance": np.float64,
+    "elevation_gain": np.float64,
+    "grade": np.float64,
+    "speed": np.float64,
+    "speed_rollmean": np.float64,
+    "avg_speed": np.float64,
+    "km": np.float64,
+}
+
+
+class LiveActivity:
+    def __init__(self, file_name: str, distance_model: str = DEFAULT_DISTANCE_MODEL):
+        """
+        Class constructor. Reads the points already written to the file.
+
+        :param file_name: The path of the gpx file being written.
+        :type file_name: str
+        :param distance_model: The model used to calculate the distance between points (see distance_engine).
+        :type distance_model: str
+        """
+        self._file_name = file_name
+        self._distance_model = distance_model
+        self._reader = IncrementalGpxReader(file_name)
+        self._base = {name: GrowableColumn(dtype) for name, dtype in _BASE_COLUMNS.items()}
+        self._channels = {name: GrowableColumn(dtype) for name, dtype in _CHANNEL_COLUMNS.items()}
+        self._segment_starts = GrowableColumn(np.int64, 16)
+        self._segment_start_time = 0
+        # The stored elevations are float32, the distances are calculated with the read values
+        self._last_elevation = np.empty(0, dtype=np.float64)
+        self._activity = None
+        # The aggregation pyramid of the previous points, None until one is built
+        self._pyramid = None
+
+        self.update()
+
+    @property
+    def file_name(self) -> str:
+        """
+        Get the path of the followed gpx file.
+
+        :return: The gpx file path.
+        :rtype: str
+        """
+        return self._file_name
+
+    def __len__(self) -> int:
+        """
+        Get the number of points read so far.
+
+        :return: The number of points.
+        :rtype: int
+        """
+        return len(self._base["times"])
+
+    @property
+    def activity(self) -> Activity:
+        """
+        Get the activity with the points read so far.
+        Its arrays are views on the live columns, so getting it does not copy any data.
+
+        :return: The activity.
+        :rtype: Activity
+        """
+        if self._activity is None:
+            track = Track(*(self._base[name].to_array() for name in _BASE_COLUMNS), self._segment_starts.to_array())
+            channels = {}
+            for name, column in self._channels.items():
+                channels[name] = column.to_array()
+                channels[name].flags.writeable = False
+            self._activity = Activity(track, channels=channels, previous_pyramid=self._pyramid)
+
+        return self._activity
+
+    def update(self) -> int:
+        """
+        Read the points appended to the file since the last update and extend the activity.
+
+        :return: The number of new points.
+        :rtype: int
+        :raises UnsupportedGpxError: If the file was truncated or rewritten, in which case it must be reopened.
+        """
+        columns = self._reader.read_new_points()
+        if len(columns) > 0:
+            self._append(columns)
+            if self._activity is not None:
+                self._pyramid = self._activity.latest_pyramid
+            self._activity = None
+
+        return len(columns)
+
+    def _previous(self, columns: dict[str, GrowableColumn], name: str, count: int = 1) -> np.ndarray:
+        """
+        Get the last values of a live column.
+
+        :param columns: The live columns.
+        :type columns: dict[str, GrowableColumn]
+        :param name: The column name.
+        :type name: str
+        :param count: The maximum number of values.
+        :type count: int
+        :return: The last values (fewer if the column is shorter).
+        :rtype: numpy.ndarray
+        """
+        values = columns[name].to_array()
+
+        return values[max(0, len(values) - count):]
+
+    def _append(self, columns: GpxColumns) -> None:
+        """
+        Append new points, extending the base columns and the cumulative channels.
+
+        :param columns: The new track points.
+        :type columns: GpxColumns
+        :return: None
+        :rtype: None
+        """
+        count = len(self)
+        has_previous = 1 if count > 0 else 0
+        new_segment_starts = columns.segment_starts
+        # The first new point is linked to the previous one unless it starts a new segment
+        linked = count > 0 and (len(new_segment_starts) == 0 or new_segment_starts[0] != 0)
+        offset = 1 if linked else 0
+
+        previous = lambda name, values: np.concatenate([self._previous(self._base, name, offset), values])
+        step_distances = calculate_step_distances(previous("latitudes", columns.latitudes),
+                                                  previous("longitudes", columns.longitudes),
+                                                  np.concatenate([self._last_elevation[:offset], columns.elevations]),
+                                                  new_segment_starts + offset,
+                                                  self._distance_model)[offset:]
+        step_distances = np.round(step_distances, 5).astype(np.float32)
+
+        # Same values as the metrics channels, computed only for the new points
+        with_previous = lambda columns_, name, values: np.concatenate([self._previous(columns_, name, has_previous), values])
+
+        elevations = np.round(columns.elevations.astype(np.float32).astype(np.float64), 3)
+        distances = np.round(step_distances.astype(np.float64), 5)
+
+        # The first point of the activity has delta time and elevation gain 0
+        delta_times = np.diff(with_previous(self._base, "times", columns.times),
+                              prepend=columns.times[0])[has_previous:]/NANOSECONDS_PER_SECOND
+
+        segment_ids = np.searchsorted(new_segment_starts, np.arange(len(columns)), side="right") - 1
+        segment_start_times = np.full(len(columns), self._segment_start_time, dtype=np.int64)
+        started = segment_ids >= 0
+        segment_start_times[started] = columns.times[new_segment_starts[segment_ids[started]]]
+        if len(new_segment_starts) > 0:
+            self._segment_start_time = columns.times[new_segment_starts[-1]]
+        total_time_nanoseconds = columns.times - segment_start_times
+        total_times = total_time_nanoseconds/NANOSECONDS_PER_SECOND
+
+        total_distances = with_previous(self._channels, "total_distance", distances).cumsum()[has_previous:]
+
+        elevation_gains = np.diff(with_previous(self._channels, "elevation", elevations), prepend=elevations[0])[has_previous:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            grades = 100*elevation_gains/distances
+
+        speeds = speed(delta_times, distances)
+        previous_speeds = self._previous(self._channels, "speed", ROLLING_MEAN_WINDOW - 1)
+        speed_rollmeans = rolling_mean(np.concatenate([previous_speeds, speeds]))[len(previous_speeds):]
+
+        self._base["times"].extend(columns.times)
+        self._base["latitudes"].extend(columns.latitudes)
+        self._base["longitudes"].extend(columns.longitudes)
+        self._base["elevations"].extend(columns.elevations)
+        self._base["distances"].extend(step_distances)
+        self._segment_starts.extend(new_segment_starts + count)
+        self._last_elevation = columns.elevations[-1:].astype(np.float64)
+
+        new_values = {
+            "elevation": elevations,
+            "distance": distances,
+            "delta_time": delta_times,
+            "total_time_ns": total_time_nanoseconds,
+            "total_time": total_times,
+            "total_distance": total_distances,
+            "elevation_gain": elevation_gains,
+            "grade": grades,
+            "speed": speeds,
+            "speed_rollmean": speed_rollmeans,
+            "avg_speed": speed(total_times, total_distances),
+            "km": (total_distances/100).astype(int)/10,
+        }
+        for name, values in new_values.items():
+            self._channels[name].extend(values)
@@ -1,5 +1,6 @@
 import sys
 from application_window import ApplicationWindow
+from PyQt6.QtCore import Qt, QCoreApplication
 from PyQt6.QtWidgets import QApplication
 
 if __name__ == "__main__":
@@ -8,6 +9,8 @@ if __name__ == "__main__":
     qapp = QApplication.instance()
     
     if not qapp:
+        # QtWebEngine is imported on the first map (see lazy_imports), after the application is created
+        QCoreApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts)
         qapp = QApplication(sys.argv)
 
     app = ApplicationWindow()
@@ -3,7 +3,9 @@ from PyInstaller.utils.hooks import collect_all
 
 datas = []
 binaries = []
-hiddenimports = []
+# Imported on first use (see lazy_imports.DEFERRED_MODULES), PyInstaller does not find them
+hiddenimports = ['PyQt6.QtWebEngineWidgets', 'folium', 'folium.features', 'scipy.ndimage', 'scipy.signal',
+                 'xhtml2pdf.pisa']
 tmp_ret = collect_all('reportlab.graphics.barcode')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 
@@ -1,7 +1,11 @@
-import folium
 import io
-import PyQt6.QtWebEngineWidgets as qtweb
-from folium.features import DivIcon
+
+from instrumentation import span, timed
+from lazy_imports import lazy_import
+
+# Imported on the first map (see lazy_imports)
+folium = lazy_import("folium")
+qtweb = lazy_import("PyQt6.QtWebEngineWidgets")
 
 class MapViewer:
 
@@ -23,12 +27,13 @@ class MapViewer:
         :return: None
         :rtype: None
         """
-        map = folium.Map(location=[lat, long], zoom_start=13)
-        
-        folium.Marker(location=[lat, long]).add_to(map)
+        with span("map.marker"):
+            map = folium.Map(location=[lat, long], zoom_start=13)
+            
+            folium.Marker(location=[lat, long]).add_to(map)
 
-        data = io.BytesIO()
-        map.save(data, close_file=False)
+            data = io.BytesIO()
+            map.save(data, close_file=False)
 
         self._web_viewer = qtweb.QWebEngineView()
         self._web_viewer.setHtml(data.getvalue().decode())
@@ -46,6 +51,23 @@ class MapViewer:
         :return: None
         :rtype: None
         """
+        self._web_viewer = qtweb.QWebEngineView()
+        self._web_viewer.setHtml(self.poly_line_html(points, zoom))
+        self._web_viewer.resize(800, 640)
+        self._web_viewer.show()
+
+    @timed("map.poly_line")
+    def poly_line_html(self, points: list[tuple[float, float]], zoom: int = 15) -> str:
+        """
+        Generate the html of a map with a poly line with the given points.
+    
+        :param points: The points of the poly line.
+        :type points: list[tuple[float, float]]
+        :param zoom: The zoom level of the map.
+        :type zoom: int
+        :return: The map html page.
+        :rtype: str
+        """
         half = int(len(points)/2)
         self._map = folium.Map(
                 location=points[half], zoom_start= zoom
@@ -54,8 +76,8 @@ class MapViewer:
         folium.PolyLine(points, color='red', weight=4.5, opacity=.5).add_to(self._map)
 
         div = lambda text : f'<div style="font-size: 14pt; background-color: white; border-radius:4px; ">{text}</div>'
-        icon_start = DivIcon(icon_size=(40,40), icon_anchor=(0,0), html=div('Start'))
-        icon_end = DivIcon(icon_size=(36,36), icon_anchor=(0,0), html=div('End'))
+        icon_start = folium.DivIcon(icon_size=(40,40), icon_anchor=(0,0), html=div('Start'))
+        icon_end = folium.DivIcon(icon_size=(36,36), icon_anchor=(0,0), html=div('End'))
         folium.Marker(location=points[0], icon=icon_start).add_to(self._map)
         folium.Marker(location=points[-1], icon = icon_end).add_to(self._map)
         self._map.fit_bounds([min(points), max(points)])
@@ -63,7 +85,4 @@ class MapViewer:
         data = io.BytesIO()
         self._map.save(data, close_file=False)
 
-        self._web_viewer = qtweb.QWebEngineView()
-        self._web_viewer.setHtml(data.getvalue().decode())
-        self._web_viewer.resize(800, 640)
-        self._web_viewer.show()
+        return data.getvalue().decode()
@@ -0,0 +1,216 @@
+import numpy as np
+from typing import Callable
+from pandas import DataFrame, DatetimeIndex, Series
+
+from instrumentation import span, timed
+
+"""
+Derived metrics pipeline.
+Every derived channel (delta time, gain, grade, speed, rolling means, KM buckets...) is declared
+once, with the channels it depends on. compute_channel resolves the dependencies recursively
+and memoizes each computed channel in the given dictionary, so an activity (see activity.py)
+computes each channel lazily, only once.
+
+Base channels are read straight from the track arrays: time (UTC epoch nanoseconds), latitude,
+longitude, elevation, distance (from the previous point) and segment_starts.
+"""
+
+NANOSECONDS_PER_SECOND = 1_000_000_000
+ROLLING_MEAN_WINDOW = 20
+
+
+class MetricChannel:
+    __slots__ = ("name", "dependencies", "compute")
+
+    def __init__(self, name: str, dependencies: tuple[str, ...], compute: Callable[..., np.ndarray]):
+        """
+        Class constructor.
+
+        :param name: The channel name.
+        :type name: str
+        :param dependencies: The names of the channels the channel is computed from.
+        :type dependencies: tuple[str, ...]
+        :param compute: The function computing the channel, receiving the dependencies values in order.
+        :type compute: Callable[..., numpy.ndarray]
+        """
+        self.name = name
+        self.dependencies = dependencies
+        self.compute = compute
+
+
+CHANNELS: dict[str, MetricChannel] = {}
+
+_BASE_CHANNELS = {
+    "time": lambda track: track.times,
+    "latitude": lambda track: track.latitudes,
+    "longitude": lambda track: track.longitudes,
+    # Rounding drops the float32 representation noise (e.g. 458.399994 instead of 458.4)
+    "elevation": lambda track: np.round(track.elevations.astype(np.float64), 3),
+    "distance": lambda track: np.round(track.distances.astype(np.float64), 5),
+    "segment_starts": lambda track: track.segment_starts,
+}
+
+
+def metric_channel(name: str, *dependencies: str) -> Callable:
+    """
+    Decorator declaring a derived channel.
+
+    :param name: The channel name.
+    :type name: str
+    :param dependencies: The names of the channels the decorated function receives.
+    :type dependencies: str
+    :return: The decorator.
+    :rtype: Callable
+    """
+    def register(compute: Callable[..., np.ndarray]) -> Callable[..., np.ndarray]:
+        CHANNELS[name] = MetricChannel(name, dependencies, compute)
+        return compute
+
+    return register
+
+def speed(times: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    """
+    Calculate the speed in Km/h, 0 where the time is not positive.
+
+    :param times: The times in seconds.
+    :type times: numpy.ndarray
+    :param distances: The distances in meters.
+    :type distances: numpy.ndarray
+    :return: The speeds.
+    :rtype: numpy.ndarray
+    """
+    positive = times > 0
+
+    return np.where(positive, 3.6*distances/np.where(positive, times, 1), 0)
+
+def rolling_mean(values: np.ndarray, window: int = ROLLING_MEAN_WINDOW) -> np.ndarray:
+    """
+    Calculate the trailing rolling mean. The first window - 1 values are NaN, as in pandas.
+
+    :param values: The values.
+    :type values: numpy.ndarray
+    :param window: The window size.
+    :type window: int
+    :return: The rolling means.
+    :rtype: numpy.ndarray
+    """
+    return Series(values).rolling(window).mean().to_numpy()
+
+@metric_channel("delta_time", "time")
+def _delta_time(times: np.ndarray) -> np.ndarray:
+    delta_times = np.zeros(len(times), dtype=np.float64)
+    delta_times[1:] = np.diff(times)/NANOSECONDS_PER_SECOND
+    return delta_times
+
+@metric_channel("total_time_ns", "time", "segment_starts")
+def _total_time_nanoseconds(times: np.ndarray, segment_starts: np.ndarray) -> np.ndarray:
+    # The accumulated time restarts on each segment
+    segment_ids = np.searchsorted(segment_starts, np.arange(len(times)), side="right") - 1
+    return times - times[segment_starts[segment_ids]]
+
+@metric_channel("total_time", "total_time_ns")
+def _total_time(total_time_nanoseconds: np.ndarray) -> np.ndarray:
+    return total_time_nanoseconds/NANOSECONDS_PER_SECOND
+
+@metric_channel("total_distance", "distance")
+def _total_distance(distances: np.ndarray) -> np.ndarray:
+    return distances.cumsum()
+
+@metric_channel("elevation_gain", "elevation")
+def _elevation_gain(elevations: np.ndarray) -> np.ndarray:
+    elevation_gains = np.zeros(len(elevations), dtype=np.float64)
+    elevation_gains[1:] = np.diff(elevations)
+    return elevation_gains
+
+@metric_channel("grade", "elevation_gain", "distance")
+def _grade(elevation_gains: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    # In percent. Like the pandas division, it is +-inf or NaN where the distance is 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100*elevation_gains/distances
+
+@metric_channel("speed", "delta_time", "distance")
+def _speed(delta_times: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    return speed(delta_times, distances)
+
+@metric_channel("speed_rollmean", "speed")
+def _speed_rollmean(speeds: np.ndarray) -> np.ndarray:
+    return rolling_mean(speeds)
+
+@metric_channel("avg_speed", "total_time_ns", "total_distance")
+def _avg_speed(total_time_nanoseconds: np.ndarray, total_distances: np.ndarray) -> np.ndarray:
+    # From the nanoseconds, so the total_time channel is not kept for it
+    return speed(total_time_nanoseconds/NANOSECONDS_PER_SECOND, total_distances)
+
+@metric_channel("km", "total_distance")
+def _km(total_distances: np.ndarray) -> np.ndarray:
+    # The distance truncated to the 100 meters
+    return (total_distances/100).astype(int)/10
+
+def compute_channel(track, name: str, memo: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Get a channel of a track, computing it (and its dependencies) only if it is not memoized yet.
+    The derived arrays are read only, as they are shared by all the consumers.
+
+    :param track: The track with the base channel arrays.
+    :type track: Track
+    :param name: The channel name.
+    :type name: str
+    :param memo: The dictionary with the already computed channels. It is updated in place.
+    :type memo: dict[str, numpy.ndarray]
+    :return: The channel values.
+    :rtype: numpy.ndarray
+    """
+    values = memo.get(name)
+    if values is not None:
+        return values
+
+    if name in _BASE_CHANNELS:
+        values = _BASE_CHANNELS[name](track)
+    elif name in CHANNELS:
+        channel = CHANNELS[name]
+        dependencies = [compute_channel(track, dependency, memo) for dependency in channel.dependencies]
+        with span(f"metrics.{name}", points=len(track)):
+            values = np.asarray(channel.compute(*dependencies))
+        values.flags.writeable = False
+    else:
+        raise KeyError(f"Unknown metric channel '{name}'")
+
+    memo[name] = values
+
+    return values
+
+@timed("metrics.data_frame")
+def build_data_frame(track, memo: dict[str, np.ndarray], include_speed: bool = True) -> DataFrame:
+    """
+    Build the pandas dataframe used by the viewers from the track channels.
+    The columns are the memoized channel arrays themselves, not copies (only the Time column is
+    converted), so the frame costs almost no memory on top of the channels.
+
+    :param track: The track with the base channel arrays.
+    :type track: Track
+    :param memo: The dictionary with the already computed channels. It is updated in place.
+    :type memo: dict[str, numpy.ndarray]
+    :param include_speed: Whether to add the columns computed by gpx_processor.calculate_speed_data_frame.
+    :type include_speed: bool
+    :return: The track dataframe.
+    :rtype: pandas.DataFrame
+    """
+    channel = lambda name: compute_channel(track, name, memo)
+
+    columns = {"Time": DatetimeIndex(channel("time").view("datetime64[ns]")).tz_localize("UTC"),
+               "Latitude": channel("latitude"),
+               "Longitude": channel("longitude"),
+               "Elevation": channel("elevation"),
+               "Distance": channel("distance"),
+               "Tot. Distance": channel("total_distance"),
+               "Tot. Time": channel("total_time_ns").view("timedelta64[ns]"),
+               "Delta Time": channel("delta_time"),
+               "Elevation Gain": channel("elevation_gain")}
+
+    if include_speed:
+        columns["Speed"] = channel("speed")
+        columns["Speed rollmean"] = channel("speed_rollmean")
+        columns["Avg Speed"] = channel("avg_speed")
+        columns["KM"] = channel("km")
+
+    return DataFrame(columns, copy=False)
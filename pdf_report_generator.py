@@ -1,18 +1,65 @@
 from pandas import DataFrame, isnull
 from pandas import DataFrame
-from xhtml2pdf import pisa
+
+from activity_summary import ActivitySummary, format_duration
+from aggregation_pyramid import AggregationPyramid
+from chart_image_cache import png_data_uri
+from instrumentation import timed
+from lazy_imports import lazy_import
+
+# Imported on the first pdf export (see lazy_imports)
+pisa = lazy_import("xhtml2pdf.pisa")
 
 class PdfReportGenerator: 
 
-    def __init__(self, df: DataFrame): 
+    def __init__(self, df: DataFrame, images: dict[str, bytes] | None = None, summary: ActivitySummary | None = None,
+                 pyramid: AggregationPyramid | None = None): 
         """
         Class constructor
 
         :param df: The data frame to be used for the report generation.
         :type df: pandas.DataFrame
+        :param images: The png images of the charts, by chart name (see chart_plots.render_chart_image). 
+                       They are embedded in the report, a missing chart is omitted.
+        :type images: dict[str, bytes] | None
+        :param summary: The activity summary shown at the top of the report, None to omit it.
+        :type summary: ActivitySummary | None
+        :param pyramid: The aggregates of the activity (see Activity.pyramid), giving the rows of the summarized 
+                        data table. None to group the data frame rows instead.
+        :type pyramid: AggregationPyramid | None
         """
         self._df = df
+        self._images = images if images is not None else {}
+        self._summary = summary
+        self._pyramid = pyramid
+
+    def _generate_html_summary(self) -> str:
+        """
+        Generate the HTML table of the activity summary.
+
+        :return: The summary section, empty if there is no summary.
+        :rtype: str
+        """
+        if self._summary is None:
+            return ""
 
+        summary = self._summary
+        rows = [("Start time", str(summary.start_datetime.astype("datetime64[s]")).replace("T", " ")),
+                ("Distance (Km)", f"{summary.distance/1000:.2f}"),
+                ("Elapsed time", format_duration(summary.elapsed_time)),
+                ("Moving time", format_duration(summary.moving_time)),
+                ("Average speed (Km/h)", f"{summary.average_speed:.2f}"),
+                ("Average moving speed (Km/h)", f"{summary.average_moving_speed:.2f}"),
+                ("Max speed (Km/h)", f"{summary.max_speed:.2f}"),
+                ("Elevation gain (m)", f"{summary.elevation_gain:.1f}"),
+                ("Elevation loss (m)", f"{summary.elevation_loss:.1f}"),
+                ("Max grade (%)", f"{summary.max_grade:.1f}")]
+        rows += [(f"Time at {zone}", format_duration(seconds)) for zone, seconds in summary.speed_zones()]
+
+        return "<div><h2> Summary </h2><table class='dataframe'>" \
+                + "".join(f"<tr><th>{name}</th><td>{value}</td></tr>" for name, value in rows) + "</table></div>"
+
+    @timed("pdf.table_html")
     def _generate_html_from_data_frame(self, df: DataFrame) -> str:
         """
         Generate an HTML table from a pandas DataFrame.
@@ -20,6 +67,10 @@ class PdfReportGenerator:
         :param df: The pandas DataFrame to be converted to HTML.
         :type df: pandas.DataFrame
         """
+        if self._pyramid is not None:
+            # Already one row per 100 meters (KM), only the rows shown are formatted
+            df = df.iloc[self._pyramid.level("100m").last_rows]
+
         p_df = df.drop(["Distance", "Elevation Gain", "Delta Time"], axis = 1)
         p_df["Time"] = p_df["Time"].apply(lambda x: x.strftime('%H:%M:%S'))
         p_df["Tot. Distance"] = round(p_df["Tot. Distance"], 2)
@@ -40,29 +91,30 @@ class PdfReportGenerator:
         :return: The generated HTML report as a string.
         :rtype: str
         """
+        # Embedded as data URIs, the report does not read any image file
+        charts = "".join(f"""
+        <div>
+        <h2> {title} </h2>
+        <img src='{png_data_uri(self._images[chart])}'></div>"""
+                         for chart, title in [("speed", "Speed and grade over distance"),
+                                              ("elevation_over_distance", "Elevation over distance"),
+                                              ("stats_over_time", "Distance and elevation gain over time")]
+                         if chart in self._images)
 
-
-        return """<html><head><style>  
-        table.dataframe { font-weight: medium; } 
-        table.dataframe tr { padding-top: 4px; height: 18px; } 
-        table.dataframe td { text-align: center; }  
+        return f"""<html><head><style>  
+        table.dataframe {{ font-weight: medium; }} 
+        table.dataframe tr {{ padding-top: 4px; height: 18px; }} 
+        table.dataframe td {{ text-align: center; }}  
         </style></head> 
         <body> 
-        <div>
-        <h2> Speed and grade over distance </h2>
-        <img src='speed_chart.png'></div>
-        <div> 
-        <h2> Elevation over distance </h2>
-        <img src='elevation_distance_chart.png'></div>
-        <div> 
-        <h2> Distance and elevation gain over time </h2>
-        <img src='time_stats_chart.png'></div>
+        {self._generate_html_summary()}{charts}
         <pdf:nextpage>
         <h2> Summarized data </h2>
         <b>Last measurements before each 100 meters </b>""" \
                 +  self._generate_html_from_data_frame(self._df) +  "</body> </html>"
 
 
+    @timed("pdf.generate")
     def generate(self, file_name: str) -> str:
         """
         Generate a PDF report from the data frame and save it to the specified file.
@@ -1,22 +1,26 @@
-import threading
 import numpy as np
-import pandas as pd
 from pandas import DataFrame, Series
 from matplotlib.axes import Axes
-from scipy.stats import gaussian_kde
 
 from matplotlib.backends.qt_compat import QtWidgets
 from matplotlib.backends.backend_qtagg import FigureCanvas
 from matplotlib.figure import Figure
 from PyQt6.QtWidgets import QWidget, QGridLayout
 
+from density_estimation import point_densities
+from instrumentation import timed
+from interval_binning import IntervalBinning
+
+# The edges of the speed intervals (Km/h) of the interval charts
+SPEED_INTERVAL_EDGES = np.concatenate([[0], np.arange(10, 50.00001, 5), np.arange(50.0001, 100, 10), [np.inf]])
+
 class SpeedDetailedDashboard(QWidget):
-    def __init__(self, data_frame: DataFrame):
+    def __init__(self, data: dict):
         """
         Class constructor
 
-        :param data_frame: The data frame to be used in the dashboard.
-        :type data_frame: pandas.DataFrame
+        :param data: The data of the charts, prepared from the activity data frame (see prepare_data).
+        :type data: dict
         """
 
         super().__init__()
@@ -25,12 +29,6 @@ class SpeedDetailedDashboard(QWidget):
        
         self._tick_label_size = 8
 
-        new_df = data_frame[["Elevation Gain", "Distance", "Delta Time"]].copy(deep = True)
-        new_df["Speed"] = np.where(new_df["Delta Time"] > 0, 3.6*new_df["Distance"]/new_df["Delta Time"], 0)
-        new_df["Grade"] = 100*new_df["Elevation Gain"]/new_df["Distance"]
-
-        new_df = self._filter_data(new_df)
-
         canvas_factory = lambda w, h : FigureCanvas(Figure(figsize = (6,2.5)))
 
         self._speed_grade_canvas = canvas_factory(6, 2.5)
@@ -49,17 +47,14 @@ class SpeedDetailedDashboard(QWidget):
         layout.setRowStretch(2, 8)
         layout.setRowStretch(3, 8)
         
-        new_df["Pos Elevation Gain"] = [ 0 if x < 0 else x for x in new_df["Elevation Gain"]]
-        new_df["Grade_X_Elevation"] = new_df["Grade"]*new_df["Pos Elevation Gain"].cumsum()/100
-        
         chart_grade = self._speed_grade_canvas.figure.subplots()
         chart_elevation = self._speed_elevation_grade_canvas.figure.subplots()
         
-        self._render_interval_charts(self._define_speed_cuts(new_df))
-        self._render_speed_frequence_chart(new_df)
+        self._render_interval_charts(data["speed_intervals"])
+        self._render_speed_frequence_chart(data["speed_counts"])
 
-        t1 = threading.Thread(target = self._render_density_chart, args = [chart_grade, new_df["Grade"], new_df["Speed"]])
-        t2 = threading.Thread(target = self._render_density_chart, args = [chart_elevation, new_df["Grade_X_Elevation"], new_df["Speed"]])
+        self._render_density_chart(chart_grade, *data["grade_density"])
+        self._render_density_chart(chart_elevation, *data["grade_x_elevation_density"])
  
         chart_grade.set_xlabel("Grade (%)")
         chart_grade.set_ylabel("Speed (Km/h)")
@@ -71,30 +66,61 @@ class SpeedDetailedDashboard(QWidget):
         chart_elevation.tick_params(axis='x', which='major', labelsize= self._tick_label_size)
         self._speed_elevation_grade_canvas.figure.subplots_adjust(bottom=0.18)
 
-        t1.start()
-        t2.start()
+    @staticmethod
+    @timed("chart.speed_detailed_data")
+    def prepare_data(data_frame: DataFrame) -> dict:
+        """
+        Prepare the data of the charts, including the point densities of the density charts.
+        It does not use any widget, so it can run in a worker thread.
+
+        :param data_frame: The data frame to be used in the dashboard.
+        :type data_frame: pandas.DataFrame
+        :return: The totals of each speed interval, the speed frequences, the points of each density chart
+                 (x values, speeds and densities) and the interval binning of the points, which aggregates
+                 other intervals without deriving the speeds again.
+        :rtype: dict
+        """
+        new_df = data_frame[["Elevation Gain", "Distance", "Delta Time"]].copy(deep = True)
+        new_df["Speed"] = np.where(new_df["Delta Time"] > 0, 3.6*new_df["Distance"]/new_df["Delta Time"], 0)
+        new_df["Grade"] = 100*new_df["Elevation Gain"]/new_df["Distance"]
+
+        new_df = SpeedDetailedDashboard._filter_data(new_df)
+
+        new_df["Pos Elevation Gain"] = new_df["Elevation Gain"].clip(lower=0)
+        new_df["Grade_X_Elevation"] = new_df["Grade"]*new_df["Pos Elevation Gain"].cumsum()/100
+
+        binning = IntervalBinning.from_data_frame(new_df)
+        count_series = binning.frequences("speed")
 
+        # The gaussian_kde density, binned on a grid instead of evaluated at every pair of points
+        density_points = lambda column: (new_df[column], new_df["Speed"],
+                                         point_densities(new_df[column].to_numpy(), new_df["Speed"].to_numpy()))
 
-    def _render_speed_frequence_chart(self, new_df: DataFrame) -> None:
+        return {"speed_intervals": SpeedDetailedDashboard._define_speed_cuts(binning),
+                "speed_counts": count_series[count_series > 10],
+                "grade_density": density_points("Grade"),
+                "grade_x_elevation_density": density_points("Grade_X_Elevation"),
+                "interval_binning": binning}
+
+    @timed("chart.speed_frequence")
+    def _render_speed_frequence_chart(self, count_series: Series) -> None:
         """
         Render the speed frequence chart
         
-        :param new_df: The data frame to be used in the chart.
-        :type new_df: pandas.DataFrame
+        :param count_series: The number of points of each speed (rounded to 0.1 Km/h), for the speeds of more than 10 points.
+        :type count_series: pandas.Series
         :return: None
         :rtype: None
         """
         chart = self._speed_frequence_canvas.figure.subplots()
 
-        count_series = round(new_df['Speed'], 1).value_counts()
-        count_series = count_series[count_series > 10]
-
         chart.bar(x = count_series.index, height = count_series.values, width=0.1)
         chart.set_xlabel("Speed")
         chart.set_ylabel("Frequence")
         self._speed_frequence_canvas.figure.subplots_adjust(bottom=0.25)
 
 
+    @timed("chart.speed_intervals")
     def _render_interval_charts(self, new_df: DataFrame) -> None:
         """
         Render interval charts/histograms.
@@ -121,24 +147,21 @@ class SpeedDetailedDashboard(QWidget):
         chart.tick_params(axis='x', which='major', labelsize= self._tick_label_size)
         self._speed_over_distance_canvas.figure.subplots_adjust(bottom=0.25, hspace=0.25)       
             
-    def _define_speed_cuts(self, df: DataFrame) -> DataFrame:
+    @staticmethod
+    def _define_speed_cuts(binning: IntervalBinning) -> DataFrame:
         """
         Define the speed intervals to be used in the interval charts.
         
-        :param df: The data frame to generate the cuts.
-        :type df: pandas.DataFrame
+        :param binning: The interval binning of the points.
+        :type binning: IntervalBinning
         return: The total distance and delta time grouped by speed intervals.
         :rtype: pandas.DataFrame
         """
-        intervals = np.arange(10, 50.00001, 5)
-        intervals = np.append(0, intervals)
-        intervals = np.append(intervals, np.arange(50.0001, 100, 10))
-        intervals = np.append(intervals, np.array([np.inf]))
-        cuts = pd.cut(df["Speed"], intervals)
-        return df[["Distance", "Delta Time"]].copy(deep= True).groupby(cuts, observed = True).sum()
+        return binning.totals("speed", SPEED_INTERVAL_EDGES).to_data_frame()[["Distance", "Delta Time"]]
 
 
-    def _filter_data(self, df: DataFrame) -> DataFrame:
+    @staticmethod
+    def _filter_data(df: DataFrame) -> DataFrame:
         """
         Filter the data frame to remove outliers in speed and grade.
         
@@ -155,7 +178,8 @@ class SpeedDetailedDashboard(QWidget):
 
         return new_df
 
-    def _render_density_chart(self, chart: Axes, col_x: Series, col_y: Series) -> None:
+    @timed("chart.speed_density")
+    def _render_density_chart(self, chart: Axes, col_x: Series, col_y: Series, z: np.ndarray) -> None:
         """
         Render a density scatter chart on the given chart with the given x and y columns.
         
@@ -165,11 +189,9 @@ class SpeedDetailedDashboard(QWidget):
         :type col_x: pandas.Series
         :param col_y: The y column data.
         :type col_y: pandas.Series
+        :param z: The density of the points, coloring them (see density_estimation).
+        :type z: numpy.ndarray
         :return: None
         :rtype: None
         """
-        xy = np.vstack([col_x, col_y])
-        z = gaussian_kde(xy)(xy)
-        
         chart.scatter(col_x, col_y, c = z, s = 3)
-        chart.get_figure().canvas.draw()
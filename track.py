@@ -0,0 +1,170 @@
+import numpy as np
+from typing import BinaryIO
+from pandas import DataFrame
+
+from distance_engine import calculate_step_distances, DEFAULT_DISTANCE_MODEL
+from gpx_reader import GpxColumns
+from metrics import compute_channel, build_data_frame
+
+"""
+Compact, array backed, representation of a gpx track.
+Only the measured values and the step distances are stored, in a struct of arrays layout:
+int64 epoch times, float64 coordinates (float32 would lose up to 1 m), float32 elevations
+and step distances. Every other column (delta time, totals, gain, speed, KM) is derived
+on demand from those arrays (see metrics).
+"""
+
+
+class Track:
+    __slots__ = ("times", "latitudes", "longitudes", "elevations", "distances", "segment_starts")
+
+    def __init__(self, times: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray,
+                 elevations: np.ndarray, distances: np.ndarray, segment_starts: np.ndarray):
+        """
+        Class constructor.
+
+        :param times: The point times, as UTC epoch nanoseconds.
+        :type times: numpy.ndarray
+        :param latitudes: The point latitudes in degrees.
+        :type latitudes: numpy.ndarray
+        :param longitudes: The point longitudes in degrees.
+        :type longitudes: numpy.ndarray
+        :param elevations: The point elevations in meters.
+        :type elevations: numpy.ndarray
+        :param distances: The distance from the previous point, in meters.
+        :type distances: numpy.ndarray
+        :param segment_starts: The index of the first point of each segment.
+        :type segment_starts: numpy.ndarray
+        """
+        self.times = np.asarray(times, dtype=np.int64)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.elevations = np.asarray(elevations, dtype=np.float32)
+        self.distances = np.asarray(distances, dtype=np.float32)
+        self.segment_starts = np.asarray(segment_starts, dtype=np.int64)
+
+    @classmethod
+    def from_gpx_columns(cls, columns: GpxColumns, distance_model: str = DEFAULT_DISTANCE_MODEL) -> "Track":
+        """
+        Create a track from the columns read from a gpx file.
+
+        :param columns: The gpx track point columns.
+        :type columns: GpxColumns
+        :param distance_model: The model used to calculate the distance between points (see distance_engine).
+        :type distance_model: str
+        :return: The track.
+        :rtype: Track
+        """
+        distances = np.round(calculate_step_distances(columns.latitudes,
+                                                      columns.longitudes,
+                                                      columns.elevations,
+                                                      columns.segment_starts,
+                                                      distance_model), 5)
+
+        return cls(columns.times, columns.latitudes, columns.longitudes, columns.elevations,
+                   distances, columns.segment_starts)
+
+    def __len__(self) -> int:
+        """
+        Get the number of points.
+
+        :return: The number of points.
+        :rtype: int
+        """
+        return len(self.times)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Get the memory used by the track arrays.
+
+        :return: The number of bytes.
+        :rtype: int
+        """
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    def _channel(self, name: str) -> np.ndarray:
+        """
+        Compute a derived channel of the track, without memoization (see activity.Activity).
+
+        :param name: The channel name (see metrics).
+        :type name: str
+        :return: The channel values.
+        :rtype: numpy.ndarray
+        """
+        return compute_channel(self, name, {})
+
+    @property
+    def delta_times(self) -> np.ndarray:
+        """
+        Get the time from the previous point, in seconds (0 for the first point).
+
+        :return: The delta times.
+        :rtype: numpy.ndarray
+        """
+        return self._channel("delta_time")
+
+    @property
+    def total_times(self) -> np.ndarray:
+        """
+        Get the time since the start of the point segment, in seconds.
+
+        :return: The accumulated times.
+        :rtype: numpy.ndarray
+        """
+        return self._channel("total_time")
+
+    @property
+    def total_distances(self) -> np.ndarray:
+        """
+        Get the distance since the start of the track, in meters.
+
+        :return: The accumulated distances.
+        :rtype: numpy.ndarray
+        """
+        return self._channel("total_distance")
+
+    @property
+    def elevation_gains(self) -> np.ndarray:
+        """
+        Get the elevation difference from the previous point, in meters (0 for the first point).
+
+        :return: The elevation gains.
+        :rtype: numpy.ndarray
+        """
+        return self._channel("elevation_gain")
+
+    def to_dataframe(self, include_speed: bool = True) -> DataFrame:
+        """
+        Build the pandas dataframe used by the viewers.
+
+        :param include_speed: Whether to add the columns computed by gpx_processor.calculate_speed_data_frame.
+        :type include_speed: bool
+        :return: The track dataframe.
+        :rtype: pandas.DataFrame
+        """
+        return build_data_frame(self, {}, include_speed)
+
+    def save(self, file: str | BinaryIO) -> None:
+        """
+        Save the track arrays to an uncompressed NumPy archive.
+
+        :param file: The archive path or a binary file object.
+        :type file: str | BinaryIO
+        :return: None
+        :rtype: None
+        """
+        np.savez(file, **{name: getattr(self, name) for name in self.__slots__})
+
+    @classmethod
+    def load(cls, file: str | BinaryIO) -> "Track":
+        """
+        Load a track saved with Track.save.
+
+        :param file: The archive path or a binary file object.
+        :type file: str | BinaryIO
+        :return: The track.
+        :rtype: Track
+        """
+        with np.load(file, allow_pickle=False) as archive:
+            return cls(*(archive[name] for name in cls.__slots__))